@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "team_api.settings")
 
 application = get_asgi_application()
+
+# Imported once the apps are loaded
+from teams.checks import warn_slow_configuration  # noqa: E402
+
+warn_slow_configuration()
@@ -1,19 +1,47 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def env_list(name: str, default: list) -> list:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# Settings profile: "development" (default) or "production".
+# Every setting below can still be overridden with its own variable
+TEAMS_ENV = os.environ.get("DJANGO_ENV", "development")
+PRODUCTION = TEAMS_ENV == "production"
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-@8$29o#iki6h^$vp-)jgi-i#te!*z3bnsf-972d8nzq9hn#)7q"
+SECRET_KEY = os.environ.get(
+    "DJANGO_SECRET_KEY",
+    "django-insecure-@8$29o#iki6h^$vp-)jgi-i#te!*z3bnsf-972d8nzq9hn#)7q",
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DEBUG also keeps every executed query in memory (connection.queries)
+DEBUG = env_bool("DJANGO_DEBUG", not PRODUCTION)
+
+# The debug toolbar is only installed (app, middleware and URLs) in debug mode
+DEBUG_TOOLBAR = DEBUG and env_bool("DJANGO_DEBUG_TOOLBAR", True)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env_list("DJANGO_ALLOWED_HOSTS", [])
 
 INTERNAL_IPS = ["127.0.0.1"]
 
@@ -28,14 +56,15 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "rest_framework",
     "drf_spectacular",
-    "debug_toolbar",
     "teams",
 ]
 
 MIDDLEWARE = [
+    "teams.metrics.MetricsMiddleware",
+    "teams.routers.PrimaryPinMiddleware",
+    "teams.throttling.RateLimitHeadersMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -43,6 +72,13 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index("django.middleware.common.CommonMiddleware"),
+        "debug_toolbar.middleware.DebugToolbarMiddleware",
+    )
+
 ROOT_URLCONF = "team_api.urls"
 
 TEMPLATES = [
@@ -67,13 +103,112 @@ WSGI_APPLICATION = "team_api.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# Persistent connections: seconds a connection is reused (0 closes it after
+# every request, None keeps it forever). Health checks drop broken ones
+conn_max_age = int(os.environ.get("DJANGO_CONN_MAX_AGE", 60 if PRODUCTION else 0))
+
+if os.environ.get("DATABASE_ENGINE", "sqlite") == "postgres":
+    # Requires psycopg (or psycopg2). For pooling, point POSTGRES_HOST
+    # at a pooler such as PgBouncer (transaction mode)
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "team_api"),
+            "USER": os.environ.get("POSTGRES_USER", "team_api"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": conn_max_age,
+            "CONN_HEALTH_CHECKS": True,
+            "DISABLE_SERVER_SIDE_CURSORS": env_bool(
+                "POSTGRES_DISABLE_SERVER_SIDE_CURSORS", False
+            ),
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": conn_max_age,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+
+# Read replicas (see teams.routers): comma-separated SQLite files or
+# PostgreSQL hosts holding copies of the primary database
+if DATABASES["default"]["ENGINE"].endswith("sqlite3"):
+    replicas = [{"NAME": path} for path in env_list("SQLITE_REPLICAS", [])]
+else:
+    replicas = [{"HOST": host} for host in env_list("POSTGRES_REPLICA_HOSTS", [])]
+for index, replica in enumerate(replicas):
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"],
+        **replica,
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["teams.routers.ReplicaRouter"]
+TEAMS_READ_REPLICAS = [f"replica_{index}" for index in range(len(replicas))]
+# Seconds a client reads from the primary after a write (read-your-writes),
+# should be above the usual replication lag
+TEAMS_REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+# PRAGMAs run on every new SQLite connection (see teams.db): WAL lets readers
+# work alongside a writer, synchronous=NORMAL is safe with WAL, mmap speeds
+# up reads and busy_timeout waits for locks instead of failing. Development
+# keeps the SQLite defaults (a rollback journal, no WAL files next to the
+# database) unless SQLITE_PRAGMAS is set
+if env_bool("SQLITE_PRAGMAS", PRODUCTION):
+    TEAMS_SQLITE_PRAGMAS = {
+        "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": "NORMAL",
+        "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000)),
+        "cache_size": -20000,
+        "temp_store": "MEMORY",
+    }
+else:
+    TEAMS_SQLITE_PRAGMAS = {}
+
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
 
+# Cache of rendered read responses of the teams API (see teams.cache).
+# Any alias from CACHES can be used, e.g. a file-based or custom backend
+TEAMS_RESPONSE_CACHE_ALIAS = "default"
+TEAMS_RESPONSE_CACHE_TIMEOUT = 300
+
+
+# People/teams search index (see teams.search): "auto" uses SQLite FTS5
+# when available and falls back to the in-process trigram index, which
+# catches up with other processes from the change feed at most every
+# TEAMS_SEARCH_SYNC_SECONDS
+TEAMS_SEARCH_BACKEND = "auto"
+TEAMS_SEARCH_SYNC_SECONDS = 1
+
+# Serve the read endpoints of the teams API with ASGI-native views
+# (see teams.async_views). Only useful when running under an ASGI server
+TEAMS_ASYNC_VIEWS = False
+
+# Per-route request metrics exposed on /metrics (see teams.metrics).
+# Queries slower than TEAMS_SLOW_QUERY_MS are logged to "teams.slow_queries"
+TEAMS_METRICS_ENABLED = True
+TEAMS_SLOW_QUERY_MS = 100
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "teams": {"handlers": ["console"], "level": "WARNING"},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -119,8 +254,79 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "teams.pagination.IdCursorPagination",
+    "PAGE_SIZE": 100,
+    "DEFAULT_RENDERER_CLASSES": [
+        "teams.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "teams.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
+# JSON backend of the API renderer/parser (see teams.renderers):
+# "auto" uses orjson when it is installed, "json" always uses the stdlib
+TEAMS_JSON_BACKEND = "auto"
+
+# Batch size for bulk inserts/updates/deletes of teams and people
+TEAMS_BULK_BATCH_SIZE = 1000
+
+# Background jobs of the `?async=true` operations (see teams.jobs): number of
+# worker threads, items committed per transaction, and whether to run them
+# synchronously when the request commits (e.g. in tests)
+TEAMS_JOB_WORKERS = 2
+TEAMS_JOB_CHUNK_SIZE = 500
+TEAMS_JOBS_EAGER = False
+
+# Seconds without a heartbeat (one per chunk) after which a running job is
+# stale, i.e. its process stopped, and runs of a job before a stale one fails
+# instead of being requeued by `manage.py run_pending_jobs`
+TEAMS_JOB_LEASE = 600
+TEAMS_JOB_MAX_ATTEMPTS = 3
+
+# Seconds the responses of writes sent with an Idempotency-Key header are
+# replayed to retries (see teams.idempotency), and seconds a key stays
+# claimed by a request in progress, e.g. by a worker that crashed
+TEAMS_IDEMPOTENCY_TTL = 24 * 3600
+TEAMS_IDEMPOTENCY_LEASE = 60
+
+# Change feed (see teams.changes): whether writes are logged, the longest
+# long-poll wait, the polling interval of waits and streams, and the duration
+# of a server-sent events stream before clients reconnect. Sync views block a
+# worker thread while waiting, so their waits and streams are capped at
+# TEAMS_CHANGES_SYNC_MAX_SECONDS; the async views (TEAMS_ASYNC_VIEWS) are not
+TEAMS_CHANGE_LOG_ENABLED = True
+TEAMS_CHANGES_MAX_WAIT = 30
+TEAMS_CHANGES_POLL_SECONDS = 1
+TEAMS_CHANGES_STREAM_SECONDS = 300
+TEAMS_CHANGES_SYNC_MAX_SECONDS = 5
+# Changes younger than this are held back: on PostgreSQL, IDs can become
+# visible out of order. SQLite commits in ID order
+TEAMS_CHANGES_VISIBILITY_SECONDS = (
+    0 if DATABASES["default"]["ENGINE"].endswith("sqlite3") else 2
+)
+
+# In-process membership graph of the colleagues/overlaps endpoints (see
+# teams.graph): above this number of memberships it is not loaded and the
+# queries run in SQL; changes of other processes are caught up from the
+# change feed at most every TEAMS_GRAPH_SYNC_SECONDS
+TEAMS_GRAPH_MAX_MEMBERSHIPS = 2_000_000
+TEAMS_GRAPH_SYNC_SECONDS = 1
+
+# Cost-weighted rate limiting of the teams/people endpoints (see
+# teams.throttling): token buckets of (capacity, tokens refilled per second)
+# per client and for all clients, kept in the TEAMS_THROTTLE_CACHE_ALIAS cache.
+# Requests cost one token plus one per TEAMS_THROTTLE_ROWS_PER_TOKEN rows
+# returned or items sent. Use a shared cache (e.g. Redis) with several workers
+TEAMS_THROTTLE_ENABLED = env_bool("THROTTLE_ENABLED", True)
+TEAMS_THROTTLE_CLIENT_RATE = (1000, 100)
+TEAMS_THROTTLE_GLOBAL_RATE = (20000, 2000)
+TEAMS_THROTTLE_ROWS_PER_TOKEN = 100
+TEAMS_THROTTLE_CACHE_ALIAS = "default"
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Team API",
     "DESCRIPTION": "Simple API for people and teams",
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularSwaggerView, SpectacularAPIView
 
+from teams.views import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("teams.urls", namespace="teams")),
@@ -11,5 +14,8 @@ urlpatterns = [
         SpectacularSwaggerView.as_view(url_name="schema"),
         name="swagger",
     ),
-    path("__debug__/", include("debug_toolbar.urls")),
+    path("metrics", metrics, name="metrics"),
 ]
+
+if settings.DEBUG_TOOLBAR:
+    urlpatterns.append(path("__debug__/", include("debug_toolbar.urls")))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "team_api.settings")
 
 application = get_wsgi_application()
+
+# Imported once the apps are loaded
+from teams.checks import warn_slow_configuration  # noqa: E402
+
+warn_slow_configuration()
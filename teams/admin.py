@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from teams.models import Team, Person
+from teams.models import Change, Job, Team, Person
 
 
 @admin.register(Person)
@@ -8,4 +8,19 @@ class PersonAdmin(admin.ModelAdmin):
     list_display = ["first_name", "last_name", "email"]
 
 
-admin.site.register(Team)
+@admin.register(Team)
+class TeamAdmin(admin.ModelAdmin):
+    list_display = ["name", "member_count"]
+    readonly_fields = ["member_count"]
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["kind", "status", "processed", "total", "created_at"]
+    list_filter = ["kind", "status"]
+
+
+@admin.register(Change)
+class ChangeAdmin(admin.ModelAdmin):
+    list_display = ["id", "resource", "action", "team_id", "person_id", "created_at"]
+    list_filter = ["resource", "action"]
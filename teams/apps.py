@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class TeamsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "teams"
+
+    def ready(self) -> None:
+        import teams.changes  # noqa: F401
+        import teams.checks  # noqa: F401
+        import teams.db  # noqa: F401
+        import teams.graph  # noqa: F401
+        import teams.metrics  # noqa: F401
+        import teams.signals  # noqa: F401
@@ -0,0 +1,397 @@
+"""
+ASGI-native counterparts of the read endpoints of `TeamViewSet` and
+`PersonViewSet`.
+
+The views use the async ORM, so under an ASGI server a request waiting for
+the database or a slow client does not hold a thread. They produce the same
+JSON and cursors as the DRF views, with the same response cache (teams.cache)
+and the same `ETag`/`Last-Modified` validators (teams.conditional), and they
+are installed under the router's URL names when `TEAMS_ASYNC_VIEWS` is
+enabled. Everything they do not handle themselves (writes, `?ordering=`,
+the browsable API, format suffixes) is passed to the original DRF view.
+
+The change feed's long-polls and event streams wait with `asyncio.sleep`
+here, so they can last longer than on a thread of a sync worker.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse, HttpResponseBase
+from django.urls import URLPattern, re_path
+from django.views import View
+from rest_framework.exceptions import APIException, NotFound, Throttled
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from teams import throttling
+from teams.cache import (
+    get_cached_response,
+    get_response_key,
+    response_cache,
+    store_response,
+)
+from teams.changes import (
+    aiter_events,
+    await_changes,
+    get_max_wait,
+    get_stream_seconds,
+    parse_cursor,
+)
+from teams.conditional import (
+    Stamp,
+    get_validators,
+    is_not_modified,
+    not_modified_response,
+    people_stamp,
+    person_stamp,
+    person_team_stamp,
+    set_validators,
+    team_member_stamp,
+    team_members_stamp,
+    team_stamp,
+    teams_stamp,
+)
+from teams.filters import ListFilterBackend, PersonFilter, TeamFilter
+from teams.models import Person, Team
+from teams.pagination import IdCursorPagination
+from teams.renderers import FastJSONRenderer
+from teams.routers import replica_reads
+from teams.serializers import (
+    PersonReadSerializer,
+    TeamReadSerializer,
+    get_person_memberships,
+    group_person_teams,
+)
+from teams.views import ChangeFeedView, invalid_cursor_response, stream_response
+
+TEAM_FIELDS = ("id", "name")
+PERSON_FIELDS = PersonReadSerializer.values
+
+# Query parameters only the DRF views understand
+SYNC_PARAMS = frozenset({"ordering", "format", "expand", "fields"})
+
+team_data = TeamReadSerializer().to_representation
+
+
+async def people_data(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Same output as `PersonReadSerializer(many=True)` for `.values()` rows.
+    """
+    person_ids = [row["id"] for row in rows]
+    memberships = [row async for row in get_person_memberships(person_ids)]
+    teams = group_person_teams(person_ids, memberships)
+    return [{**row, "teams": teams[row["id"]]} for row in rows]
+
+
+class AsyncReadView(View):
+    """
+    Base async view serving GET requests of a single router URL.
+    """
+
+    # The DRF view registered by the router under the same URL name
+    sync_view: Optional[Callable] = None
+    # Basename and action of the DRF view, which share its cached responses
+    basename = ""
+    action = ""
+    # Stamp (teams.conditional) and cache dependencies (teams.cache) of the
+    # DRF action
+    get_stamp: Callable[..., Optional[Stamp]] = staticmethod(lambda **kwargs: None)
+    cache_dependencies: Tuple[str, ...] = ()
+    # Whether the view returns a page of rows, which costs more tokens
+    paged = False
+    renderer = FastJSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs: Any) -> Callable:
+        view = super().as_view(**initkwargs)
+        # CSRF is enforced (or not) by the DRF view requests are passed to
+        view.csrf_exempt = True
+        return view
+
+    def is_async_request(self, request: HttpRequest, kwargs: Dict) -> bool:
+        if request.method != "GET" or "format" in kwargs:
+            return False
+        if SYNC_PARAMS.intersection(request.GET):
+            return False
+        return "text/html" not in request.META.get("HTTP_ACCEPT", "")
+
+    async def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if not self.is_async_request(request, kwargs):
+            return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+        return await self.get(request, *args, **kwargs)
+
+    async def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        drf_request = Request(request)
+        drf_request.accepted_media_type = self.renderer.media_type
+        try:
+            await self.check_throttle(request)
+            with replica_reads(request):
+                validators = await sync_to_async(get_validators)(
+                    self, drf_request, self.get_stamp, kwargs
+                )
+                if validators is not None and is_not_modified(drf_request, *validators):
+                    return not_modified_response(validators[0])
+                response = await self.get_response(drf_request, kwargs)
+        except APIException as exc:
+            response = exception_handler(exc, {})
+            rendered = self.render(response.data, status=response.status_code)
+            if "Retry-After" in response:
+                rendered["Retry-After"] = response["Retry-After"]
+            return rendered
+        if validators is not None:
+            set_validators(response, *validators)
+        return response
+
+    async def get_response(self, request: Request, kwargs: Dict) -> HttpResponse:
+        """
+        The rendered data, through the response cache of the DRF views.
+        """
+        if not response_cache.enabled:
+            return self.render(await self.get_data(request, **kwargs))
+        key = await sync_to_async(get_response_key)(
+            self, request, self.cache_dependencies, kwargs
+        )
+        cached = await sync_to_async(get_cached_response)(request, key)
+        if cached is not None:
+            return cached
+        response = self.render(await self.get_data(request, **kwargs))
+        await sync_to_async(store_response)(key, response)
+        return response
+
+    async def check_throttle(self, request: HttpRequest) -> None:
+        """
+        Same rate limiting as the `CostThrottle` of the DRF views.
+        """
+        if not throttling.is_enabled():
+            return
+        rows = IdCursorPagination().get_page_size(Request(request)) if self.paged else 0
+        rate_limit = await sync_to_async(throttling.throttle_request)(
+            request, throttling.get_ident(request), throttling.get_cost(rows)
+        )
+        if not rate_limit.allowed:
+            raise Throttled(rate_limit.wait)
+
+    async def get_data(self, request: Request, **kwargs) -> Any:
+        raise NotImplementedError
+
+    def render(self, data: Any, status: int = 200) -> HttpResponse:
+        return HttpResponse(
+            self.renderer.render(data),
+            content_type=self.renderer.media_type,
+            status=status,
+        )
+
+    @staticmethod
+    async def get_row(queryset: QuerySet, *fields: str, **lookup: Any) -> Dict:
+        """
+        Async `get_object_or_404` returning a `.values()` row.
+        """
+        try:
+            return await queryset.values(*fields).aget(**lookup)
+        except (ObjectDoesNotExist, TypeError, ValueError):
+            raise NotFound()
+
+    @staticmethod
+    async def paginate(request: Request, queryset: QuerySet) -> Dict[str, Any]:
+        paginator = IdCursorPagination()
+        rows = await paginator.apaginate_queryset(queryset, request)
+        return paginator.get_paginated_data(rows)
+
+
+class AsyncListView(AsyncReadView):
+    paged = True
+    queryset: Optional[QuerySet] = None
+    fields: tuple = ()
+    filter_class: Optional[Type[ListFilterBackend]] = None
+
+    def get_queryset(self) -> QuerySet:
+        return self.queryset.all()
+
+    def filter_queryset(self, queryset: QuerySet) -> QuerySet:
+        return self.filter_class().filter_list(Request(self.request), queryset)
+
+    async def get_data(self, request: Request, **kwargs) -> Any:
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginate(request, queryset.values(*self.fields))
+        page["results"] = await self.get_results(page["results"])
+        return page
+
+    async def get_results(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return rows
+
+
+class TeamListView(AsyncListView):
+    basename = "team"
+    action = "list"
+    get_stamp = staticmethod(teams_stamp)
+    cache_dependencies = ("teams",)
+    queryset = Team.objects.all()
+    fields = TeamReadSerializer.values
+    filter_class = TeamFilter
+
+    async def get_results(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [team_data(row) for row in rows]
+
+
+class TeamDetailView(AsyncReadView):
+    basename = "team"
+    action = "retrieve"
+    get_stamp = staticmethod(team_stamp)
+    cache_dependencies = ("team:pk",)
+
+    async def get_data(self, request: Request, pk: str, **kwargs) -> Any:
+        return team_data(
+            await self.get_row(Team.objects, *TeamReadSerializer.values, pk=pk)
+        )
+
+
+class TeamMembersView(AsyncReadView):
+    basename = "team"
+    action = "members"
+    get_stamp = staticmethod(team_members_stamp)
+    cache_dependencies = ("team:pk", "people")
+    paged = True
+
+    async def get_data(self, request: Request, pk: str, **kwargs) -> Any:
+        team = await self.get_row(Team.objects, "id", pk=pk)
+        members = Person.objects.filter(teams=team["id"]).values(*PERSON_FIELDS)
+        return await self.paginate(request, members)
+
+
+class TeamMemberView(AsyncReadView):
+    basename = "team"
+    action = "specific_member"
+    get_stamp = staticmethod(team_member_stamp)
+    cache_dependencies = ("team:pk", "person:person_id")
+
+    async def get_data(
+        self, request: Request, pk: str, person_id: str, **kwargs
+    ) -> Any:
+        team = await self.get_row(Team.objects, "id", pk=pk)
+        members = Person.objects.filter(teams=team["id"])
+        return await self.get_row(members, *PERSON_FIELDS, pk=person_id)
+
+
+class PersonListView(AsyncListView):
+    basename = "person"
+    action = "list"
+    get_stamp = staticmethod(people_stamp)
+    cache_dependencies = ("people", "teams")
+    queryset = Person.objects.all()
+    fields = PERSON_FIELDS
+    filter_class = PersonFilter
+
+    async def get_results(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await people_data(rows)
+
+
+class PersonDetailView(AsyncReadView):
+    basename = "person"
+    action = "retrieve"
+    get_stamp = staticmethod(person_stamp)
+    cache_dependencies = ("person:pk", "teams")
+
+    async def get_data(self, request: Request, pk: str, **kwargs) -> Any:
+        person = await self.get_row(Person.objects, *PERSON_FIELDS, pk=pk)
+        return (await people_data([person]))[0]
+
+
+class PersonTeamsView(AsyncReadView):
+    basename = "person"
+    action = "teams"
+    get_stamp = staticmethod(person_stamp)
+    cache_dependencies = ("person:pk", "teams")
+    paged = True
+
+    async def get_data(self, request: Request, pk: str, **kwargs) -> Any:
+        person = await self.get_row(Person.objects, "id", pk=pk)
+        teams = Team.objects.filter(members=person["id"]).values(*TEAM_FIELDS)
+        return await self.paginate(request, teams)
+
+
+class PersonTeamView(AsyncReadView):
+    basename = "person"
+    action = "specific_team"
+    get_stamp = staticmethod(person_team_stamp)
+    cache_dependencies = ("person:pk", "team:team_id")
+
+    async def get_data(self, request: Request, pk: str, team_id: str, **kwargs) -> Any:
+        person = await self.get_row(Person.objects, "id", pk=pk)
+        teams = Team.objects.filter(members=person["id"])
+        return await self.get_row(teams, *TEAM_FIELDS, pk=team_id)
+
+
+class AsyncChangeFeedView(View):
+    """
+    Waits for changes of a long-poll without holding a thread, then lets
+    `ChangeFeedView` read and render them.
+    """
+
+    # `ChangeFeedView`, set by `as_view`
+    sync_view: Optional[Callable] = None
+
+    async def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        try:
+            since = await sync_to_async(parse_cursor)(request.GET.get("since"))
+            wait = min(float(request.GET.get("wait", 0)), get_max_wait(blocking=False))
+        except ValueError:
+            # Rejected by the DRF view
+            wait = 0
+        if wait > 0:
+            await await_changes(since, wait)
+            # `since=latest` is resolved once, before the wait
+            request.GET = request.GET.copy()
+            request.GET["since"] = str(since)
+            del request.GET["wait"]
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+
+async def change_stream(request: HttpRequest) -> HttpResponseBase:
+    """
+    `teams.views.change_stream` for ASGI servers, streaming for
+    `TEAMS_CHANGES_STREAM_SECONDS`.
+    """
+    try:
+        since = await sync_to_async(parse_cursor)(
+            request.headers.get("Last-Event-ID") or request.GET.get("since")
+        )
+    except ValueError:
+        return invalid_cursor_response()
+    return stream_response(
+        aiter_events(
+            since, ChangeFeedView.max_limit, get_stream_seconds(blocking=False)
+        )
+    )
+
+
+# Router URL name -> async view serving its GET requests
+ASYNC_VIEWS = {
+    "team-list": TeamListView,
+    "team-detail": TeamDetailView,
+    "team-team-members": TeamMembersView,
+    "team-team-specific-member": TeamMemberView,
+    "person-list": PersonListView,
+    "person-detail": PersonDetailView,
+    "person-person-teams": PersonTeamsView,
+    "person-person-specific-team": PersonTeamView,
+}
+
+
+def get_async_urlpatterns(patterns: List[URLPattern]) -> List[URLPattern]:
+    """
+    Replace the router's URL patterns that have an async counterpart,
+    keeping their regexes and names.
+    """
+    return [
+        re_path(
+            pattern.pattern.regex.pattern,
+            ASYNC_VIEWS[pattern.name].as_view(sync_view=pattern.callback),
+            name=pattern.name,
+        )
+        if pattern.name in ASYNC_VIEWS
+        else pattern
+        for pattern in patterns
+    ]
@@ -0,0 +1,347 @@
+"""
+Benchmark suite of the teams API: a generator of large seeded datasets and
+a runner measuring the query count, latency percentiles and peak memory of
+every `TeamViewSet`/`PersonViewSet` action.
+"""
+
+import math
+import random
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from teams.graph import membership_graph
+from teams.membership import recompute_member_counts
+from teams.models import Membership, Person, Team
+from teams.signals import bulk_saved
+
+SEED_BATCH_SIZE = 5000
+FIRST_NAMES = ("Laura", "John", "Maria", "David", "Olena", "Ahmed", "Yuki", "Sofia")
+LAST_NAMES = ("Smith", "Brown", "Garcia", "Kowalski", "Tanaka", "Ivanenko", "Silva")
+PERCENTILES = (50, 95, 99)
+
+# Maximum number of SQL queries per request of each action, with the response
+# cache disabled. A query count growing with the data (N+1) exceeds them.
+# Lists include their ETag stamp: one aggregate per listed model
+QUERY_BUDGETS = {
+    "team-list": 2,
+    "team-retrieve": 2,
+    "team-members": 3,
+    # Including the lazy load of the membership graph by the first query
+    "team-overlaps": 5,
+    "team-add_members": 8,
+    "team-specific_member": 3,
+    "team-remove_specific_member": 6,
+    "team-destroy": 5,
+    "person-list": 4,
+    "person-retrieve": 3,
+    "person-teams": 3,
+    "person-colleagues": 5,
+    "person-add_to_teams": 8,
+    "person-specific_team": 3,
+    "person-remove_from_specific_team": 6,
+    "person-destroy": 9,
+}
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Nearest-rank percentile of `values`.
+    """
+    values = sorted(values)
+    rank = math.ceil(percent / 100 * len(values))
+    return values[min(len(values) - 1, max(rank - 1, 0))]
+
+
+def chunked(count: int, size: int = SEED_BATCH_SIZE) -> Iterator[range]:
+    for start in range(0, count, size):
+        yield range(start, min(start + size, count))
+
+
+def seed_dataset(
+    teams: int, people: int, density: float, seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Create `teams` teams and `people` people, each person belonging to
+    `density` (0..1) of the teams picked at random.
+
+    Rows are bulk-inserted, then the usual bulk signals keep member counts,
+    the search index and the response cache consistent.
+    """
+    rng = random.Random(seed)
+    # Team names are unique: do not collide with an earlier seeded dataset
+    prefix = uuid.uuid4().hex[:8]
+
+    team_ids = []
+    for batch in chunked(teams):
+        created = Team.objects.bulk_create(
+            [Team(name=f"Team {prefix}-{i}") for i in batch]
+        )
+        team_ids.extend(team.pk for team in created)
+
+    per_person = min(teams, round(density * teams))
+    person_ids = []
+    memberships = 0
+    for batch in chunked(people):
+        created = Person.objects.bulk_create(
+            [
+                Person(
+                    first_name=rng.choice(FIRST_NAMES),
+                    last_name=rng.choice(LAST_NAMES),
+                    email=f"person.{prefix}.{i}@example.com",
+                )
+                for i in batch
+            ]
+        )
+        rows = [
+            Membership(person_id=person.pk, team_id=team_id)
+            for person in created
+            for team_id in rng.sample(team_ids, per_person)
+        ]
+        Membership.objects.bulk_create(rows, batch_size=SEED_BATCH_SIZE)
+        person_ids.extend(person.pk for person in created)
+        memberships += len(rows)
+
+    bulk_saved.send(sender=Team, pks=team_ids, created=True)
+    bulk_saved.send(sender=Person, pks=person_ids, created=True)
+    recompute_member_counts(team_ids)
+    # Memberships were inserted without signals
+    membership_graph.reset()
+
+    return {
+        "teams": teams,
+        "people": people,
+        "density": density,
+        "memberships": memberships,
+        "team_ids": team_ids,
+        "person_ids": person_ids,
+    }
+
+
+class BenchmarkAction(NamedTuple):
+    name: str
+    method: str
+    # (dataset, iteration) -> (url, request body)
+    get_request: Callable[[Dict[str, Any], int], Tuple[str, Optional[dict]]]
+
+
+def _url(name: str, *args: Any) -> str:
+    return reverse(f"teams:{name}", args=args)
+
+
+def _pair(dataset: Dict[str, Any], index: int) -> Tuple[int, int]:
+    """
+    (person_id, team_id) of an existing membership; removals use negative
+    indexes so that they never touch the memberships read before.
+    """
+    return dataset["memberships_sample"][index]
+
+
+ACTIONS = [
+    BenchmarkAction("team-list", "get", lambda d, i: (_url("team-list"), None)),
+    BenchmarkAction(
+        "team-retrieve",
+        "get",
+        lambda d, i: (_url("team-detail", d["team_ids"][i]), None),
+    ),
+    BenchmarkAction(
+        "team-members",
+        "get",
+        lambda d, i: (_url("team-team-members", d["team_ids"][i]), None),
+    ),
+    BenchmarkAction(
+        "team-overlaps",
+        "get",
+        lambda d, i: (_url("team-team-overlaps", d["team_ids"][i]), None),
+    ),
+    BenchmarkAction(
+        "team-add_members",
+        "put",
+        lambda d, i: (
+            _url("team-team-members", d["team_ids"][i]),
+            {"members_to_add": d["person_ids"][i * 10 : i * 10 + 10]},
+        ),
+    ),
+    BenchmarkAction(
+        "team-specific_member",
+        "get",
+        lambda d, i: (
+            _url("team-team-specific-member", _pair(d, i)[1], _pair(d, i)[0]),
+            None,
+        ),
+    ),
+    BenchmarkAction("person-list", "get", lambda d, i: (_url("person-list"), None)),
+    BenchmarkAction(
+        "person-retrieve",
+        "get",
+        lambda d, i: (_url("person-detail", d["person_ids"][i]), None),
+    ),
+    BenchmarkAction(
+        "person-teams",
+        "get",
+        lambda d, i: (_url("person-person-teams", d["person_ids"][i]), None),
+    ),
+    BenchmarkAction(
+        "person-colleagues",
+        "get",
+        lambda d, i: (_url("person-person-colleagues", d["person_ids"][i]), None),
+    ),
+    BenchmarkAction(
+        "person-add_to_teams",
+        "put",
+        lambda d, i: (
+            _url("person-person-teams", d["person_ids"][i]),
+            {"teams": d["team_ids"][:3]},
+        ),
+    ),
+    BenchmarkAction(
+        "person-specific_team",
+        "get",
+        lambda d, i: (
+            _url("person-person-specific-team", _pair(d, i)[0], _pair(d, i)[1]),
+            None,
+        ),
+    ),
+    # Destructive actions come last and use their own objects
+    BenchmarkAction(
+        "team-remove_specific_member",
+        "delete",
+        lambda d, i: (
+            _url(
+                "team-team-specific-member",
+                _pair(d, -2 * i - 1)[1],
+                _pair(d, -2 * i - 1)[0],
+            ),
+            None,
+        ),
+    ),
+    BenchmarkAction(
+        "person-remove_from_specific_team",
+        "delete",
+        lambda d, i: (
+            _url(
+                "person-person-specific-team",
+                _pair(d, -2 * i - 2)[0],
+                _pair(d, -2 * i - 2)[1],
+            ),
+            None,
+        ),
+    ),
+    BenchmarkAction(
+        "person-destroy",
+        "delete",
+        lambda d, i: (_url("person-detail", d["person_ids"][-i - 1]), None),
+    ),
+    BenchmarkAction(
+        "team-destroy",
+        "delete",
+        lambda d, i: (_url("team-detail", d["team_ids"][-i - 1]), None),
+    ),
+]
+
+
+class BenchmarkRunner:
+    """
+    Run every action `iterations` times against a seeded dataset.
+
+    The first request of each action is instrumented (query count and peak
+    memory with `tracemalloc`), the following ones are only timed.
+    The response cache is disabled unless `use_cache` is set,
+    so that the database path is measured.
+    """
+
+    def __init__(
+        self,
+        dataset: Dict[str, Any],
+        iterations: int = 20,
+        use_cache: bool = False,
+        actions: Optional[List[str]] = None,
+    ) -> None:
+        self.dataset = dataset
+        self.iterations = iterations
+        self.use_cache = use_cache
+        self.actions = [
+            action for action in ACTIONS if not actions or action.name in actions
+        ]
+        self.client = APIClient()
+
+        # Memberships used by specific_member/specific_team and the removals
+        needed = 3 * (iterations + 1)
+        self.dataset["memberships_sample"] = list(
+            Membership.objects.filter(person_id__in=dataset["person_ids"])
+            .order_by("?")
+            .values_list("person_id", "team_id")[:needed]
+        )
+
+    def request(self, action: BenchmarkAction, iteration: int) -> int:
+        url, data = action.get_request(self.dataset, iteration)
+        response = getattr(self.client, action.method)(url, data, format="json")
+        return response.status_code
+
+    def measure(self, action: BenchmarkAction) -> Dict[str, Any]:
+        queries = []
+
+        def count_query(execute: Callable, sql: str, *args: Any) -> Any:
+            queries.append(sql)
+            return execute(sql, *args)
+
+        tracemalloc.start()
+        with connection.execute_wrapper(count_query):
+            statuses = {self.request(action, 0)}
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings = []
+        for iteration in range(1, self.iterations + 1):
+            start = time.perf_counter()
+            statuses.add(self.request(action, iteration))
+            timings.append((time.perf_counter() - start) * 1000)
+
+        result = {
+            "queries": len(queries),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "statuses": sorted(statuses),
+        }
+        for percent in PERCENTILES:
+            result[f"p{percent}_ms"] = round(percentile(timings or [0], percent), 3)
+        return result
+
+    def run(self) -> Dict[str, Any]:
+        with override_settings(
+            TEAMS_RESPONSE_CACHE_ENABLED=self.use_cache,
+            TEAMS_THROTTLE_ENABLED=False,
+            ALLOWED_HOSTS=["testserver"],
+            DEBUG=False,
+        ):
+            results = {action.name: self.measure(action) for action in self.actions}
+
+        return {
+            "dataset": {
+                key: self.dataset[key]
+                for key in ("teams", "people", "density", "memberships")
+            },
+            "iterations": self.iterations,
+            "cache": self.use_cache,
+            "actions": results,
+        }
+
+
+def check_budgets(report: Dict[str, Any]) -> List[str]:
+    """
+    Return the budget violations and failed requests of a benchmark report.
+    """
+    errors = []
+    for name, result in report["actions"].items():
+        budget = QUERY_BUDGETS.get(name)
+        if budget is not None and result["queries"] > budget:
+            errors.append(f"{name}: {result['queries']} queries (budget {budget})")
+        failed = [status for status in result["statuses"] if status >= 400]
+        if failed:
+            errors.append(f"{name}: got status {failed}")
+    return errors
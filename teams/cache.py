@@ -0,0 +1,177 @@
+import hashlib
+import time
+from collections import Counter
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.http import HttpResponse, HttpResponseBase
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from teams.routers import get_pin_seconds, is_pinned, reading_from_replica
+
+KEY_PREFIX = "teams"
+# Invalidating more objects than this bumps the global epoch instead
+MAX_VERSION_BUMPS = 1000
+# List generations of the objects embedded with `?expand=`
+EXPAND_VERSIONS = {"members": "people", "teams": "teams"}
+
+
+class ResponseCache:
+    """
+    Cache of rendered read responses under versioned keys.
+
+    Every cached response key embeds the current versions of what it depends on:
+    single objects (`team:<pk>`, `person:<pk>`), list generations (`teams`,
+    `people`) and a global epoch. Writes never delete entries, they bump
+    versions so that stale entries become unreachable and expire on their own.
+
+    Any Django cache backend can be used through `TEAMS_RESPONSE_CACHE_ALIAS`,
+    including custom backends configured in `CACHES`.
+    """
+
+    def __init__(self) -> None:
+        self.stats = Counter(hits=0, misses=0, invalidations=0)
+
+    @property
+    def backend(self) -> BaseCache:
+        return caches[getattr(settings, "TEAMS_RESPONSE_CACHE_ALIAS", "default")]
+
+    @property
+    def timeout(self) -> int:
+        return getattr(settings, "TEAMS_RESPONSE_CACHE_TIMEOUT", 300)
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, "TEAMS_RESPONSE_CACHE_ENABLED", True)
+
+    @staticmethod
+    def version_key(name: str) -> str:
+        return f"{KEY_PREFIX}:version:{name}"
+
+    def get_versions(self, names: List[str]) -> List[int]:
+        keys = [self.version_key(name) for name in names]
+        versions = self.backend.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # Start from a fresh value, so an evicted counter can never
+                # make an old response reachable again
+                self.backend.add(key, time.time_ns(), timeout=None)
+                versions[key] = self.backend.get(key)
+        return [versions[key] for key in keys]
+
+    def bump(self, names: Iterable[str]) -> None:
+        names = list(dict.fromkeys(names))
+        if len(names) > MAX_VERSION_BUMPS:
+            names = ["epoch"]
+
+        for name in names:
+            key = self.version_key(name)
+            try:
+                self.backend.incr(key)
+            except ValueError:
+                self.backend.set(key, time.time_ns(), timeout=None)
+        self.stats["invalidations"] += len(names)
+
+    def get_key(self, view: APIView, request: Request, dependencies: List[str]) -> str:
+        versions = self.get_versions(["epoch", *dependencies])
+        variant = f"{request.get_full_path()}|{request.accepted_media_type}"
+        digest = hashlib.md5(variant.encode()).hexdigest()
+        stamp = ".".join(str(version) for version in versions)
+        return f"{KEY_PREFIX}:response:{view.basename}:{view.action}:{stamp}:{digest}"
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str, int]]:
+        cached = self.backend.get(key)
+        self.stats["hits" if cached is not None else "misses"] += 1
+        return cached
+
+    def set(
+        self, key: str, response: HttpResponseBase, timeout: Optional[int] = None
+    ) -> None:
+        entry = (response.content, response["Content-Type"], response.status_code)
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        self.backend.set(key, entry, timeout=timeout)
+
+
+response_cache = ResponseCache()
+
+
+def resolve_dependencies(
+    dependencies: Tuple[str, ...], kwargs: Dict[str, Any]
+) -> List[str]:
+    """
+    Turn `"team:pk"`-style specs into version names using the URL kwargs.
+    """
+    names = []
+    for dependency in dependencies:
+        resource, _, kwarg = dependency.partition(":")
+        names.append(f"{resource}:{kwargs[kwarg]}" if kwarg else resource)
+    return names
+
+
+def get_response_key(
+    view: Any, request: Request, dependencies: Tuple[str, ...], kwargs: Dict[str, Any]
+) -> str:
+    names = resolve_dependencies(dependencies, kwargs)
+    names.extend(EXPAND_VERSIONS[name] for name in getattr(view, "get_expand", tuple)())
+    return response_cache.get_key(view, request, names)
+
+
+def get_cached_response(request: Request, key: str) -> Optional[HttpResponse]:
+    cached = None if is_pinned(request) else response_cache.get(key)
+    if cached is None:
+        return None
+    content, content_type, status_code = cached
+    return HttpResponse(content, content_type=content_type, status=status_code)
+
+
+def store_response(key: str, response: HttpResponseBase) -> None:
+    """
+    Cache a rendered response, only for the primary pinning window when it
+    was read from a replica.
+    """
+    response_cache.set(
+        key, response, timeout=get_pin_seconds() if reading_from_replica() else None
+    )
+
+
+def cache_response(*dependencies: str) -> Callable:
+    """
+    Cache the rendered response of a read action.
+
+    Dependencies are list generations (`"teams"`, `"people"`) or single objects
+    whose PK is taken from a URL kwarg (`"team:pk"`, `"person:person_id"`).
+    Views with a `get_expand()` method also depend on the list generation
+    of the embedded objects.
+
+    With read replicas, a response rendered from a lagging replica may be
+    stored under versions bumped by a write it does not show yet. Such
+    responses are only kept for the primary pinning window, and clients
+    pinned to the primary skip the lookup (and store fresh responses).
+    """
+
+    def decorator(handler: Callable) -> Callable:
+        @wraps(handler)
+        def wrapper(
+            view: APIView, request: Request, *args, **kwargs
+        ) -> HttpResponseBase:
+            if not response_cache.enabled:
+                return handler(view, request, *args, **kwargs)
+
+            key = get_response_key(view, request, dependencies, kwargs)
+            cached = get_cached_response(request, key)
+            if cached is not None:
+                return cached
+
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                response = view.finalize_response(request, response, *args, **kwargs)
+                response.render()
+                store_response(key, response)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,280 @@
+"""
+Change feed of teams, people and memberships for incremental sync.
+
+Every create, update and delete of a team or person and every membership
+added or removed is appended to the `Change` log by the receivers below,
+in the transaction of the change. Consumers read the log from a cursor
+(the last change ID they applied) with `/api/changes/?since=`, optionally
+long-polling (`&wait=`) or streaming it as server-sent events
+(`/api/changes/stream/`).
+
+Change IDs are assigned on insert, not on commit: on PostgreSQL a change can
+become visible after one with a greater ID, and a consumer that already moved
+its cursor past it would never see it. Changes younger than
+`TEAMS_CHANGES_VISIBILITY_SECONDS` are therefore held back (SQLite commits
+one transaction at a time, in ID order, and does not need it). Transactions
+writing to the log must commit within that window.
+
+Deleting a team removes its memberships without logging them one by one.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max, Min, Model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from teams.models import Change, Membership, Person, Team
+from teams.renderers import dumps
+from teams.serializers import BasePersonSerializer, TeamSerializer
+from teams.signals import Pairs, bulk_saved, membership_changed
+
+CHANGE_FIELDS = (
+    "id",
+    "resource",
+    "action",
+    "team_id",
+    "person_id",
+    "data",
+    "created_at",
+)
+CHANGE_BATCH_SIZE = 500
+RESOURCES = {Team: Change.TEAM, Person: Change.PERSON}
+ID_FIELDS = {Team: "team_id", Person: "person_id"}
+# Fields of the `data` snapshot, as rendered by the API
+SNAPSHOT_FIELDS = {
+    Team: TeamSerializer.Meta.fields,
+    Person: BasePersonSerializer.Meta.fields,
+}
+# Seconds between two keep-alive comments of an idle stream
+KEEP_ALIVE_SECONDS = 15
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "TEAMS_CHANGE_LOG_ENABLED", True)
+
+
+def get_poll_seconds() -> float:
+    return getattr(settings, "TEAMS_CHANGES_POLL_SECONDS", 1)
+
+
+def get_max_wait(blocking: bool) -> float:
+    """
+    Longest long-poll wait. A blocking wait holds a worker thread and is
+    kept under `TEAMS_CHANGES_SYNC_MAX_SECONDS`.
+    """
+    wait = getattr(settings, "TEAMS_CHANGES_MAX_WAIT", 30)
+    if blocking:
+        wait = min(wait, getattr(settings, "TEAMS_CHANGES_SYNC_MAX_SECONDS", 5))
+    return wait
+
+
+def get_stream_seconds(blocking: bool) -> float:
+    """
+    Duration of an event stream before clients reconnect, see `get_max_wait`.
+    """
+    duration = getattr(settings, "TEAMS_CHANGES_STREAM_SECONDS", 300)
+    if blocking:
+        duration = min(duration, getattr(settings, "TEAMS_CHANGES_SYNC_MAX_SECONDS", 5))
+    return duration
+
+
+def get_visibility_cutoff() -> Optional[datetime]:
+    """
+    Creation time after which changes are not served yet, if any.
+    """
+    seconds = getattr(settings, "TEAMS_CHANGES_VISIBILITY_SECONDS", 0)
+    if seconds <= 0:
+        return None
+    return timezone.now() - timedelta(seconds=seconds)
+
+
+def make_change(model: Any, action: str, pk: int, data: Optional[dict]) -> Change:
+    return Change(
+        resource=RESOURCES[model], action=action, data=data, **{ID_FIELDS[model]: pk}
+    )
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=Person)
+def log_saved_object(
+    sender: Any, instance: Model, created: bool, **kwargs: Any
+) -> None:
+    if not is_enabled():
+        return
+    action = Change.CREATED if created else Change.UPDATED
+    data = {name: getattr(instance, name) for name in SNAPSHOT_FIELDS[sender]}
+    make_change(sender, action, instance.pk, data).save()
+
+
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Person)
+def log_deleted_object(sender: Any, instance: Model, **kwargs: Any) -> None:
+    if is_enabled():
+        make_change(sender, Change.DELETED, instance.pk, None).save()
+
+
+@receiver(bulk_saved, sender=Team)
+@receiver(bulk_saved, sender=Person)
+def log_bulk_saved_objects(
+    sender: Any, pks: Optional[List[int]], created: bool = False, **kwargs: Any
+) -> None:
+    if not is_enabled():
+        return
+    if pks is None:
+        Change.objects.create(resource=RESOURCES[sender], action=Change.RESYNC)
+        return
+
+    action = Change.CREATED if created else Change.UPDATED
+    for start in range(0, len(pks), CHANGE_BATCH_SIZE):
+        rows = sender.objects.filter(pk__in=pks[start : start + CHANGE_BATCH_SIZE])
+        Change.objects.bulk_create(
+            [
+                make_change(sender, action, row["id"], row)
+                for row in rows.order_by("pk").values(*SNAPSHOT_FIELDS[sender])
+            ]
+        )
+
+
+@receiver(membership_changed, sender=Membership)
+def log_membership_changes(added: Pairs, removed: Pairs, **kwargs: Any) -> None:
+    if not is_enabled():
+        return
+    Change.objects.bulk_create(
+        [
+            Change(
+                resource=Change.MEMBERSHIP,
+                action=action,
+                person_id=person_id,
+                team_id=team_id,
+            )
+            for action, pairs in ((Change.ADDED, added), (Change.REMOVED, removed))
+            for person_id, team_id in pairs
+        ],
+        batch_size=CHANGE_BATCH_SIZE,
+    )
+
+
+def get_latest_cursor() -> int:
+    cutoff = get_visibility_cutoff()
+    if cutoff is not None:
+        held_back = Change.objects.filter(created_at__gt=cutoff).aggregate(
+            first=Min("id")
+        )["first"]
+        if held_back is not None:
+            return held_back - 1
+    return Change.objects.aggregate(latest=Max("id"))["latest"] or 0
+
+
+def parse_cursor(value: Optional[str]) -> int:
+    """
+    Change feed cursor: a change ID, or `latest` to skip the existing log.
+    """
+    if not value:
+        return 0
+    if value == "latest":
+        return get_latest_cursor()
+    cursor = int(value)
+    if cursor < 0:
+        raise ValueError(value)
+    return cursor
+
+
+def get_changes(since: int, limit: int) -> List[Dict[str, Any]]:
+    """
+    Up to `limit` changes logged after the `since` cursor, oldest first,
+    up to the first one that is held back.
+    """
+    changes = list(
+        Change.objects.filter(pk__gt=since)
+        .order_by("pk")
+        .values(*CHANGE_FIELDS)[:limit]
+    )
+    cutoff = get_visibility_cutoff()
+    if cutoff is not None:
+        for index, change in enumerate(changes):
+            if change["created_at"] > cutoff:
+                return changes[:index]
+    return changes
+
+
+def wait_for_changes(since: int, limit: int, wait: float) -> List[Dict[str, Any]]:
+    """
+    Long-poll: return as soon as there are changes after `since`,
+    or an empty list after `wait` seconds.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        changes = get_changes(since, limit)
+        if changes or time.monotonic() >= deadline:
+            return changes
+        time.sleep(min(get_poll_seconds(), max(deadline - time.monotonic(), 0)))
+
+
+async def await_changes(since: int, wait: float) -> None:
+    """
+    Async long-poll: return as soon as there are changes after `since`, or
+    after `wait` seconds, without holding a thread in between.
+    """
+    deadline = time.monotonic() + wait
+    while not await sync_to_async(get_changes)(since, 1):
+        if time.monotonic() >= deadline:
+            return
+        await asyncio.sleep(
+            min(get_poll_seconds(), max(deadline - time.monotonic(), 0))
+        )
+
+
+def format_event(change: Dict[str, Any]) -> bytes:
+    return b"id: %d\nevent: change\ndata: %s\n\n" % (change["id"], dumps(change))
+
+
+def iter_events(since: int, limit: int, duration: float) -> Iterator[bytes]:
+    """
+    Server-sent events of the changes after `since`, for `duration` seconds.
+    Clients reconnect with the `Last-Event-ID` of the last change received.
+    """
+    deadline = time.monotonic() + duration
+    keep_alive = time.monotonic() + KEEP_ALIVE_SECONDS
+    yield b"retry: 1000\n\n"
+    while True:
+        changes = get_changes(since, limit)
+        for change in changes:
+            yield format_event(change)
+        if changes:
+            since = changes[-1]["id"]
+        if time.monotonic() >= deadline:
+            return
+        if len(changes) < limit:
+            if time.monotonic() >= keep_alive:
+                keep_alive = time.monotonic() + KEEP_ALIVE_SECONDS
+                yield b": keep-alive\n\n"
+            time.sleep(get_poll_seconds())
+
+
+async def aiter_events(since: int, limit: int, duration: float) -> AsyncIterator[bytes]:
+    """
+    `iter_events` for ASGI servers: sleeping streams do not hold a thread.
+    """
+    deadline = time.monotonic() + duration
+    keep_alive = time.monotonic() + KEEP_ALIVE_SECONDS
+    yield b"retry: 1000\n\n"
+    while True:
+        changes = await sync_to_async(get_changes)(since, limit)
+        for change in changes:
+            yield format_event(change)
+        if changes:
+            since = changes[-1]["id"]
+        if time.monotonic() >= deadline:
+            return
+        if len(changes) < limit:
+            if time.monotonic() >= keep_alive:
+                keep_alive = time.monotonic() + KEEP_ALIVE_SECONDS
+                yield b": keep-alive\n\n"
+            await asyncio.sleep(get_poll_seconds())
@@ -0,0 +1,68 @@
+import logging
+from typing import Any, List
+
+from django.conf import settings
+from django.core.checks import CheckMessage, Warning, register
+from django.db import connections
+
+
+@register()
+def check_slow_configuration(
+    app_configs: Any = None, **kwargs: Any
+) -> List[CheckMessage]:
+    """
+    Warn about settings that slow the API down, unless the development
+    profile (`DJANGO_ENV=development`) is active.
+    """
+    if getattr(settings, "TEAMS_ENV", "development") == "development":
+        return []
+
+    warnings = []
+    if settings.DEBUG:
+        warnings.append(
+            Warning(
+                "DEBUG is on: every executed query is kept in memory.",
+                hint="Set DJANGO_DEBUG=0.",
+                id="teams.W001",
+            )
+        )
+    if "debug_toolbar.middleware.DebugToolbarMiddleware" in settings.MIDDLEWARE:
+        warnings.append(
+            Warning(
+                "The debug toolbar middleware runs on every request.",
+                hint="Set DJANGO_DEBUG_TOOLBAR=0.",
+                id="teams.W002",
+            )
+        )
+    for alias in connections:
+        database = connections.settings[alias]
+        if database["CONN_MAX_AGE"] == 0:
+            warnings.append(
+                Warning(
+                    f"Database '{alias}' opens a new connection for every request.",
+                    hint="Set DJANGO_CONN_MAX_AGE (e.g. 60).",
+                    id="teams.W003",
+                )
+            )
+        pragmas = getattr(settings, "TEAMS_SQLITE_PRAGMAS", {})
+        journal_mode = str(pragmas.get("journal_mode", "")).upper()
+        if database["ENGINE"].endswith("sqlite3") and journal_mode != "WAL":
+            warnings.append(
+                Warning(
+                    f"SQLite database '{alias}' does not use WAL: "
+                    "writes block reads.",
+                    hint="Set SQLITE_JOURNAL_MODE=WAL.",
+                    id="teams.W004",
+                )
+            )
+    return warnings
+
+
+def warn_slow_configuration() -> None:
+    """
+    Log the warnings of `check_slow_configuration` when the application starts
+    (application servers do not run system checks).
+    """
+    logger = logging.getLogger("teams")
+    for warning in check_slow_configuration():
+        logger.warning("%s: %s %s", warning.id, warning.msg, warning.hint)
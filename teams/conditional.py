@@ -0,0 +1,245 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.db.models import Count, Max, QuerySet, Sum
+from django.http import HttpResponse, HttpResponseBase
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from teams.models import Person, Team
+
+# Values identifying the state of a representation and its last modification
+Stamp = Tuple[tuple, Optional[datetime]]
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def _row_stamp(row: Optional[tuple]) -> Optional[Stamp]:
+    """
+    Turn a `(version, updated_at, *related aggregates)` row into a stamp,
+    the last related `updated_at` being the last element.
+    """
+    if row is None:
+        return None
+    updated = [value for value in (row[1], row[-1]) if value is not None]
+    return row, max(updated) if updated else None
+
+
+def _list_stamp(queryset: QuerySet) -> Stamp:
+    """
+    Stamp of a list from its rows, read by every process alike: writes,
+    including membership changes, bump `updated_at` and deletes change the
+    count. Deletes leave no `updated_at` behind, so lists have no last
+    modification.
+    """
+    row = queryset.order_by().aggregate(count=Count("pk"), updated=Max("updated_at"))
+    return (row["count"], row["updated"]), None
+
+
+def _filtered(view: Optional[APIView], queryset: QuerySet) -> QuerySet:
+    # The list as filtered by the request, or the whole list
+    if view is None:
+        return queryset
+    return view.filter_queryset(view.get_queryset())
+
+
+def teams_stamp(view: Optional[APIView] = None, **kwargs: Any) -> Stamp:
+    return _list_stamp(_filtered(view, Team.objects.all()))
+
+
+def people_rows_stamp(**kwargs: Any) -> Stamp:
+    return _list_stamp(Person.objects.all())
+
+
+def people_stamp(view: Optional[APIView] = None, **kwargs: Any) -> Stamp:
+    # People are listed with nested team names
+    return combine_stamps(
+        _list_stamp(_filtered(view, Person.objects.all())), teams_stamp()
+    )
+
+
+def combine_stamps(*stamps: Stamp) -> Stamp:
+    parts = tuple(part for stamp_parts, _ in stamps for part in stamp_parts)
+    updated = [updated for _, updated in stamps]
+    # Known only if every part has one
+    return parts, None if None in updated else max(updated)
+
+
+# Stamps of the objects embedded with `?expand=`: any person or team may be
+EXPAND_STAMPS = {"members": people_rows_stamp, "teams": teams_stamp}
+
+
+def team_stamp(pk: str, **kwargs: Any) -> Optional[Stamp]:
+    row = Team.objects.filter(pk=pk).values_list("version", "updated_at").first()
+    return _row_stamp(row)
+
+
+def team_members_stamp(pk: str, **kwargs: Any) -> Optional[Stamp]:
+    row = (
+        Team.objects.filter(pk=pk)
+        .annotate(
+            members_count=Count("members"),
+            members_version=Sum("members__version"),
+            members_updated=Max("members__updated_at"),
+        )
+        .values_list(
+            "version",
+            "updated_at",
+            "members_count",
+            "members_version",
+            "members_updated",
+        )
+        .first()
+    )
+    return _row_stamp(row)
+
+
+def team_member_stamp(pk: str, person_id: str, **kwargs: Any) -> Optional[Stamp]:
+    row = (
+        Person.objects.filter(pk=person_id, teams=pk)
+        .values_list("version", "updated_at")
+        .first()
+    )
+    return _row_stamp(row)
+
+
+def person_stamp(pk: str, **kwargs: Any) -> Optional[Stamp]:
+    # A person is represented with nested team names
+    row = (
+        Person.objects.filter(pk=pk)
+        .annotate(
+            teams_count=Count("teams"),
+            teams_version=Sum("teams__version"),
+            teams_updated=Max("teams__updated_at"),
+        )
+        .values_list(
+            "version", "updated_at", "teams_count", "teams_version", "teams_updated"
+        )
+        .first()
+    )
+    return _row_stamp(row)
+
+
+def person_team_stamp(pk: str, team_id: str, **kwargs: Any) -> Optional[Stamp]:
+    row = (
+        Team.objects.filter(pk=team_id, members=pk)
+        .values_list("version", "updated_at")
+        .first()
+    )
+    return _row_stamp(row)
+
+
+def make_etag(request: Request, parts: tuple) -> str:
+    # The path (with cursor and other query params) and the media type
+    # are part of the representation, so they are part of the strong ETag.
+    # The same path is used for the `If-Match` of unsafe methods
+    variant = f"{request.get_full_path()}|{request.accepted_media_type}|{parts}"
+    return f'"{hashlib.md5(variant.encode()).hexdigest()}"'
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime]
+) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        return "*" in etags or etag in etags
+
+    if_modified_since = parse_http_date_safe(
+        request.headers.get("If-Modified-Since", "")
+    )
+    return (
+        if_modified_since is not None
+        and last_modified is not None
+        and int(last_modified.timestamp()) <= if_modified_since
+    )
+
+
+def get_validators(
+    view: Any,
+    request: Request,
+    get_stamp: Callable[..., Optional[Stamp]],
+    kwargs: Dict[str, Any],
+) -> Optional[Tuple[str, Optional[datetime]]]:
+    """
+    ETag and last modification of the resource of a request, or None if it
+    does not exist.
+    """
+    try:
+        stamp = get_stamp(view=view, **kwargs)
+    except (TypeError, ValueError):
+        stamp = None
+    if stamp is None:
+        return None
+    expand = getattr(view, "get_expand", tuple)()
+    if expand:
+        stamp = combine_stamps(stamp, *(EXPAND_STAMPS[name]() for name in expand))
+
+    parts, last_modified = stamp
+    return make_etag(request, parts), last_modified
+
+
+def not_modified_response(etag: str) -> HttpResponse:
+    response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    response["ETag"] = etag
+    return response
+
+
+def set_validators(
+    response: HttpResponseBase, etag: str, last_modified: Optional[datetime]
+) -> None:
+    if response.status_code == 200:
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+
+
+def conditional_response(get_stamp: Callable[..., Optional[Stamp]]) -> Callable:
+    """
+    Answer conditional requests from a cheap version stamp of the resource.
+
+    Safe methods get `ETag`/`Last-Modified` headers and a 304 on a matching
+    `If-None-Match`/`If-Modified-Since`, without running the handler.
+    Unsafe methods with a non-matching `If-Match` are rejected with 412.
+    """
+
+    def decorator(handler: Callable) -> Callable:
+        @wraps(handler)
+        def wrapper(
+            view: APIView, request: Request, *args, **kwargs
+        ) -> HttpResponseBase:
+            if request.method not in SAFE_METHODS and "If-Match" not in request.headers:
+                # No precondition to check
+                return handler(view, request, *args, **kwargs)
+            validators = get_validators(view, request, get_stamp, kwargs)
+            if validators is None:
+                # Let the handler produce the 404
+                return handler(view, request, *args, **kwargs)
+
+            etag, last_modified = validators
+            if request.method in SAFE_METHODS:
+                if is_not_modified(request, etag, last_modified):
+                    return not_modified_response(etag)
+            else:
+                if_match = request.headers.get("If-Match")
+                if if_match is not None:
+                    etags = parse_etags(if_match)
+                    if "*" not in etags and etag not in etags:
+                        return Response(
+                            {"detail": "The resource has been modified."},
+                            status=status.HTTP_412_PRECONDITION_FAILED,
+                        )
+
+            response = handler(view, request, *args, **kwargs)
+            if request.method in SAFE_METHODS:
+                set_validators(response, etag, last_modified)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,21 @@
+from typing import Any
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(
+    sender: Any, connection: BaseDatabaseWrapper, **kwargs: Any
+) -> None:
+    """
+    Apply `TEAMS_SQLITE_PRAGMAS` to every new SQLite connection.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    # Run on the raw connection: these are not queries of the current request
+    for name, value in getattr(settings, "TEAMS_SQLITE_PRAGMAS", {}).items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
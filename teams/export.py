@@ -0,0 +1,96 @@
+import csv
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+from django.http import StreamingHttpResponse
+
+from teams.models import Person, Team
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_FORMATS = tuple(EXPORT_CONTENT_TYPES)
+
+
+def iter_people(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yield people with the names of their teams.
+
+    Rows are read with a server-side iterator and teams are prefetched
+    once per chunk, so memory does not grow with the table size.
+    """
+    people = Person.objects.order_by("pk").prefetch_related("teams")
+    for person in people.iterator(chunk_size=chunk_size):
+        yield {
+            "id": person.pk,
+            "first_name": person.first_name,
+            "last_name": person.last_name,
+            "email": person.email,
+            "teams": [team.name for team in person.teams.all()],
+        }
+
+
+def iter_teams(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    teams = Team.objects.order_by("pk").values("id", "name")
+    yield from teams.iterator(chunk_size=chunk_size)
+
+
+EXPORTERS: Dict[str, Tuple[Callable[[int], Iterator[dict]], Tuple[str, ...]]] = {
+    "people": (iter_people, ("id", "first_name", "last_name", "email", "teams")),
+    "teams": (iter_teams, ("id", "name")),
+}
+
+
+class _Echo:
+    """
+    File-like object whose `write` returns the value instead of buffering it.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def to_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def to_csv(
+    records: Iterable[Dict[str, Any]], fieldnames: Tuple[str, ...]
+) -> Iterator[str]:
+    # Lists, e.g. the team names of people, are written as JSON arrays, so
+    # that names holding any separator round-trip (the csv module quotes them)
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fieldnames)
+    for record in records:
+        yield writer.writerow(
+            [
+                json.dumps(value, ensure_ascii=False)
+                if isinstance(value, list)
+                else value
+                for value in (record[field] for field in fieldnames)
+            ]
+        )
+
+
+def export_lines(
+    resource: str, output_format: str, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Lazily render the given resource ("people" or "teams") as NDJSON or CSV lines.
+    """
+    iter_records, fieldnames = EXPORTERS[resource]
+    records = iter_records(chunk_size)
+    if output_format == "csv":
+        return to_csv(records, fieldnames)
+    return to_ndjson(records)
+
+
+def export_response(resource: str, output_format: str) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(
+        export_lines(resource, output_format),
+        content_type=EXPORT_CONTENT_TYPES[output_format],
+    )
+    response[
+        "Content-Disposition"
+    ] = f'attachment; filename="{resource}.{output_format}"'
+    return response
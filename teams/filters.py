@@ -0,0 +1,144 @@
+from typing import List, Optional
+
+from django.db.models import Count, QuerySet
+from django.db.models.functions import Lower
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from teams.models import Membership
+
+
+class AliasOrderingFilter(OrderingFilter):
+    """
+    Ordering filter that accepts API field names (`ordering_aliases`)
+    and only applies to the `list` action.
+    """
+
+    def get_ordering(
+        self, request: Request, queryset: QuerySet, view: APIView
+    ) -> Optional[List[str]]:
+        if getattr(view, "action", None) != "list":
+            return self.get_default_ordering(view)
+
+        ordering = super().get_ordering(request, queryset, view)
+        aliases = getattr(view, "ordering_aliases", {})
+        return [
+            ("-" if term.startswith("-") else "")
+            + aliases.get(term.lstrip("-"), term.lstrip("-"))
+            for term in ordering
+        ]
+
+
+def parse_int(request: Request, name: str) -> Optional[int]:
+    value = request.query_params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Expected an integer."})
+
+
+def parse_int_list(request: Request, name: str) -> List[int]:
+    values = [value for value in request.query_params.get(name, "").split(",") if value]
+    try:
+        return [int(value) for value in values]
+    except ValueError:
+        raise ValidationError({name: "Expected a comma-separated list of integers."})
+
+
+def filter_prefix(queryset: QuerySet, field: str, prefix: str) -> QuerySet:
+    """
+    Filter by prefix with a range condition, which can use a plain B-tree index
+    on every backend (SQLite does not use indexes for LIKE by default).
+    """
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return queryset.filter(**{f"{field}__gte": prefix, f"{field}__lt": upper_bound})
+
+
+class ListFilterBackend(BaseFilterBackend):
+    """
+    Base filter backend that only applies to the `list` action.
+    """
+
+    def filter_queryset(
+        self, request: Request, queryset: QuerySet, view: APIView
+    ) -> QuerySet:
+        if getattr(view, "action", None) != "list":
+            return queryset
+        return self.filter_list(request, queryset)
+
+    def filter_list(self, request: Request, queryset: QuerySet) -> QuerySet:
+        raise NotImplementedError
+
+
+class PersonFilter(ListFilterBackend):
+    """
+    Filter people by:
+
+    - `email`: exact email
+    - `email_iexact`: case-insensitive email (uses the LOWER(email) index)
+    - `last_name` / `first_name`: name prefixes
+    - `team`: comma-separated team ids, with `team_match=any` (default) or `all`
+    """
+
+    def filter_list(self, request: Request, queryset: QuerySet) -> QuerySet:
+        params = request.query_params
+
+        if params.get("email"):
+            queryset = queryset.filter(email=params["email"])
+
+        if params.get("email_iexact"):
+            queryset = queryset.alias(email_lower=Lower("email")).filter(
+                email_lower=params["email_iexact"].lower()
+            )
+
+        for field in ("last_name", "first_name"):
+            if params.get(field):
+                queryset = filter_prefix(queryset, field, params[field])
+
+        team_ids = parse_int_list(request, "team")
+        if team_ids:
+            queryset = queryset.filter(
+                pk__in=self.get_member_ids(team_ids, params.get("team_match", "any"))
+            )
+
+        return queryset
+
+    @staticmethod
+    def get_member_ids(team_ids: List[int], match: str) -> QuerySet:
+        if match not in ("any", "all"):
+            raise ValidationError({"team_match": "Expected 'any' or 'all'."})
+
+        # Served by the (team_id, person_id) index of the through table
+        memberships = Membership.objects.filter(team_id__in=team_ids)
+        if match == "all":
+            memberships = (
+                memberships.values("person_id")
+                .annotate(matched=Count("team_id"))
+                .filter(matched=len(set(team_ids)))
+            )
+        return memberships.values("person_id")
+
+
+class TeamFilter(ListFilterBackend):
+    """
+    Filter teams by `name` prefix and by `min_members`/`max_members`.
+    """
+
+    def filter_list(self, request: Request, queryset: QuerySet) -> QuerySet:
+        name = request.query_params.get("name")
+        if name:
+            queryset = filter_prefix(queryset, "name", name)
+
+        min_members = parse_int(request, "min_members")
+        if min_members is not None:
+            queryset = queryset.filter(member_count__gte=min_members)
+
+        max_members = parse_int(request, "max_members")
+        if max_members is not None:
+            queryset = queryset.filter(member_count__lte=max_members)
+
+        return queryset
@@ -0,0 +1,281 @@
+"""
+In-process adjacency index of the memberships, answering co-membership
+queries (colleagues of a person, teams overlapping a team) without
+self-joins of the through table.
+
+Each side is a dict of sorted `array("q")` of the related IDs, loaded lazily
+on the first query. Membership changes committed by this process are applied
+incrementally; changes made by other processes are caught up from the change
+log (teams.changes) at most every `TEAMS_GRAPH_SYNC_SECONDS`. Above
+`TEAMS_GRAPH_MAX_MEMBERSHIPS` the index is not loaded and queries are
+answered with SQL instead.
+"""
+
+import heapq
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, QuerySet
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from teams.changes import get_changes, get_latest_cursor
+from teams.models import Change, Membership, Person, Team
+from teams.signals import Pairs, bulk_saved, membership_changed
+
+ID_TYPECODE = "q"
+LOAD_CHUNK_SIZE = 10000
+# Changes read from the change log per query while catching up
+SYNC_BATCH_SIZE = 1000
+
+# (object id, number of shared teams or members), most shared first
+Overlap = Tuple[int, int]
+Adjacency = Dict[int, array]
+
+
+def get_max_memberships() -> int:
+    return getattr(settings, "TEAMS_GRAPH_MAX_MEMBERSHIPS", 2_000_000)
+
+
+def get_sync_seconds() -> float:
+    return getattr(settings, "TEAMS_GRAPH_SYNC_SECONDS", 1)
+
+
+def link(adjacency: Adjacency, key: int, value: int) -> None:
+    values = adjacency.get(key)
+    if values is None:
+        adjacency[key] = array(ID_TYPECODE, [value])
+        return
+    index = bisect_left(values, value)
+    if index == len(values) or values[index] != value:
+        values.insert(index, value)
+
+
+def unlink(adjacency: Adjacency, key: int, value: int) -> None:
+    values = adjacency.get(key)
+    if values is None:
+        return
+    index = bisect_left(values, value)
+    if index < len(values) and values[index] == value:
+        del values[index]
+        if not values:
+            del adjacency[key]
+
+
+def rank(counts: Counter, limit: int, offset: int) -> List[Overlap]:
+    best = heapq.nsmallest(
+        offset + limit, counts.items(), key=lambda item: (-item[1], item[0])
+    )
+    return best[offset:]
+
+
+class MembershipGraph:
+    """
+    Person -> teams and team -> members adjacency arrays.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Drop the index; it is loaded again by the next query.
+        """
+        with self.lock:
+            self.loaded = False
+            self.available = True
+            self.teams: Adjacency = {}
+            self.members: Adjacency = {}
+            self.memberships = 0
+            self.cursor = 0
+            self.synced_at = 0.0
+
+    def _load(self) -> None:
+        if Membership.objects.count() > get_max_memberships():
+            self.available = False
+            return
+        # Changes logged from here on are replayed by `_sync`
+        self.cursor = get_latest_cursor()
+        self.synced_at = time.monotonic()
+        teams: Dict[int, List[int]] = {}
+        members: Dict[int, List[int]] = {}
+        rows = Membership.objects.order_by("person_id", "team_id").values_list(
+            "person_id", "team_id"
+        )
+        for person_id, team_id in rows.iterator(chunk_size=LOAD_CHUNK_SIZE):
+            teams.setdefault(person_id, []).append(team_id)
+            members.setdefault(team_id, []).append(person_id)
+        self.teams = {pk: array(ID_TYPECODE, ids) for pk, ids in teams.items()}
+        self.members = {pk: array(ID_TYPECODE, ids) for pk, ids in members.items()}
+        self.memberships = sum(map(len, self.teams.values()))
+        self.loaded = True
+
+    def _sync(self) -> None:
+        """
+        Apply the changes logged by other processes since the last sync.
+        """
+        if time.monotonic() - self.synced_at < get_sync_seconds():
+            return
+        self.synced_at = time.monotonic()
+        if not getattr(settings, "TEAMS_CHANGE_LOG_ENABLED", True):
+            return
+        while changes := get_changes(self.cursor, SYNC_BATCH_SIZE):
+            self.cursor = changes[-1]["id"]
+            for change in changes:
+                if change["action"] == Change.RESYNC:
+                    self.loaded = False
+                    return
+                if change["resource"] == Change.MEMBERSHIP:
+                    pair = [(change["person_id"], change["team_id"])]
+                    if change["action"] == Change.ADDED:
+                        self._apply(pair, [])
+                    else:
+                        self._apply([], pair)
+                elif change["action"] == Change.DELETED:
+                    if change["resource"] == Change.TEAM:
+                        self._drop(self.members, self.teams, change["team_id"])
+                    else:
+                        self._drop(self.teams, self.members, change["person_id"])
+
+    def _ensure_loaded(self) -> bool:
+        if self.available and not self.loaded:
+            self._load()
+        elif self.loaded:
+            self._sync()
+            if not self.loaded:
+                self._load()
+        return self.loaded
+
+    def _apply(self, added: Pairs, removed: Pairs) -> None:
+        for person_id, team_id in removed:
+            if team_id in self.teams.get(person_id, ()):
+                self.memberships -= 1
+            unlink(self.teams, person_id, team_id)
+            unlink(self.members, team_id, person_id)
+        for person_id, team_id in added:
+            if team_id not in self.teams.get(person_id, ()):
+                self.memberships += 1
+            link(self.teams, person_id, team_id)
+            link(self.members, team_id, person_id)
+
+    def _drop(self, adjacency: Adjacency, reverse: Adjacency, pk: int) -> None:
+        related = adjacency.pop(pk, ())
+        self.memberships -= len(related)
+        for other in related:
+            unlink(reverse, other, pk)
+
+    def apply(self, added: Pairs, removed: Pairs) -> None:
+        with self.lock:
+            if self.loaded:
+                self._apply(added, removed)
+
+    def drop_team(self, team_id: int) -> None:
+        with self.lock:
+            if self.loaded:
+                self._drop(self.members, self.teams, team_id)
+
+    def colleagues(self, person_id: int, limit: int, offset: int = 0) -> List[Overlap]:
+        """
+        People sharing a team with the person, by number of shared teams.
+        """
+        with self.lock:
+            if self._ensure_loaded():
+                counts = Counter()
+                for team_id in self.teams.get(person_id, ()):
+                    counts.update(self.members[team_id])
+                counts.pop(person_id, None)
+                return rank(counts, limit, offset)
+        return list(
+            query_overlaps("person_id", "team_id", person_id)[offset : offset + limit]
+        )
+
+    def overlaps(self, team_id: int, limit: int, offset: int = 0) -> List[Overlap]:
+        """
+        Teams sharing members with the team, by number of shared members.
+        """
+        with self.lock:
+            if self._ensure_loaded():
+                counts = Counter()
+                for person_id in self.members.get(team_id, ()):
+                    counts.update(self.teams[person_id])
+                counts.pop(team_id, None)
+                return rank(counts, limit, offset)
+        return list(
+            query_overlaps("team_id", "person_id", team_id)[offset : offset + limit]
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Size of the index, including an estimate of its memory footprint.
+        """
+        with self.lock:
+            size = 0
+            for adjacency in (self.teams, self.members):
+                size += sys.getsizeof(adjacency)
+                size += sum(map(sys.getsizeof, adjacency.values()))
+                size += sum(map(sys.getsizeof, adjacency))
+            return {
+                "loaded": int(self.loaded),
+                "people": len(self.teams),
+                "teams": len(self.members),
+                "memberships": self.memberships,
+                "memory_bytes": size,
+            }
+
+    def render_metrics(self) -> str:
+        lines = []
+        for name, value in self.stats().items():
+            lines.append(f"# HELP teams_graph_{name} Membership graph index {name}.")
+            lines.append(f"# TYPE teams_graph_{name} gauge")
+            lines.append(f"teams_graph_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def query_overlaps(own_field: str, other_field: str, pk: int) -> QuerySet:
+    """
+    SQL fallback of the graph queries: objects sharing `other_field` values
+    with `pk`, by number of shared values.
+    """
+    shared = Membership.objects.filter(
+        **{
+            f"{other_field}__in": Membership.objects.filter(**{own_field: pk}).values(
+                other_field
+            )
+        }
+    ).exclude(**{own_field: pk})
+    return (
+        shared.values_list(own_field)
+        .annotate(shared=Count(other_field))
+        .order_by("-shared", own_field)
+    )
+
+
+membership_graph = MembershipGraph()
+
+
+@receiver(membership_changed, sender=Membership)
+def update_graph(added: Pairs, removed: Pairs, **kwargs) -> None:
+    # Rolled back changes must not reach the index
+    transaction.on_commit(lambda: membership_graph.apply(added, removed))
+
+
+@receiver(post_delete, sender=Team)
+def drop_deleted_team(instance: Team, **kwargs) -> None:
+    # Its memberships are deleted by the cascade, without signals
+    pk = instance.pk
+    transaction.on_commit(lambda: membership_graph.drop_team(pk))
+
+
+@receiver(bulk_saved, sender=Team)
+@receiver(bulk_saved, sender=Person)
+def reset_graph(pks: Optional[List[int]], **kwargs) -> None:
+    if pks is None:
+        transaction.on_commit(membership_graph.reset)
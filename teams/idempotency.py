@@ -0,0 +1,179 @@
+"""
+`Idempotency-Key` support for the write endpoints.
+
+The first request with a key stores its response; retries of the same
+request (same method, path and body) get the stored response back with
+a single lookup, without running the operation again. Keys are scoped to
+the client: the authenticated user, or the address of anonymous clients.
+
+Stored responses expire after `TEAMS_IDEMPOTENCY_TTL` and are deleted by
+`python manage.py purge_idempotency_keys`. A key stays claimed by a request
+in progress for `TEAMS_IDEMPOTENCY_LEASE` seconds at most, so that a worker
+that died mid-request does not block its retries.
+"""
+
+import hashlib
+from datetime import timedelta
+from functools import wraps
+from typing import Callable, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseBase
+from django.http.request import RawPostDataException
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from teams.models import IdempotencyKey
+from teams.renderers import dumps
+from teams.throttling import get_ident
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# Response headers stored and replayed along with the body
+STORED_HEADERS = ("Location",)
+MAX_KEY_LENGTH = 255
+
+
+def get_ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, "TEAMS_IDEMPOTENCY_TTL", 24 * 3600))
+
+
+def get_lease() -> timedelta:
+    return timedelta(seconds=getattr(settings, "TEAMS_IDEMPOTENCY_LEASE", 60))
+
+
+def get_scope(request: Request) -> str:
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"client:{get_ident(request)}"
+
+
+def get_fingerprint(request: Request) -> str:
+    try:
+        body = request._request.body
+    except RawPostDataException:
+        # The body was already streamed by the parser
+        body = dumps(request.data)
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def is_stale(entry: IdempotencyKey) -> bool:
+    """
+    Whether an entry expired, or is the claim of a request that has been
+    in progress for longer than the lease.
+    """
+    age = timezone.now() - entry.created_at
+    return age > get_ttl() or (entry.status_code is None and age > get_lease())
+
+
+def claim_key(scope: str, key: str, fingerprint: str) -> Tuple[IdempotencyKey, bool]:
+    """
+    Return the entry of `key` and whether it was just claimed for this
+    request. Stale entries are replaced.
+    """
+    entry = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+    if entry is not None and is_stale(entry):
+        # By PK: a concurrent retry may have replaced it already
+        IdempotencyKey.objects.filter(pk=entry.pk).delete()
+        entry = None
+    if entry is not None:
+        return entry, False
+
+    try:
+        with transaction.atomic():
+            entry = IdempotencyKey.objects.create(
+                scope=scope, key=key, fingerprint=fingerprint
+            )
+    except IntegrityError:
+        # Claimed by a concurrent request in the meantime
+        return IdempotencyKey.objects.get(scope=scope, key=key), False
+    return entry, True
+
+
+def purge_expired_keys() -> int:
+    deleted, _ = IdempotencyKey.objects.filter(
+        created_at__lt=timezone.now() - get_ttl()
+    ).delete()
+    return deleted
+
+
+def replay(entry: IdempotencyKey) -> HttpResponse:
+    response = HttpResponse(
+        bytes(entry.content),
+        content_type=entry.content_type or None,
+        status=entry.status_code,
+    )
+    for name, value in entry.headers.items():
+        response[name] = value
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def idempotent(handler: Callable) -> Callable:
+    """
+    Store the response of a write sent with an `Idempotency-Key` header and
+    replay it to retries of the same request.
+
+    Reusing a key for a different request is rejected with 422, and a retry
+    arriving while the first request is still running with 409.
+    Server errors are not stored, so that they can be retried.
+    """
+
+    @wraps(handler)
+    def wrapper(view: APIView, request: Request, *args, **kwargs) -> HttpResponseBase:
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return handler(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} is too long."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = get_fingerprint(request)
+        entry, claimed = claim_key(get_scope(request), key, fingerprint)
+        if not claimed:
+            if entry.fingerprint != fingerprint:
+                return Response(
+                    {"detail": f"{IDEMPOTENCY_HEADER} was used for another request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if entry.status_code is None:
+                return Response(
+                    {"detail": "A request with this key is in progress."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return replay(entry)
+
+        # By PK: once the lease is over, a retry may have claimed the key
+        claim = IdempotencyKey.objects.filter(pk=entry.pk)
+        try:
+            response = handler(view, request, *args, **kwargs)
+        except Exception:
+            claim.delete()
+            raise
+
+        if response.status_code >= 500:
+            claim.delete()
+            return response
+
+        response = view.finalize_response(request, response, *args, **kwargs)
+        response.render()
+        claim.update(
+            status_code=response.status_code,
+            content=response.content,
+            content_type=response.get("Content-Type", ""),
+            headers={
+                name: response[name] for name in STORED_HEADERS if name in response
+            },
+        )
+        return response
+
+    return wrapper
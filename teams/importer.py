@@ -0,0 +1,190 @@
+import csv
+import json
+import time
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from teams.models import Membership, Person, Team
+from teams.serializers import PersonImportSerializer
+from teams.signals import bulk_saved, membership_changed
+
+IMPORT_BATCH_SIZE = 2000
+PERSON_FIELDS = ("first_name", "last_name", "email")
+
+# Readers yield (line number, record) pairs, where the record is the
+# `ValidationError` of a line that could not be parsed
+Line = Tuple[int, Any]
+
+
+def read_ndjson(stream: TextIO) -> Iterator[Line]:
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, ValidationError(f"Invalid JSON: {exc}")
+
+
+def read_csv(stream: TextIO) -> Iterator[Line]:
+    # The "teams" column holds a JSON array of names, as exported
+    reader = csv.DictReader(stream)
+    for row in reader:
+        try:
+            row["teams"] = json.loads(row.get("teams") or "[]")
+        except ValueError as exc:
+            yield reader.line_num, ValidationError({"teams": [f"Invalid JSON: {exc}"]})
+            continue
+        yield reader.line_num, row
+
+
+READERS: Dict[str, Callable[[TextIO], Iterator[Line]]] = {
+    "ndjson": read_ndjson,
+    "csv": read_csv,
+}
+
+
+class PeopleImporter:
+    """
+    Import people in batches: one `bulk_create` for people
+    and one for through-table rows per batch.
+
+    Records are validated with `PersonImportSerializer`: invalid ones are
+    skipped and passed to `on_error` with their line number.
+    Team names are resolved with an in-memory name -> id map,
+    unknown teams are created on the fly.
+    With `upsert` enabled, people are matched by email and updated in place,
+    and the records of a batch with the same email are merged.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        upsert: bool = False,
+        progress: Optional[Callable[[int, float], None]] = None,
+        on_error: Optional[Callable[[int, Any], None]] = None,
+    ) -> None:
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.progress = progress
+        self.on_error = on_error
+        self.team_ids = dict(Team.objects.values_list("name", "id"))
+        self.stats = {"created": 0, "updated": 0, "memberships": 0, "skipped": 0}
+
+    def validate(self, lines: List[Line]) -> List[Dict[str, Any]]:
+        records = []
+        for number, data in lines:
+            if not isinstance(data, ValidationError):
+                serializer = PersonImportSerializer(data=data)
+                if serializer.is_valid():
+                    records.append(serializer.validated_data)
+                    continue
+                data = ValidationError(serializer.errors)
+            self.stats["skipped"] += 1
+            if self.on_error is not None:
+                self.on_error(number, data.detail)
+        return records
+
+    @staticmethod
+    def merge_duplicates(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        One record per email: the last one, with the teams of all of them.
+        """
+        merged: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            previous = merged.pop(record["email"], None)
+            if previous is not None:
+                teams = dict.fromkeys([*previous["teams"], *record["teams"]])
+                record = {**record, "teams": list(teams)}
+            merged[record["email"]] = record
+        return list(merged.values())
+
+    def resolve_teams(self, names: Iterable[str]) -> None:
+        missing = {name for name in names if name not in self.team_ids}
+        if not missing:
+            return
+        Team.objects.bulk_create(
+            [Team(name=name) for name in sorted(missing)], ignore_conflicts=True
+        )
+        created = dict(Team.objects.filter(name__in=missing).values_list("name", "id"))
+        self.team_ids.update(created)
+        bulk_saved.send(sender=Team, pks=list(created.values()), created=True)
+
+    def import_batch(self, records: List[Dict[str, Any]]) -> None:
+        self.resolve_teams(name for record in records for name in record["teams"])
+
+        existing = {}
+        if self.upsert:
+            records = self.merge_duplicates(records)
+            existing = dict(
+                Person.objects.filter(
+                    email__in=[record["email"] for record in records]
+                ).values_list("email", "id")
+            )
+
+        to_create = []
+        to_update = []
+        people = []
+        for record in records:
+            person = Person(**{field: record[field] for field in PERSON_FIELDS})
+            person.pk = existing.get(person.email)
+            (to_update if person.pk else to_create).append(person)
+            people.append(person)
+
+        Person.objects.bulk_create(to_create, batch_size=self.batch_size)
+        Person.objects.bulk_update(
+            to_update, ["first_name", "last_name"], batch_size=self.batch_size
+        )
+        Person.bump_versions(person.pk for person in to_update)
+        bulk_saved.send(
+            sender=Person, pks=[person.pk for person in to_create], created=True
+        )
+        bulk_saved.send(sender=Person, pks=[person.pk for person in to_update])
+
+        existing_pairs = set(
+            Membership.objects.filter(
+                person_id__in=[person.pk for person in to_update]
+            ).values_list("person_id", "team_id")
+        )
+        pairs = {
+            (person.pk, self.team_ids[name])
+            for person, record in zip(people, records)
+            for name in record["teams"]
+        } - existing_pairs
+        Membership.objects.bulk_create(
+            [Membership(person_id=pk, team_id=team_id) for pk, team_id in pairs],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        membership_changed.send(sender=Membership, added=list(pairs), removed=[])
+
+        self.stats["created"] += len(to_create)
+        self.stats["updated"] += len(to_update)
+        self.stats["memberships"] += len(pairs)
+
+    def run(self, lines: Iterable[Line]) -> Dict[str, int]:
+        started = time.perf_counter()
+        processed = 0
+        lines = iter(lines)
+        while batch := list(islice(lines, self.batch_size)):
+            records = self.validate(batch)
+            if records:
+                with transaction.atomic():
+                    self.import_batch(records)
+            processed += len(batch)
+            if self.progress is not None:
+                self.progress(processed, time.perf_counter() - started)
+        return self.stats
@@ -0,0 +1,310 @@
+"""
+Background jobs for membership changes and bulk writes too large for one
+request (`?async=true`).
+
+A job is persisted as a `Job` row, then processed on a process-local thread
+pool once the request transaction commits. Work is done in chunks of
+`TEAMS_JOB_CHUNK_SIZE` items, each committed in its own transaction so that
+locks are held briefly. The job row is updated with the progress, the change
+counts, the per-item errors and a heartbeat in the transaction of every
+chunk, so a job can resume exactly where it stopped.
+
+Jobs still pending when the process stops can be run with
+`manage.py run_pending_jobs`. It first requeues the running jobs without a
+heartbeat for `TEAMS_JOB_LEASE` seconds (their process died), or fails them
+after `TEAMS_JOB_MAX_ATTEMPTS` runs.
+"""
+
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+)
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Model, Q
+from django.utils import timezone
+from rest_framework.serializers import Serializer
+
+from teams.membership import add_person_to_teams, sync_team_members
+from teams.models import Job, Person, Team
+from teams.serializers import PersonSerializer, TeamSerializer
+
+logger = logging.getLogger("teams.jobs")
+
+# Errors stored on a job beyond this number are only counted
+MAX_JOB_ERRORS = 1000
+# Serializers of the bulk jobs by model name
+BULK_SERIALIZERS = {"team": TeamSerializer, "person": PersonSerializer}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_chunk_size() -> int:
+    return getattr(settings, "TEAMS_JOB_CHUNK_SIZE", 500)
+
+
+def get_lease() -> timedelta:
+    return timedelta(seconds=getattr(settings, "TEAMS_JOB_LEASE", 600))
+
+
+def get_max_attempts() -> int:
+    return getattr(settings, "TEAMS_JOB_MAX_ATTEMPTS", 3)
+
+
+class LeaseLost(Exception):
+    """
+    The job was requeued while this run was still processing it.
+    """
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "TEAMS_JOB_WORKERS", 2),
+                thread_name_prefix="teams-job",
+            )
+        return _executor
+
+
+class ChunkResult(NamedTuple):
+    processed: int
+    counts: Dict[str, int]
+    errors: List[Dict[str, Any]]
+
+
+def chunks(items: List[Any], offset: int = 0) -> Iterator[Tuple[int, List[Any]]]:
+    # From `offset`, the number of items a resumed job already processed
+    size = get_chunk_size()
+    for start in range(offset, len(items), size):
+        yield start, items[start : start + size]
+
+
+def split_existing(pks: List[int], model: Type[Model]) -> Tuple[List[int], List[dict]]:
+    """
+    Return the PKs of existing objects and errors for the missing ones.
+    """
+    existing = set(model.objects.filter(pk__in=pks).values_list("pk", flat=True))
+    errors = [
+        {"id": pk, "errors": [f"Invalid pk {pk} - object does not exist."]}
+        for pk in pks
+        if pk not in existing
+    ]
+    return [pk for pk in pks if pk in existing], errors
+
+
+def add_members(payload: Dict[str, Any], offset: int) -> Iterator[ChunkResult]:
+    for _, chunk in chunks(payload["person_ids"], offset):
+        pks, errors = split_existing(chunk, Person)
+        changes = sync_team_members(payload["team_id"], add=pks)
+        yield ChunkResult(len(chunk), {"added": changes["added"]}, errors)
+
+
+def add_to_teams(payload: Dict[str, Any], offset: int) -> Iterator[ChunkResult]:
+    for _, chunk in chunks(payload["team_ids"], offset):
+        pks, errors = split_existing(chunk, Team)
+        changes = add_person_to_teams(payload["person_id"], pks)
+        yield ChunkResult(len(chunk), {"added": changes["added"]}, errors)
+
+
+def save_valid_items(
+    make_serializer: Callable[[List[Any]], Serializer],
+    items: List[Any],
+    offset: int,
+) -> Tuple[int, List[dict]]:
+    """
+    Save the valid items of a chunk with a bulk list serializer and return
+    their number and the errors of the invalid ones, indexed in the payload.
+    """
+    serializer = make_serializer(items)
+    errors = []
+    if not serializer.is_valid():
+        errors = [
+            {"index": offset + index, "errors": item_errors}
+            for index, item_errors in enumerate(serializer.errors)
+            if item_errors
+        ]
+        invalid = {error["index"] - offset for error in errors}
+        items = [item for index, item in enumerate(items) if index not in invalid]
+        serializer = make_serializer(items)
+        serializer.is_valid(raise_exception=True)
+
+    if items:
+        with transaction.atomic():
+            serializer.save()
+    return len(items), errors
+
+
+def bulk_create(payload: Dict[str, Any], offset: int) -> Iterator[ChunkResult]:
+    serializer_class = BULK_SERIALIZERS[payload["model"]]
+    for start, chunk in chunks(payload["items"], offset):
+        created, errors = save_valid_items(
+            lambda items: serializer_class(data=items, many=True), chunk, start
+        )
+        yield ChunkResult(len(chunk), {"created": created}, errors)
+
+
+def bulk_update(payload: Dict[str, Any], offset: int) -> Iterator[ChunkResult]:
+    serializer_class = BULK_SERIALIZERS[payload["model"]]
+    model = serializer_class.Meta.model
+    for start, chunk in chunks(payload["items"], offset):
+        ids = [item.get("id") for item in chunk if isinstance(item, dict)]
+        instances = list(model.objects.filter(pk__in=ids))
+        updated, errors = save_valid_items(
+            lambda items: serializer_class(
+                instances, data=items, many=True, partial=True
+            ),
+            chunk,
+            start,
+        )
+        yield ChunkResult(len(chunk), {"updated": updated}, errors)
+
+
+def bulk_destroy(payload: Dict[str, Any], offset: int) -> Iterator[ChunkResult]:
+    model = BULK_SERIALIZERS[payload["model"]].Meta.model
+    for _, chunk in chunks(payload["ids"], offset):
+        with transaction.atomic():
+            pks, errors = split_existing(chunk, model)
+            deleted = (
+                model.objects.filter(pk__in=pks).delete()[1].get(model._meta.label, 0)
+            )
+        yield ChunkResult(len(chunk), {"deleted": deleted}, errors)
+
+
+# Handlers yield the results of the chunks of a payload from an item offset
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], int], Iterator[ChunkResult]]] = {
+    "add_members": add_members,
+    "add_to_teams": add_to_teams,
+    "bulk_create": bulk_create,
+    "bulk_update": bulk_update,
+    "bulk_destroy": bulk_destroy,
+}
+
+
+def submit_job(kind: str, payload: Dict[str, Any], total: int) -> Job:
+    """
+    Persist a job and queue it once the current transaction commits.
+    """
+    job = Job.objects.create(kind=kind, payload=payload, total=total)
+    transaction.on_commit(lambda: enqueue_job(job.pk))
+    return job
+
+
+def enqueue_job(job_id: int) -> None:
+    if getattr(settings, "TEAMS_JOBS_EAGER", False):
+        run_job(job_id)
+    else:
+        get_executor().submit(run_job_in_thread, job_id)
+
+
+def run_job_in_thread(job_id: int) -> None:
+    try:
+        run_job(job_id)
+    finally:
+        # Connections are per thread, do not leave them open in the pool
+        connections.close_all()
+
+
+def run_job(job_id: int) -> None:
+    # Claim the job, so that it never runs twice at the same time
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job_id, status=Job.PENDING).update(
+        status=Job.RUNNING,
+        started_at=now,
+        heartbeat_at=now,
+        attempts=F("attempts") + 1,
+    )
+    if not claimed:
+        return
+    job = Job.objects.get(pk=job_id)
+    # Updates of this run, which match nothing once the job is requeued
+    run = Job.objects.filter(pk=job_id, status=Job.RUNNING, attempts=job.attempts)
+
+    # Resumed from the progress of the previous runs, if any
+    processed = job.processed
+    counts = Counter(job.result)
+    error_count = counts.pop("errors", 0)
+    errors: List[Dict[str, Any]] = job.errors
+    job_status = Job.SUCCEEDED
+    try:
+        results = JOB_HANDLERS[job.kind](job.payload, processed)
+        while True:
+            # The chunk and the progress are committed together
+            with transaction.atomic():
+                chunk = next(results, None)
+                if chunk is None:
+                    break
+                chunk_counts = counts + Counter(chunk.counts)
+                chunk_errors = errors + chunk.errors[: MAX_JOB_ERRORS - len(errors)]
+                updated = run.update(
+                    processed=processed + chunk.processed,
+                    result={**chunk_counts, "errors": error_count + len(chunk.errors)},
+                    errors=chunk_errors,
+                    heartbeat_at=timezone.now(),
+                )
+                if not updated:
+                    raise LeaseLost()
+            processed += chunk.processed
+            counts, errors = chunk_counts, chunk_errors
+            error_count += len(chunk.errors)
+    except LeaseLost:
+        logger.warning("Job %s (%s) was requeued while running", job_id, job.kind)
+        return
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed", job_id, job.kind)
+        job_status = Job.FAILED
+        errors = [*errors, {"detail": str(exc)}]
+
+    run.update(
+        status=job_status,
+        processed=processed,
+        result={**counts, "errors": error_count},
+        errors=errors,
+        finished_at=timezone.now(),
+    )
+
+
+def requeue_stale_jobs() -> Tuple[int, int]:
+    """
+    Requeue the running jobs without a heartbeat for the lease, i.e. whose
+    process stopped, or fail those already run `TEAMS_JOB_MAX_ATTEMPTS`
+    times. Return the numbers of requeued and failed jobs.
+    """
+    now = timezone.now()
+    cutoff = now - get_lease()
+    stale = Job.objects.filter(status=Job.RUNNING).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at=None, started_at__lt=cutoff)
+    )
+    requeued = failed = 0
+    for job in stale:
+        # Unless its run sent a heartbeat in the meantime
+        run = Job.objects.filter(
+            pk=job.pk, status=Job.RUNNING, heartbeat_at=job.heartbeat_at
+        )
+        if job.attempts < get_max_attempts():
+            requeued += run.update(status=Job.PENDING)
+            continue
+        failed += run.update(
+            status=Job.FAILED,
+            errors=[
+                *job.errors,
+                {"detail": f"The job stopped responding {job.attempts} times."},
+            ],
+            finished_at=now,
+        )
+    return requeued, failed
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+from typing import Any, Callable, Dict, List
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.http import HttpResponseBase
+from django.test import AsyncClient, Client, override_settings
+from django.urls import include, path
+
+from teams.benchmark import percentile
+from teams.models import Person, Team
+from teams.urls import get_urlpatterns
+
+
+def get_urlconf(async_views: bool) -> ModuleType:
+    urlconf = ModuleType("bench_urlconf")
+    urlconf.urlpatterns = [
+        path("api/", include((get_urlpatterns(async_views), "teams"), "teams"))
+    ]
+    return urlconf
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Compare requests/sec and latency of the read endpoints served by the "
+        "WSGI (DRF) views and by the ASGI-native views. Requests go through "
+        "Django's in-process test clients, without a server, sockets or HTTP "
+        "parsing: this compares the two view stacks, it does not measure the "
+        "throughput of a deployment. Load-test real servers (e.g. gunicorn and "
+        "uvicorn) for that"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Path to request (repeatable), defaults to the main read endpoints",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        paths = options["paths"] or self.get_default_paths()
+        requests, concurrency = options["requests"], options["concurrency"]
+
+        for url in paths:
+            for name, run in (("wsgi", self.run_wsgi), ("asgi", self.run_asgi)):
+                urlconf = get_urlconf(async_views=name == "asgi")
+                with override_settings(
+                    ROOT_URLCONF=urlconf,
+                    DEBUG=False,
+                    ALLOWED_HOSTS=["testserver"],
+                    TEAMS_THROTTLE_ENABLED=False,
+                ):
+                    result = run(url, requests, concurrency)
+                self.stdout.write(
+                    f"{name} {url}: {result['rps']:.0f} req/s, "
+                    f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms"
+                )
+
+    @staticmethod
+    def get_default_paths() -> List[str]:
+        paths = ["/api/teams/", "/api/people/"]
+        team_id = Team.objects.values_list("pk", flat=True).first()
+        if team_id is not None:
+            paths += [f"/api/teams/{team_id}/", f"/api/teams/{team_id}/members/"]
+        person_id = Person.objects.values_list("pk", flat=True).first()
+        if person_id is not None:
+            paths.append(f"/api/people/{person_id}/")
+        return paths
+
+    @staticmethod
+    def check_response(response: HttpResponseBase) -> None:
+        if response.status_code != 200:
+            raise CommandError(f"Got status {response.status_code}, expected 200")
+
+    def timed(self, get: Callable, url: str) -> float:
+        start = time.perf_counter()
+        self.check_response(get(url))
+        return time.perf_counter() - start
+
+    def run_wsgi(self, url: str, requests: int, concurrency: int) -> Dict:
+        # Each worker thread stands for a thread of a threaded WSGI server
+        local = threading.local()
+
+        def get(request_url: str) -> HttpResponseBase:
+            if not hasattr(local, "client"):
+                local.client = Client()
+            return local.client.get(request_url)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            latencies = list(
+                executor.map(lambda _: self.timed(get, url), range(requests))
+            )
+        return summarize(latencies, time.perf_counter() - start)
+
+    def run_asgi(self, url: str, requests: int, concurrency: int) -> Dict:
+        async def run() -> List[float]:
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def timed_get() -> float:
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.get(url)
+                    latency = time.perf_counter() - start
+                self.check_response(response)
+                return latency
+
+            return await asyncio.gather(*(timed_get() for _ in range(requests)))
+
+        start = time.perf_counter()
+        latencies = asyncio.run(run())
+        return summarize(latencies, time.perf_counter() - start)
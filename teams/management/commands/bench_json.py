@@ -0,0 +1,89 @@
+import time
+from io import BytesIO
+from typing import Any, Callable
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.test import Client, override_settings
+from rest_framework import serializers
+
+from teams.models import Membership
+from teams.parsers import FastJSONParser
+from teams.renderers import FastJSONRenderer, dumps
+from teams.serializers import IntegerListField
+
+BACKENDS = ("json", "orjson")
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Compare the stdlib and orjson backends of the API renderer/parser "
+        "on payloads of the existing endpoints"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=1000)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        repeat = options["repeat"]
+
+        for url in ("/api/people/", "/api/teams/"):
+            data = self.get_response_data(url, options["page_size"])
+            self.compare(
+                f"render {url} ({len(data['results'])} rows)",
+                lambda: FastJSONRenderer().render(data),
+                repeat,
+            )
+
+        # Body of POST /api/teams/memberships/ replacing all memberships
+        teams = {}
+        for person_id, team_id in Membership.objects.values_list(
+            "person_id", "team_id"
+        ):
+            teams.setdefault(str(team_id), []).append(person_id)
+        body = dumps({"teams": teams})
+        self.compare(
+            f"parse /api/teams/memberships/ ({len(body) // 1024} KB)",
+            lambda: FastJSONParser().parse(BytesIO(body)),
+            repeat,
+        )
+
+        ids = [pk for members in teams.values() for pk in members]
+        fields = {
+            "ListField": serializers.ListField(child=serializers.IntegerField()),
+            "IntegerListField": IntegerListField(),
+        }
+        timings = {
+            name: self.timed(lambda: field.to_internal_value(ids), repeat)
+            for name, field in fields.items()
+        }
+        self.report(f"validate {len(ids)} ids", timings)
+
+    @staticmethod
+    def get_response_data(url: str, page_size: int) -> Any:
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            response = Client().get(url, {"page_size": page_size})
+        if response.status_code != 200:
+            raise CommandError(f"{url}: got status {response.status_code}")
+        return response.data
+
+    @staticmethod
+    def timed(func: Callable, repeat: int) -> float:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat
+
+    def compare(self, label: str, func: Callable, repeat: int) -> None:
+        timings = {}
+        for backend in BACKENDS:
+            with override_settings(TEAMS_JSON_BACKEND=backend):
+                timings[backend] = self.timed(func, repeat)
+        self.report(label, timings)
+
+    def report(self, label: str, timings: dict) -> None:
+        (slow_name, slow), (fast_name, fast) = timings.items()
+        self.stdout.write(
+            f"{label}: {slow_name} {slow * 1000:.2f} ms, "
+            f"{fast_name} {fast * 1000:.2f} ms ({slow / fast:.1f}x)"
+        )
@@ -0,0 +1,84 @@
+import json
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+
+from teams.benchmark import ACTIONS, BenchmarkRunner, check_budgets, seed_dataset
+from teams.cache import response_cache
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Seed a dataset and measure the query count, latency percentiles "
+        "and peak memory of every teams/people API action"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--teams", type=int, default=100)
+        parser.add_argument("--people", type=int, default=10000)
+        parser.add_argument(
+            "--density",
+            type=float,
+            default=0.03,
+            help="Fraction of the teams each person belongs to",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument(
+            "--action",
+            action="append",
+            dest="actions",
+            choices=[action.name for action in ACTIONS],
+            help="Action to run (repeatable), defaults to all of them",
+        )
+        parser.add_argument(
+            "--cache", action="store_true", help="Keep the response cache enabled"
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail when an action exceeds its query budget",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the seeded data afterwards"
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        iterations = options["iterations"]
+        if options["teams"] < 2 * (iterations + 1) or options["people"] < 10 * (
+            iterations + 1
+        ):
+            raise CommandError(
+                "Need at least 2 teams and 10 people per iteration (+1 warm-up)."
+            )
+
+        with transaction.atomic():
+            dataset = seed_dataset(
+                options["teams"], options["people"], options["density"], options["seed"]
+            )
+            report = BenchmarkRunner(
+                dataset,
+                iterations=iterations,
+                use_cache=options["cache"],
+                actions=options["actions"],
+            ).run()
+            if not options["keep"]:
+                transaction.set_rollback(True)
+        if not options["keep"]:
+            # Cached responses may refer to the rolled back data
+            response_cache.bump(["epoch"])
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as stream:
+                stream.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        errors = check_budgets(report)
+        if errors and options["check"]:
+            raise CommandError("\n".join(errors))
+        for error in errors:
+            self.stderr.write(error)
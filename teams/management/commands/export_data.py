@@ -0,0 +1,27 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from teams.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, EXPORTERS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Stream people (with their teams) or teams as NDJSON or CSV"  # noqa: VNE003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("resource", choices=list(EXPORTERS))
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+        parser.add_argument("--output", help="File path, stdout by default")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        lines = export_lines(
+            options["resource"], options["format"], options["chunk_size"]
+        )
+        if options["output"] is None:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        with open(options["output"], "w", encoding="utf-8", newline="") as file:
+            file.writelines(lines)
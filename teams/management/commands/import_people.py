@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from teams.importer import IMPORT_BATCH_SIZE, READERS, PeopleImporter
+
+
+class Command(BaseCommand):
+    help = "Stream people from an NDJSON or CSV file into the database"  # noqa: VNE003
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("path", type=Path)
+        parser.add_argument(
+            "--format",
+            choices=list(READERS),
+            help="Input format, detected from the file extension by default",
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            "--upsert",
+            action="store_true",
+            help="Update people with a matching email instead of creating duplicates",
+        )
+
+    def report_progress(self, processed: int, elapsed: float) -> None:
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(f"Processed {processed} rows ({rate:.0f} rows/s)")
+
+    def report_error(self, line: int, errors: Any) -> None:
+        self.stderr.write(f"Skipped line {line}: {json.dumps(errors)}")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        path = options["path"]
+        input_format = options["format"] or path.suffix.lstrip(".").lower()
+        if input_format not in READERS:
+            raise CommandError(
+                f"Unknown format {input_format!r}, use --format "
+                f"({', '.join(READERS)})."
+            )
+
+        importer = PeopleImporter(
+            batch_size=options["batch_size"],
+            upsert=options["upsert"],
+            progress=self.report_progress,
+            on_error=self.report_error,
+        )
+        with open(path, encoding="utf-8", newline="") as file:
+            stats = importer.run(READERS[input_format](file))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {stats['created']} people, updated {stats['updated']}, "
+                f"added {stats['memberships']} memberships, "
+                f"skipped {stats['skipped']} invalid rows."
+            )
+        )
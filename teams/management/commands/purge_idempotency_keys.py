@@ -0,0 +1,15 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from teams.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Delete the Idempotency-Key responses older than TEAMS_IDEMPOTENCY_TTL"
+    )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idempotency keys."))
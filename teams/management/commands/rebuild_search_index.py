@@ -0,0 +1,14 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from teams.search import get_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the people and teams search index"  # noqa: VNE003
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        index = get_search_index()
+        index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {type(index).__name__}."))
@@ -0,0 +1,13 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from teams.membership import recompute_member_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute Team.member_count from the membership table"  # noqa: VNE003
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        updated = recompute_member_counts()
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} teams."))
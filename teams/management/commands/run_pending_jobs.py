@@ -0,0 +1,26 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from teams.jobs import requeue_stale_jobs, run_job
+from teams.models import Job
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Requeue the ?async=true jobs left running by a stopped process, then "
+        "run the pending jobs"
+    )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        requeued, failed = requeue_stale_jobs()
+        if requeued or failed:
+            self.stdout.write(f"Requeued {requeued} and failed {failed} stale jobs.")
+        job_ids = list(
+            Job.objects.filter(status=Job.PENDING)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        for job_id in job_ids:
+            run_job(job_id)
+        self.stdout.write(self.style.SUCCESS(f"Ran {len(job_ids)} jobs."))
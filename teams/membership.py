@@ -0,0 +1,224 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Now
+
+from teams.models import Membership, Team
+from teams.signals import bulk_saved, membership_changed
+
+# Keep the number of bound parameters well below SQLite's limit
+MEMBERSHIP_BATCH_SIZE = 500
+
+# (person_id, team_id)
+Pair = Tuple[int, int]
+
+
+def supports_returning() -> bool:
+    # INSERT/DELETE ... RETURNING (PostgreSQL, SQLite 3.35+)
+    return connection.features.can_return_rows_from_bulk_insert
+
+
+def insert_memberships(pairs: List[Pair]) -> List[Pair]:
+    """
+    Insert (person_id, team_id) pairs, ignoring the existing ones, and return
+    the pairs actually inserted.
+
+    With RETURNING this is a single INSERT ... ON CONFLICT DO NOTHING per
+    batch, exact even when concurrent requests insert the same pairs.
+    """
+    inserted = []
+    # Two bound parameters per row
+    batch_size = MEMBERSHIP_BATCH_SIZE // 2
+    with connection.cursor() as cursor:
+        for start in range(0, len(pairs), batch_size):
+            chunk = pairs[start : start + batch_size]
+            if not supports_returning():
+                inserted.extend(_insert_missing(chunk))
+                continue
+            values = ", ".join(["(%s, %s)"] * len(chunk))
+            cursor.execute(
+                f"INSERT INTO {Membership._meta.db_table} (person_id, team_id) "
+                f"VALUES {values} ON CONFLICT DO NOTHING "
+                "RETURNING person_id, team_id",
+                [pk for pair in chunk for pk in pair],
+            )
+            inserted.extend(cursor.fetchall())
+    return inserted
+
+
+def _insert_missing(pairs: List[Pair]) -> List[Pair]:
+    # Without RETURNING, pairs inserted concurrently may be reported twice
+    existing = set(
+        Membership.objects.filter(
+            person_id__in={person_id for person_id, _ in pairs},
+            team_id__in={team_id for _, team_id in pairs},
+        ).values_list("person_id", "team_id")
+    )
+    missing = [pair for pair in dict.fromkeys(pairs) if pair not in existing]
+    Membership.objects.bulk_create(
+        [
+            Membership(person_id=person_id, team_id=team_id)
+            for person_id, team_id in missing
+        ],
+        ignore_conflicts=True,
+    )
+    return missing
+
+
+def delete_memberships(rows: Dict[int, Pair]) -> List[Pair]:
+    """
+    Delete through-table rows by their PKs and return the pairs actually
+    deleted. `rows` maps a row PK to its (person_id, team_id) pair.
+    """
+    row_ids = list(rows)
+    deleted = []
+    for start in range(0, len(row_ids), MEMBERSHIP_BATCH_SIZE):
+        chunk = row_ids[start : start + MEMBERSHIP_BATCH_SIZE]
+        if supports_returning():
+            deleted.extend(
+                _delete_returning(f"id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            )
+        else:
+            Membership.objects.filter(pk__in=chunk).delete()
+            deleted.extend(rows[pk] for pk in chunk)
+    return deleted
+
+
+def _delete_returning(condition: str, params: List[int]) -> List[Pair]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {Membership._meta.db_table} WHERE {condition} "
+            "RETURNING person_id, team_id",
+            params,
+        )
+        return cursor.fetchall()
+
+
+def _apply_diff(
+    pairs_to_add: List[Pair], rows_to_remove: Dict[int, Pair]
+) -> Dict[str, int]:
+    """
+    Insert (person_id, team_id) pairs and delete through-table rows by their PKs,
+    then report the pairs that actually changed.
+    `rows_to_remove` maps a through-table row PK to its (person_id, team_id) pair.
+    """
+    added = insert_memberships(pairs_to_add)
+    removed = delete_memberships(rows_to_remove)
+    membership_changed.send(sender=Membership, added=added, removed=removed)
+    return {"added": len(added), "removed": len(removed)}
+
+
+def remove_membership(person_id: int, team_id: int) -> int:
+    """
+    Remove a person from a team with a single DELETE and return the number
+    of removed memberships (0 or 1).
+    """
+    with transaction.atomic():
+        if supports_returning():
+            removed = _delete_returning(
+                "person_id = %s AND team_id = %s", [person_id, team_id]
+            )
+        else:
+            count = Membership.objects.filter(
+                person_id=person_id, team_id=team_id
+            ).delete()[0]
+            removed = [(person_id, team_id)] if count else []
+        if removed:
+            membership_changed.send(sender=Membership, added=[], removed=removed)
+    return len(removed)
+
+
+def sync_team_members(
+    team_id: int,
+    members: Optional[Iterable[int]] = None,
+    add: Iterable[int] = (),
+    remove: Iterable[int] = (),
+) -> Dict[str, int]:
+    """
+    Reconcile the members of a single team.
+
+    If ``members`` is given it is the desired full member set,
+    otherwise ``add``/``remove`` are applied as explicit changes.
+    """
+    if members is not None:
+        return sync_memberships({team_id: members})
+
+    with transaction.atomic():
+        to_remove = {}
+        remove = set(remove)
+        if remove:
+            current = dict(
+                Membership.objects.filter(team_id=team_id).values_list(
+                    "person_id", "id"
+                )
+            )
+            to_remove = {current[pk]: (pk, team_id) for pk in remove if pk in current}
+        # Existing members are skipped by the insert itself
+        to_add = [(pk, team_id) for pk in dict.fromkeys(add)]
+        return _apply_diff(to_add, to_remove)
+
+
+def add_person_to_teams(person_id: int, team_ids: Iterable[int]) -> Dict[str, int]:
+    """
+    Add a person to teams, skipping the teams it already belongs to.
+    """
+    with transaction.atomic():
+        return _apply_diff([(person_id, pk) for pk in dict.fromkeys(team_ids)], {})
+
+
+def sync_memberships(desired: Dict[int, Iterable[int]]) -> Dict[str, int]:
+    """
+    Replace the member sets of many teams at once.
+
+    ``desired`` maps a team id to the full set of its member ids.
+    The diff against the through table is applied with one bulk insert
+    and chunked bulk deletes inside a single transaction.
+    """
+    with transaction.atomic():
+        current: Dict[int, Dict[int, int]] = {team_id: {} for team_id in desired}
+        rows = Membership.objects.filter(team_id__in=list(desired)).values_list(
+            "id", "team_id", "person_id"
+        )
+        for row_id, team_id, person_id in rows.iterator():
+            current[team_id][person_id] = row_id
+
+        pairs_to_add = []
+        rows_to_remove = {}
+        for team_id, members in desired.items():
+            wanted: Set[int] = set(members)
+            existing = current[team_id]
+            pairs_to_add.extend(
+                (pk, team_id) for pk in sorted(wanted) if pk not in existing
+            )
+            rows_to_remove.update(
+                (row_id, (pk, team_id))
+                for pk, row_id in existing.items()
+                if pk not in wanted
+            )
+
+        return _apply_diff(pairs_to_add, rows_to_remove)
+
+
+def recompute_member_counts(team_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute `Team.member_count` from the through table with a single UPDATE.
+    """
+    counts = (
+        Membership.objects.filter(team_id=OuterRef("pk"))
+        .order_by()
+        .values("team_id")
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    teams = Team.objects.all()
+    if team_ids is not None:
+        team_ids = list(team_ids)
+        teams = teams.filter(pk__in=team_ids)
+    updated = teams.update(
+        member_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0)),
+        version=F("version") + 1,
+        updated_at=Now(),
+    )
+    bulk_saved.send(sender=Team, pks=team_ids)
+    return updated
@@ -0,0 +1,304 @@
+"""
+Per-route request metrics: request count, latency, DB query count and time,
+and response size. They are collected by `MetricsMiddleware` and exposed
+in the Prometheus text exposition format.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpRequest, HttpResponseBase
+
+logger = logging.getLogger("teams.slow_queries")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Routes not matched by the URLconf share one series, so that the number of
+# series stays bounded by the number of URL names
+UNMATCHED_ROUTE = "unmatched"
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+# Logged SQL is truncated to this length
+SLOW_QUERY_SQL_LENGTH = 1000
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # The last count is for values above every bucket (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self) -> List[Tuple[str, int]]:
+        """
+        Cumulative (upper bound, count) pairs, as exposed by Prometheus.
+        """
+        result = []
+        total = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            total += count
+            result.append((str(bound), total))
+        return result
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(**labels: Any) -> str:
+    pairs = ",".join(
+        f'{name}="{escape_label(value)}"' for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+class RequestMetrics:
+    """
+    Thread-safe in-process registry of the request metrics.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            # (route, method, status) -> count
+            self.requests: Counter = Counter()
+            self.latency: Dict[str, Histogram] = defaultdict(
+                lambda: Histogram(LATENCY_BUCKETS)
+            )
+            self.queries: Dict[str, Histogram] = defaultdict(
+                lambda: Histogram(QUERY_COUNT_BUCKETS)
+            )
+            self.db_seconds: Counter = Counter()
+            self.response_bytes: Counter = Counter()
+            self.slow_queries: Counter = Counter()
+
+    def observe(
+        self,
+        route: str,
+        method: str,
+        status: int,
+        duration: float,
+        tracker: "QueryTracker",
+        size: int,
+    ) -> None:
+        with self.lock:
+            self.requests[route, method, status] += 1
+            self.latency[route].observe(duration)
+            self.queries[route].observe(tracker.count)
+            self.db_seconds[route] += tracker.duration
+            self.response_bytes[route] += size
+            self.slow_queries[route] += tracker.slow
+
+    def render(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, description: str) -> None:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histograms(name: str, values: Dict[str, Histogram]) -> None:
+            for route, histogram in sorted(values.items()):
+                for bound, count in histogram.samples():
+                    labels = format_labels(route=route, le=bound)
+                    lines.append(f"{name}_bucket{labels} {count}")
+                labels = format_labels(route=route)
+                lines.append(f"{name}_sum{labels} {histogram.sum}")
+                lines.append(f"{name}_count{labels} {histogram.samples()[-1][1]}")
+
+        def counters(name: str, values: Counter) -> None:
+            for route, value in sorted(values.items()):
+                lines.append(f"{name}{format_labels(route=route)} {value}")
+
+        with self.lock:
+            metric("teams_http_requests_total", "counter", "Requests per route.")
+            for (route, method, status), count in sorted(self.requests.items()):
+                labels = format_labels(route=route, method=method, status=status)
+                lines.append(f"teams_http_requests_total{labels} {count}")
+
+            metric(
+                "teams_http_request_duration_seconds",
+                "histogram",
+                "Request latency per route.",
+            )
+            histograms("teams_http_request_duration_seconds", self.latency)
+
+            metric(
+                "teams_db_queries_per_request",
+                "histogram",
+                "SQL queries per request.",
+            )
+            histograms("teams_db_queries_per_request", self.queries)
+
+            metric(
+                "teams_db_query_seconds_total", "counter", "Time spent in SQL queries."
+            )
+            counters("teams_db_query_seconds_total", self.db_seconds)
+
+            metric(
+                "teams_http_response_size_bytes_total",
+                "counter",
+                "Size of the response bodies.",
+            )
+            counters("teams_http_response_size_bytes_total", self.response_bytes)
+
+            metric(
+                "teams_db_slow_queries_total",
+                "counter",
+                "SQL queries slower than TEAMS_SLOW_QUERY_MS.",
+            )
+            counters("teams_db_slow_queries_total", self.slow_queries)
+
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+class QueryTracker:
+    """
+    `execute_wrapper` counting and timing the SQL queries of one request,
+    logging those slower than `TEAMS_SLOW_QUERY_MS`.
+    """
+
+    def __init__(self, request: HttpRequest) -> None:
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+        self.slow = 0
+        self.slow_threshold = getattr(settings, "TEAMS_SLOW_QUERY_MS", 100) / 1000
+
+    def __call__(
+        self, execute: Callable, sql: str, params: Any, many: bool, context: Dict
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slow_threshold:
+                self.slow += 1
+                logger.warning(
+                    "Slow query (%.1f ms) on %s %s: %s",
+                    duration * 1000,
+                    self.request.method,
+                    self.request.path,
+                    sql[:SLOW_QUERY_SQL_LENGTH],
+                    extra={"duration": duration, "sql": sql, "params": params},
+                )
+
+
+# Tracker of the current request. Context variables are copied to the
+# threads of `sync_to_async`, so queries run there are counted too
+_tracker: ContextVar[Optional[QueryTracker]] = ContextVar(
+    "teams_query_tracker", default=None
+)
+
+
+def track_query(
+    execute: Callable, sql: str, params: Any, many: bool, context: Dict
+) -> Any:
+    tracker = _tracker.get()
+    if tracker is None:
+        return execute(sql, params, many, context)
+    return tracker(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_tracking(
+    sender: Any, connection: BaseDatabaseWrapper, **kwargs: Any
+) -> None:
+    # Connections are per thread and reconnect on the same wrapper object
+    if track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_query)
+
+
+def get_route(request: HttpRequest) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else UNMATCHED_ROUTE
+
+
+def get_response_size(response: HttpResponseBase) -> int:
+    if response.streaming:
+        # The body is not produced yet; only a declared length is known
+        return int(response.get("Content-Length", 0))
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """
+    Record the metrics of every request. It should come first in `MIDDLEWARE`
+    so that the latency covers the other middleware too. It runs natively
+    under both WSGI and ASGI, so that async views stay on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponseBase:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, "TEAMS_METRICS_ENABLED", True):
+            return self.get_response(request)
+
+        tracker = QueryTracker(request)
+        token = _tracker.set(tracker)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _tracker.reset(token)
+        self.observe(request, response, tracker, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        if not getattr(settings, "TEAMS_METRICS_ENABLED", True):
+            return await self.get_response(request)
+
+        tracker = QueryTracker(request)
+        token = _tracker.set(tracker)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _tracker.reset(token)
+        self.observe(request, response, tracker, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def observe(
+        request: HttpRequest,
+        response: HttpResponseBase,
+        tracker: QueryTracker,
+        duration: float,
+    ) -> None:
+        request_metrics.observe(
+            get_route(request),
+            request.method if request.method in HTTP_METHODS else "other",
+            response.status_code,
+            duration,
+            tracker,
+            get_response_size(response),
+        )
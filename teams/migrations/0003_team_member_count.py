@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_member_count(apps, schema_editor):
+    Team = apps.get_model("teams", "Team")
+    Membership = apps.get_model("teams", "Person").teams.through
+    counts = (
+        Membership.objects.filter(team_id=OuterRef("pk"))
+        .order_by()
+        .values("team_id")
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    Team.objects.update(
+        member_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teams", "0002_alter_person_teams"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="team",
+            name="member_count",
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(fill_member_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.6 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teams", "0003_team_member_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="person",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="person",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="team",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="team",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.6 on 2026-10-17 23:12
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teams", "0004_versions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="person",
+            name="email",
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name="person",
+            index=models.Index(
+                fields=["last_name", "first_name"], name="person_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="person",
+            index=models.Index(
+                django.db.models.functions.text.Lower("email"),
+                name="person_email_lower_idx",
+            ),
+        ),
+        # Reverse index of the auto-created through table, so that
+        # "members of team X" lookups are served from the index alone
+        migrations.RunSQL(
+            "CREATE INDEX teams_person_teams_team_person_idx "
+            "ON teams_person_teams (team_id, person_id)",
+            "DROP INDEX teams_person_teams_team_person_idx",
+        ),
+    ]
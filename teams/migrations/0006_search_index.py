@@ -0,0 +1,58 @@
+from django.db import OperationalError, migrations, transaction
+
+FTS_TABLE = "teams_search"
+
+
+def supports_fts5_trigrams(connection) -> bool:
+    """
+    Whether SQLite has FTS5 and its trigram tokenizer (SQLite 3.34+).
+    """
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "CREATE VIRTUAL TABLE temp.teams_search_probe "
+                    "USING fts5(content, tokenize='trigram')"
+                )
+                cursor.execute("DROP TABLE temp.teams_search_probe")
+    except OperationalError:
+        return False
+    return True
+
+
+def create_search_table(apps, schema_editor):
+    # The FTS5 index is SQLite-only, other backends and SQLite builds
+    # without it use the in-process index (see teams.search.fts_available)
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    if not supports_fts5_trigrams(schema_editor.connection):
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        "USING fts5(content, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, content) "
+        "SELECT id * 2, ' ' || lower(name) || ' ' FROM teams_team"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, content) "
+        "SELECT id * 2 + 1, "
+        "' ' || lower(first_name || ' ' || last_name || ' ' || email) || ' ' "
+        "FROM teams_person"
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teams", "0005_person_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
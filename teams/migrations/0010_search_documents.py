@@ -0,0 +1,107 @@
+from django.db import migrations
+
+FTS_TABLE = "teams_search"
+FTS_DOCUMENT_TABLE = "teams_search_document"
+FTS_KEY_BITS = 40
+CHUNK_SIZE = 300
+
+# The FTS5 table indexes the documents table (external content), and
+# triggers keep it in sync so that every write is a single statement
+CREATE_STATEMENTS = [
+    f"CREATE TABLE {FTS_DOCUMENT_TABLE} (key INTEGER PRIMARY KEY, "
+    "sort_key INTEGER NOT NULL UNIQUE, content TEXT NOT NULL)",
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(content, tokenize='trigram', "
+    f"content='{FTS_DOCUMENT_TABLE}', content_rowid='sort_key')",
+    f"CREATE TRIGGER {FTS_DOCUMENT_TABLE}_insert "
+    f"AFTER INSERT ON {FTS_DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE} (rowid, content) "
+    "VALUES (new.sort_key, new.content); END",
+    f"CREATE TRIGGER {FTS_DOCUMENT_TABLE}_delete "
+    f"AFTER DELETE ON {FTS_DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, content) "
+    "VALUES ('delete', old.sort_key, old.content); END",
+    f"CREATE TRIGGER {FTS_DOCUMENT_TABLE}_update "
+    f"AFTER UPDATE ON {FTS_DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, content) "
+    "VALUES ('delete', old.sort_key, old.content); "
+    f"INSERT INTO {FTS_TABLE} (rowid, content) "
+    "VALUES (new.sort_key, new.content); END",
+]
+
+
+def normalize(text):
+    return " " + " ".join(text.lower().split()) + " "
+
+
+def count_trigrams(text):
+    return len({text[i : i + 3] for i in range(len(text) - 2)})
+
+
+def get_tables(schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return []
+    return connection.introspection.table_names()
+
+
+def create_documents(apps, schema_editor):
+    # Without FTS5, migration 0006 did not create the table
+    if FTS_TABLE not in get_tables(schema_editor):
+        return
+    schema_editor.execute(f"DROP TABLE {FTS_TABLE}")
+    for statement in CREATE_STATEMENTS:
+        schema_editor.execute(statement)
+
+    # Keys are `pk * 2 + kind` and sort keys lead with the number of
+    # trigrams of the document (see teams.search.FTSSearchIndex)
+    sources = [
+        (apps.get_model("teams", "Team"), 0, ("name",)),
+        (apps.get_model("teams", "Person"), 1, ("first_name", "last_name", "email")),
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        for model, kind, fields in sources:
+            rows = model.objects.order_by("pk").values_list("pk", *fields)
+            chunk = []
+            for pk, *values in rows.iterator(chunk_size=CHUNK_SIZE):
+                text = normalize(" ".join(values))
+                key = pk * 2 + kind
+                chunk.append((key, count_trigrams(text) << FTS_KEY_BITS | key, text))
+                if len(chunk) == CHUNK_SIZE:
+                    insert_documents(cursor, chunk)
+                    chunk = []
+            if chunk:
+                insert_documents(cursor, chunk)
+
+
+def insert_documents(cursor, chunk):
+    values = ", ".join(["(%s, %s, %s)"] * len(chunk))
+    cursor.execute(
+        f"INSERT INTO {FTS_DOCUMENT_TABLE} (key, sort_key, content) VALUES {values}",
+        [value for row in chunk for value in row],
+    )
+
+
+def drop_documents(apps, schema_editor):
+    if FTS_DOCUMENT_TABLE not in get_tables(schema_editor):
+        return
+    # Back to the FTS table of migration 0006, with the keys as rowids
+    schema_editor.execute(f"DROP TABLE {FTS_TABLE}")
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(content, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, content) "
+        f"SELECT key, content FROM {FTS_DOCUMENT_TABLE}"
+    )
+    # Drops its triggers too
+    schema_editor.execute(f"DROP TABLE {FTS_DOCUMENT_TABLE}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teams", "0009_change_log"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_documents, drop_documents),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.6 on 2026-10-18 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("teams", "0011_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="scope",
+            field=models.CharField(default="", max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="idempotencykey",
+            name="key",
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AddConstraint(
+            model_name="idempotencykey",
+            constraint=models.UniqueConstraint(
+                fields=("scope", "key"), name="idempotency_key_scope_unique"
+            ),
+        ),
+    ]
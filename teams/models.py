@@ -1,23 +1,191 @@
-from django.db import models
+from typing import Iterable, Type
 
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
 
-class Team(models.Model):
+
+class VersionedModel(models.Model):
+    # Stamps used for ETag / Last-Modified headers,
+    # also bumped when memberships of the object change.
+    # Indexed for the MAX(updated_at) of list stamps
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs) -> None:
+        if not self._state.adding:
+            # Increment in the database, the in-memory value may be stale
+            self.version = F("version") + 1
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "version", "updated_at"}
+        # The change log entry is written by a post_save receiver,
+        # in the same transaction as the change
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def bump_versions(cls: Type["VersionedModel"], pks: Iterable[int]) -> int:
+        pks = list(pks)
+        now = timezone.now()
+        updated = 0
+        # Keep the number of bound parameters well below SQLite's limit
+        for start in range(0, len(pks), 500):
+            updated += cls.objects.filter(pk__in=pks[start : start + 500]).update(
+                version=F("version") + 1, updated_at=now
+            )
+        return updated
+
+
+class Team(VersionedModel):
     # Prevent creating teams with the same name
     name = models.CharField(max_length=255, unique=True)
+    # Denormalized number of members, maintained by teams.signals
+    member_count = models.PositiveIntegerField(default=0, db_index=True)
+
+    def save(self, *args, **kwargs) -> None:
+        # Never overwrite member_count with a possibly stale in-memory value
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "member_count"
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return self.name
 
 
-class Person(models.Model):
+class Person(VersionedModel):
     first_name = models.CharField(max_length=255)
     last_name = models.CharField(max_length=255)
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
     # A person can belong to several teams or not belong to any
     teams = models.ManyToManyField(Team, related_name="members", blank=True)
 
     class Meta:
         verbose_name_plural = "people"
+        indexes = [
+            models.Index(fields=["last_name", "first_name"], name="person_name_idx"),
+            models.Index(Lower("email"), name="person_email_lower_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.first_name} {self.last_name}"
+
+
+# The auto-created through table behind Person.teams / Team.members
+Membership = Person.teams.through
+
+
+class Job(models.Model):
+    """
+    Long membership/bulk operation processed in chunks by teams.jobs.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    payload = models.JSONField(default=dict)
+    # Number of items to process and already processed
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    # Counts of the changes, e.g. {"added": 10}
+    result = models.JSONField(default=dict)
+    # Per-item errors, or the error that made the job fail
+    errors = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Runs claimed so far, and the last sign of life of the current run:
+    # running jobs without one for TEAMS_JOB_LEASE are stale
+    attempts = models.PositiveSmallIntegerField(default=0)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a write sent with an `Idempotency-Key` header, replayed
+    to the retries of the same request (see teams.idempotency).
+    """
+
+    # Client the key belongs to: the user, or the address of anonymous clients
+    scope = models.CharField(max_length=255, default="")
+    key = models.CharField(max_length=255)
+    # Hash of the method, path and body of the request
+    fingerprint = models.CharField(max_length=64)
+    # Null while the first request is in progress
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content = models.BinaryField(default=b"")
+    content_type = models.CharField(max_length=255, blank=True)
+    headers = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "key"], name="idempotency_key_scope_unique"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.scope} {self.key}"
+
+
+class Change(models.Model):
+    """
+    Append-only log of the changes of teams, people and memberships, written
+    in the transaction of the change (see teams.changes). Its PK is the
+    cursor of the change feed.
+    """
+
+    TEAM = "team"
+    PERSON = "person"
+    MEMBERSHIP = "membership"
+    RESOURCE_CHOICES = [(TEAM, "Team"), (PERSON, "Person"), (MEMBERSHIP, "Membership")]
+
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    ADDED = "added"
+    REMOVED = "removed"
+    # Many objects changed at once: consumers should re-fetch the resource
+    RESYNC = "resync"
+    ACTION_CHOICES = [
+        (CREATED, "Created"),
+        (UPDATED, "Updated"),
+        (DELETED, "Deleted"),
+        (ADDED, "Added"),
+        (REMOVED, "Removed"),
+        (RESYNC, "Resync"),
+    ]
+
+    resource = models.CharField(max_length=16, choices=RESOURCE_CHOICES)
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    # Not foreign keys: the log outlives the objects
+    team_id = models.BigIntegerField(null=True, blank=True)
+    person_id = models.BigIntegerField(null=True, blank=True)
+    # State of the team/person after a create or update
+    data = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.resource} {self.action} #{self.pk}"
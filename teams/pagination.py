@@ -0,0 +1,67 @@
+from typing import Any, Dict, List
+
+from django.db.models import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.request import Request
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Opaque cursor pagination over the primary key.
+
+    Pages are fetched with ``WHERE id > <cursor> ORDER BY id LIMIT n``,
+    so every page costs the same regardless of how deep the client goes.
+    """
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    async def apaginate_queryset(
+        self, queryset: QuerySet, request: Request
+    ) -> List[Any]:
+        """
+        Async counterpart of `paginate_queryset` for the async views.
+        It produces and accepts the same cursors, relying on `id` being unique.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        position = self.cursor.position if self.cursor else None
+        reverse = self.cursor.reverse if self.cursor else False
+
+        try:
+            if position is not None:
+                lookup = "id__lt" if reverse else "id__gt"
+                queryset = queryset.filter(**{lookup: int(position)})
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        queryset = queryset.order_by("-id" if reverse else "id")
+
+        results = [row async for row in queryset[: self.page_size + 1]]
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        first, last = (results[0], results[-1]) if results else (None, None)
+        if reverse:
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        next_position = str(last["id"]) if last else position
+        previous_position = str(first["id"]) if first else position
+        self.async_links = {
+            "next": self.encode_cursor(Cursor(0, False, next_position))
+            if has_next
+            else None,
+            "previous": self.encode_cursor(Cursor(0, True, previous_position))
+            if has_previous
+            else None,
+        }
+        return results
+
+    def get_paginated_data(self, data: List[Any]) -> Dict[str, Any]:
+        return {**self.async_links, "results": data}
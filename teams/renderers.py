@@ -0,0 +1,66 @@
+from typing import Any, Optional
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Keys are stringified and datetimes are left to DRF's encoder,
+# so that the output is the same as with the stdlib backend
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+)
+
+
+def use_orjson() -> bool:
+    """
+    Whether to use orjson (`TEAMS_JSON_BACKEND`: "auto", "orjson" or "json"),
+    "auto" using it when it is installed.
+    """
+    backend = getattr(settings, "TEAMS_JSON_BACKEND", "auto")
+    if backend == "orjson" and orjson is None:
+        raise ImportError("TEAMS_JSON_BACKEND is 'orjson' but it is not installed.")
+    return orjson is not None and backend in ("auto", "orjson")
+
+
+def encode_default(obj: Any) -> Any:
+    # Types orjson does not know natively (Decimal, lazy strings, querysets...)
+    return JSONEncoder().default(obj)
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Compact UTF-8 JSON with the configured backend.
+    """
+    if not use_orjson():
+        return JSONRenderer().render(data)
+
+    ret = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+    # Same escaping as JSONRenderer: these are not valid inside JavaScript
+    return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` producing the same compact output with orjson when available.
+    Indented output (e.g. for the browsable API) still uses the stdlib encoder.
+    """
+
+    def render(
+        self,
+        data: Any,
+        accepted_media_type: Optional[str] = None,
+        renderer_context: Optional[dict] = None,
+    ) -> bytes:
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        if not use_orjson() or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return dumps(data)
@@ -0,0 +1,154 @@
+"""
+Read-replica routing with read-your-writes consistency.
+
+Reads go to the primary database unless a view opts in with `replica_reads`,
+which the teams/people viewsets do for their read actions. A client that has
+just written is pinned to the primary for `TEAMS_REPLICA_PIN_SECONDS` through
+a cookie and a header set by `PrimaryPinMiddleware`, so that e.g. adding
+members and then listing them is consistent even if replicas lag behind.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional, Type
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Model
+from django.http import HttpRequest, HttpResponseBase
+
+PIN_COOKIE = "teams_primary_until"
+# Clients that do not keep cookies can echo the response header back
+PIN_HEADER = "X-Primary-Until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_use_replica: ContextVar[bool] = ContextVar("teams_use_replica", default=False)
+# Whether the client of the current request is pinned to the primary,
+# set by `PrimaryPinMiddleware` (None outside of it)
+_pinned: ContextVar[Optional[bool]] = ContextVar("teams_primary_pinned", default=None)
+
+
+def get_replicas() -> List[str]:
+    return getattr(settings, "TEAMS_READ_REPLICAS", [])
+
+
+def get_pin_seconds() -> int:
+    return getattr(settings, "TEAMS_REPLICA_PIN_SECONDS", 5)
+
+
+def reading_from_replica() -> bool:
+    return _use_replica.get() and bool(get_replicas())
+
+
+def read_pin(request: HttpRequest) -> bool:
+    for value in (
+        request.COOKIES.get(PIN_COOKIE),
+        request.headers.get(PIN_HEADER),
+    ):
+        try:
+            if value and float(value) > time.time():
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def is_pinned(request: HttpRequest) -> bool:
+    """
+    Whether the client wrote recently and must read from the primary.
+    """
+    pinned = _pinned.get()
+    if pinned is None:
+        pinned = read_pin(request)
+    return pinned
+
+
+@contextmanager
+def replica_reads(request: HttpRequest, enabled: bool = True) -> Iterator[None]:
+    """
+    Route the reads done in this block to a replica, unless the request
+    is not a safe one or its client is pinned to the primary.
+    """
+    enabled = enabled and request.method in SAFE_METHODS and not is_pinned(request)
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads to a random replica of `TEAMS_READ_REPLICAS` inside
+    `replica_reads`, and everything else to the primary.
+    """
+
+    def db_for_read(self, model: Type[Model], **hints: Any) -> Optional[str]:
+        replicas = get_replicas()
+        if replicas and _use_replica.get():
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model: Type[Model], **hints: Any) -> Optional[str]:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1: Model, obj2: Model, **hints: Any) -> bool:
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, **hints: Any) -> bool:
+        # Replicas get the schema through replication
+        return db not in get_replicas()
+
+
+class PrimaryPinMiddleware:
+    """
+    Pin clients to the primary after a successful write. It runs natively
+    under both WSGI and ASGI; the pin of the request is kept in a context
+    variable, which also reaches the threads of `sync_to_async`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponseBase:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _pinned.set(read_pin(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        token = _pinned.set(read_pin(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        self.pin(request, response)
+        return response
+
+    @staticmethod
+    def pin(request: HttpRequest, response: HttpResponseBase) -> None:
+        if (
+            get_replicas()
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            seconds = get_pin_seconds()
+            until = f"{time.time() + seconds:.3f}"
+            response.set_cookie(
+                PIN_COOKIE, until, max_age=seconds, httponly=True, samesite="Lax"
+            )
+            response[PIN_HEADER] = until
@@ -0,0 +1,372 @@
+import heapq
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+# Module import: teams.changes imports this module through teams.signals
+from teams import changes as change_log
+from teams.models import Change, Person, Team
+
+TEAM = "team"
+PERSON = "person"
+KINDS = (TEAM, PERSON)
+
+# FTS5 index of the documents of FTS_DOCUMENT_TABLE, kept in sync by triggers
+FTS_TABLE = "teams_search"
+FTS_DOCUMENT_TABLE = "teams_search_document"
+# Low bits of an FTS rowid holding the key of the document
+FTS_KEY_BITS = 40
+# Typo-tolerant candidates rescored by similarity per query
+FTS_CANDIDATES = 200
+INDEX_CHUNK_SIZE = 1000
+# Changes read from the change log per query while catching up
+SYNC_BATCH_SIZE = 1000
+# Change log resource -> (kind, ID field of the change)
+SYNC_RESOURCES = {Change.TEAM: (TEAM, "team_id"), Change.PERSON: (PERSON, "person_id")}
+
+# (kind, object id, score), best matches first
+SearchResult = Tuple[str, int, float]
+
+
+def get_sync_seconds() -> float:
+    return getattr(settings, "TEAMS_SEARCH_SYNC_SECONDS", 1)
+
+
+def get_statement_size(params_per_row: int) -> int:
+    """
+    Rows written per statement, within the parameter limit of the database.
+    """
+    limit = connection.features.max_query_params or INDEX_CHUNK_SIZE * params_per_row
+    return min(INDEX_CHUNK_SIZE, limit // params_per_row)
+
+
+def iter_documents(
+    kind: str, pks: Optional[List[int]] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (pk, normalized searchable text) of teams or people.
+    """
+    if kind == TEAM:
+        rows = Team.objects.values_list("pk", "name")
+    else:
+        rows = Person.objects.values_list("pk", "first_name", "last_name", "email")
+    rows = rows.order_by("pk")
+
+    if pks is None:
+        batches = [rows.iterator(chunk_size=INDEX_CHUNK_SIZE)]
+    else:
+        batches = (
+            rows.filter(pk__in=pks[start : start + INDEX_CHUNK_SIZE])
+            for start in range(0, len(pks), INDEX_CHUNK_SIZE)
+        )
+
+    for batch in batches:
+        for pk, *fields in batch:
+            yield pk, normalize(" ".join(fields))
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase and pad every word with spaces, so that the leading trigram
+    of a word (" sm" for "smith") makes two-letter prefixes searchable.
+    """
+    return " " + " ".join(text.lower().split()) + " "
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def query_trigrams(query: str) -> Set[str]:
+    # No trailing space: the last word of the query is a prefix
+    return trigrams(normalize(query)[:-1])
+
+
+def quote(text: str) -> str:
+    # FTS5 string, matched as a phrase of its trigrams
+    return '"{}"'.format(text.replace('"', '""'))
+
+
+def similarity(searched: Set[str], text: str) -> float:
+    """
+    Jaccard similarity of the query trigrams and the trigrams of a document.
+    """
+    document = trigrams(text)
+    shared = len(searched & document)
+    return shared / (len(searched) + len(document) - shared)
+
+
+class SearchIndex:
+    """
+    Interface of the person/team search index kept in sync by teams.signals.
+    """
+
+    def index(self, kind: str, pks: Optional[List[int]] = None) -> None:
+        """
+        (Re)index the given objects, or every object of `kind` if `pks` is None.
+        """
+        raise NotImplementedError
+
+    def remove(self, kind: str, pks: Iterable[int]) -> None:
+        raise NotImplementedError
+
+    def search(self, query: str, limit: int, offset: int = 0) -> List[SearchResult]:
+        raise NotImplementedError
+
+    def rebuild(self) -> None:
+        for kind in KINDS:
+            self.index(kind)
+
+
+class FTSSearchIndex(SearchIndex):
+    """
+    SQLite FTS5 index with the trigram tokenizer.
+
+    Documents are keyed by `pk * 2 + kind`, so updates and deletes are
+    primary key lookups. The FTS rowid of a document (its `sort_key`) is
+    its number of distinct trigrams followed by its key. FTS5 returns
+    matches in rowid order, i.e. the documents with the fewest trigrams first. A
+    substring match contains every query trigram, so this is the order of
+    their similarity and the best ones are found without reading the rest.
+
+    When there are not enough substring matches, typo-tolerant candidates
+    are the shortest documents containing one half of the query: a single
+    typo leaves the other half intact. Hits are ordered by trigram similarity.
+    """
+
+    @staticmethod
+    def to_key(kind: str, pk: int) -> int:
+        return pk * 2 + KINDS.index(kind)
+
+    @classmethod
+    def to_rowid(cls, kind: str, pk: int, text: str) -> int:
+        return len(trigrams(text)) << FTS_KEY_BITS | cls.to_key(kind, pk)
+
+    @staticmethod
+    def from_rowid(rowid: int) -> Tuple[str, int]:
+        key = rowid & (1 << FTS_KEY_BITS) - 1
+        return KINDS[key % 2], key // 2
+
+    def index(self, kind: str, pks: Optional[List[int]] = None) -> None:
+        with connection.cursor() as cursor:
+            if pks is None:
+                # The low bit of the key is the kind
+                cursor.execute(
+                    f"DELETE FROM {FTS_DOCUMENT_TABLE} WHERE (key & 1) = %s",
+                    [KINDS.index(kind)],
+                )
+
+            # One statement per chunk rather than `executemany`, which the
+            # SQL panel of the debug toolbar cannot record
+            documents = iter_documents(kind, pks)
+            while True:
+                chunk = list(islice(documents, get_statement_size(3)))
+                if not chunk:
+                    break
+                values = ", ".join(["(%s, %s, %s)"] * len(chunk))
+                cursor.execute(
+                    f"INSERT INTO {FTS_DOCUMENT_TABLE} (key, sort_key, content) "
+                    f"VALUES {values} ON CONFLICT (key) DO UPDATE SET "
+                    "sort_key = excluded.sort_key, content = excluded.content",
+                    [
+                        value
+                        for pk, text in chunk
+                        for value in (
+                            self.to_key(kind, pk),
+                            self.to_rowid(kind, pk, text),
+                            text,
+                        )
+                    ],
+                )
+
+    def remove(self, kind: str, pks: Iterable[int]) -> None:
+        keys = [self.to_key(kind, pk) for pk in pks]
+        size = get_statement_size(1)
+        with connection.cursor() as cursor:
+            for start in range(0, len(keys), size):
+                chunk = keys[start : start + size]
+                cursor.execute(
+                    f"DELETE FROM {FTS_DOCUMENT_TABLE} WHERE key IN "
+                    f"({', '.join(['%s'] * len(chunk))})",
+                    chunk,
+                )
+
+    def _match(self, match: str, limit: int) -> List[Tuple[int, str]]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, content FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s ORDER BY rowid LIMIT %s",
+                [match, limit],
+            )
+            return cursor.fetchall()
+
+    @staticmethod
+    def typo_match(text: str) -> Optional[str]:
+        """
+        Match of the documents containing a half of `text` and any trigram
+        of the other half, or None when both halves are too short.
+        """
+        middle = len(text) // 2
+        left, right = text[:middle], text[middle + 1 :]
+        clauses = []
+        for intact, other in ((left, right), (right, left)):
+            if len(intact) >= 3:
+                clause = quote(intact)
+                if len(other) >= 3:
+                    terms = " OR ".join(map(quote, sorted(trigrams(other))))
+                    clause = f"{clause} AND ({terms})"
+                clauses.append(f"({clause})")
+        return " OR ".join(clauses) or None
+
+    def search(self, query: str, limit: int, offset: int = 0) -> List[SearchResult]:
+        searched = query_trigrams(query)
+        if not searched:
+            return []
+        wanted = offset + limit
+
+        # Substring matches, best first
+        text = normalize(query)[:-1]
+        rows = self._match(quote(text), wanted)
+
+        # Typo tolerance, only needed when there are not enough substring
+        # matches. Very short queries fall back to any of their trigrams
+        if len(rows) < wanted:
+            match = self.typo_match(text) or " OR ".join(map(quote, sorted(searched)))
+            seen = {rowid for rowid, _ in rows}
+            rows.extend(
+                row
+                for row in self._match(match, max(FTS_CANDIDATES, wanted))
+                if row[0] not in seen
+            )
+
+        scored = sorted(
+            ((similarity(searched, content), rowid) for rowid, content in rows),
+            reverse=True,
+        )
+        return [
+            (*self.from_rowid(rowid), score) for score, rowid in scored[offset:wanted]
+        ]
+
+
+class TrigramSearchIndex(SearchIndex):
+    """
+    In-process trigram index, used where FTS5 is not available.
+
+    It is loaded lazily on the first search and scores documents
+    by the Jaccard similarity of their trigram sets with the query.
+    Writes of this process are indexed by teams.signals, those of other
+    processes are caught up from the change log (teams.changes) at most
+    every `TEAMS_SEARCH_SYNC_SECONDS`, like the membership graph.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.documents: Dict[Tuple[str, int], Set[str]] = {}
+        self.postings: Dict[str, Set[Tuple[str, int]]] = defaultdict(set)
+        self.cursor = 0
+        self.synced_at = 0.0
+
+    def _remove(self, key: Tuple[str, int]) -> None:
+        for trigram in self.documents.pop(key, ()):
+            self.postings[trigram].discard(key)
+
+    def _load(self) -> None:
+        # Changes logged from here on are replayed by `_sync`
+        self.cursor = change_log.get_latest_cursor()
+        self.synced_at = time.monotonic()
+        for kind in KINDS:
+            self._index(kind)
+        self.loaded = True
+
+    def _sync(self) -> None:
+        """
+        Reindex the objects changed by other processes since the last sync.
+        """
+        if time.monotonic() - self.synced_at < get_sync_seconds():
+            return
+        self.synced_at = time.monotonic()
+        if not change_log.is_enabled():
+            return
+        while changes := change_log.get_changes(self.cursor, SYNC_BATCH_SIZE):
+            self.cursor = changes[-1]["id"]
+            changed: Dict[str, Set[int]] = defaultdict(set)
+            for change in changes:
+                if change["action"] == Change.RESYNC:
+                    self.loaded = False
+                    return
+                if change["resource"] in SYNC_RESOURCES:
+                    kind, field = SYNC_RESOURCES[change["resource"]]
+                    changed[kind].add(change[field])
+            # Deleted objects are no longer found by `_index`
+            for kind, pks in changed.items():
+                for pk in pks:
+                    self._remove((kind, pk))
+                self._index(kind, sorted(pks))
+
+    def _ensure_loaded(self) -> None:
+        if self.loaded:
+            self._sync()
+        if not self.loaded:
+            self._load()
+
+    def _index(self, kind: str, pks: Optional[List[int]] = None) -> None:
+        if pks is None:
+            for key in [key for key in self.documents if key[0] == kind]:
+                self._remove(key)
+        for pk, text in iter_documents(kind, pks):
+            key = (kind, pk)
+            self._remove(key)
+            self.documents[key] = trigrams(text)
+            for trigram in self.documents[key]:
+                self.postings[trigram].add(key)
+
+    def index(self, kind: str, pks: Optional[List[int]] = None) -> None:
+        with self.lock:
+            # Until the first search the whole index is loaded lazily anyway
+            if self.loaded:
+                self._index(kind, pks)
+
+    def remove(self, kind: str, pks: Iterable[int]) -> None:
+        with self.lock:
+            for pk in pks:
+                self._remove((kind, pk))
+
+    def search(self, query: str, limit: int, offset: int = 0) -> List[SearchResult]:
+        searched = query_trigrams(query)
+        with self.lock:
+            self._ensure_loaded()
+            shared = Counter()
+            for trigram in searched:
+                shared.update(self.postings.get(trigram, ()))
+            scored = (
+                (count / (len(searched) + len(self.documents[key]) - count), key)
+                for key, count in shared.items()
+            )
+            best = heapq.nlargest(offset + limit, scored)
+        return [(kind, pk, score) for score, (kind, pk) in best[offset:]]
+
+
+def fts_available() -> bool:
+    return (
+        connection.vendor == "sqlite"
+        and FTS_DOCUMENT_TABLE in connection.introspection.table_names()
+    )
+
+
+@lru_cache(maxsize=None)
+def get_search_index() -> SearchIndex:
+    """
+    Return the configured search index (`TEAMS_SEARCH_BACKEND`:
+    "auto", "fts" or "trigram"), FTS5 being preferred when available.
+    """
+    backend = getattr(settings, "TEAMS_SEARCH_BACKEND", "auto")
+    if backend == "fts" or (backend == "auto" and fts_available()):
+        return FTSSearchIndex()
+    return TrigramSearchIndex()
@@ -1,65 +1,612 @@
-from typing import List, Type
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
 
-from django.db.models import Model
+from django.conf import settings
+from django.db.models import Model, prefetch_related_objects
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 
-from teams.models import Team, Person
+from teams.models import Job, Membership, Team, Person
+from teams.signals import bulk_saved, membership_changed
 
 
-class TeamSerializer(serializers.ModelSerializer):
+def get_bulk_batch_size() -> int:
+    return getattr(settings, "TEAMS_BULK_BATCH_SIZE", 1000)
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolve each distinct PK only once per root serializer,
+    so that a list payload does not issue a query per item.
+    """
+
+    def to_internal_value(self, data: Any) -> Model:
+        cache = self.root.__dict__.setdefault("_related_cache", {})
+        key = (self.get_queryset().model, data)
+        if key not in cache:
+            cache[key] = super().to_internal_value(data)
+        return cache[key]
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    List serializer that writes with `bulk_create`/`bulk_update`
+    and sets many-to-many relations with one through-table insert.
+    """
+
+    def _m2m_field_names(self) -> List[str]:
+        model = self.child.Meta.model
+        return [field.name for field in model._meta.many_to_many]
+
+    def _set_m2m(
+        self,
+        saved: Iterable[Model],
+        name: str,
+        values: Dict[int, List[Model]],
+        replace: bool = True,
+    ) -> None:
+        """
+        Set a many-to-many relation for many objects with one through-table
+        insert and, when replacing, one chunked delete of the dropped rows.
+        """
+        field = self.child.Meta.model._meta.get_field(name)
+        through = field.remote_field.through
+        source = f"{field.m2m_field_name()}_id"
+        target = f"{field.m2m_reverse_field_name()}_id"
+        batch_size = get_bulk_batch_size()
+
+        wanted = {
+            (pk, related.pk)
+            for pk, related_objs in values.items()
+            for related in related_objs
+        }
+        existing = {}
+        if replace:
+            pks = list(values)
+            for start in range(0, len(pks), batch_size):
+                rows = through.objects.filter(
+                    **{f"{source}__in": pks[start : start + batch_size]}
+                ).values_list("id", source, target)
+                existing.update((row[1:], row[0]) for row in rows)
+
+        added = sorted(wanted - existing.keys())
+        removed = [pair for pair in existing if pair not in wanted]
+        row_ids = [existing[pair] for pair in removed]
+        for start in range(0, len(row_ids), batch_size):
+            through.objects.filter(pk__in=row_ids[start : start + batch_size]).delete()
+        through.objects.bulk_create(
+            [through(**{source: pk, target: related_pk}) for pk, related_pk in added],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        membership_changed.send(sender=through, added=added, removed=removed)
+        prefetch_related_objects(list(saved), name)
+
+    def _unique_validators(self) -> Dict[str, UniqueValidator]:
+        """
+        Take the `UniqueValidator`s off the child fields: they check every
+        item against the database alone, so `_validate_unique` checks the
+        whole list instead.
+        """
+        if "_unique" not in self.__dict__:
+            self._unique = {}
+            for name, field in self.child.fields.items():
+                for validator in field.validators:
+                    if isinstance(validator, UniqueValidator):
+                        self._unique[name] = validator
+                field.validators = [
+                    validator
+                    for validator in field.validators
+                    if not isinstance(validator, UniqueValidator)
+                ]
+        return self._unique
+
+    def _validate_unique(
+        self, items: List[Optional[dict]], instances: Dict[int, Model]
+    ) -> List[dict]:
+        """
+        Per-item errors of unique fields, checked against the state after the
+        write: values repeated in the payload and values of other rows.
+        """
+        model = self.child.Meta.model
+        errors = [{} for _ in items]
+        for name, validator in self._unique_validators().items():
+            values = {}
+            for index, attrs in enumerate(items):
+                if attrs is None:
+                    continue
+                if name in attrs:
+                    values[index] = attrs[name]
+                elif "id" in attrs:
+                    values[index] = getattr(instances[attrs["id"]], name)
+
+            first = {}
+            for index, value in values.items():
+                if value in first:
+                    errors[index][name] = [
+                        f"{value} is already used by item {first[value]}."
+                    ]
+                else:
+                    first[value] = index
+
+            # Rows updated by the payload hold their new values
+            updated = {attrs["id"] for attrs in items if attrs and "id" in attrs}
+            distinct = list(first)
+            taken = set()
+            for start in range(0, len(distinct), VALIDATE_PKS_CHUNK_SIZE):
+                rows = model.objects.filter(
+                    **{f"{name}__in": distinct[start : start + VALIDATE_PKS_CHUNK_SIZE]}
+                ).values_list("pk", name)
+                taken.update(value for pk, value in rows if pk not in updated)
+            for value in taken:
+                errors[first[value]][name] = [str(validator.message)]
+        return errors
+
+    def to_internal_value(self, data: Any) -> List[dict]:
+        self._unique_validators()
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        if self.instance is None:
+            ret = super().to_internal_value(data)
+            errors = self._validate_unique(ret, {})
+            if any(errors):
+                raise serializers.ValidationError(errors)
+            return ret
+
+        # Validate every item against the instance it updates
+        instances = {obj.pk: obj for obj in self.instance}
+        items = []
+        errors = []
+        seen = set()
+        for index, item in enumerate(data):
+            pk = item.get("id") if isinstance(item, dict) else None
+            self.child.instance = instances.get(pk)
+            items.append(None)
+            if self.child.instance is None:
+                errors.append({"id": [f"Invalid pk {pk} - object does not exist."]})
+                continue
+            if pk in seen:
+                errors.append({"id": [f"Duplicate pk {pk} - updated by another item."]})
+                continue
+            seen.add(pk)
+            try:
+                validated = self.child.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors.append(exc.detail)
+            else:
+                items[index] = {**validated, "id": pk}
+                errors.append({})
+        self.child.instance = None
+
+        for item_errors, unique_errors in zip(
+            errors, self._validate_unique(items, instances)
+        ):
+            if isinstance(item_errors, dict):
+                item_errors.update(unique_errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return items
+
+    def _release_unique_values(
+        self, updated: List[Model], previous: Dict[str, Dict[int, Any]]
+    ) -> None:
+        """
+        Move the rows whose unique value is taken by another updated row
+        (e.g. two teams swapping names) to a temporary value first, since
+        the constraint is checked row by row within an UPDATE.
+        """
+        model = self.child.Meta.model
+        for name, old_values in previous.items():
+            new_values = {getattr(obj, name) for obj in updated}
+            released = [
+                obj
+                for obj in updated
+                if old_values[obj.pk] != getattr(obj, name)
+                and old_values[obj.pk] in new_values
+            ]
+            if not released:
+                continue
+            final = [getattr(obj, name) for obj in released]
+            for obj in released:
+                setattr(obj, name, f"~{uuid.uuid4().hex}")
+            model.objects.bulk_update(
+                released, [name], batch_size=get_bulk_batch_size()
+            )
+            for obj, value in zip(released, final):
+                setattr(obj, name, value)
+
+    def create(self, validated_data: List[dict]) -> List[Model]:
+        model = self.child.Meta.model
+        m2m_names = self._m2m_field_names()
+        created = [
+            model(**{k: v for k, v in attrs.items() if k not in m2m_names})
+            for attrs in validated_data
+        ]
+        model.objects.bulk_create(created, batch_size=get_bulk_batch_size())
+        bulk_saved.send(sender=model, pks=[obj.pk for obj in created], created=True)
+
+        for name in m2m_names:
+            values = {
+                obj.pk: attrs.get(name, [])
+                for obj, attrs in zip(created, validated_data)
+            }
+            self._set_m2m(created, name, values, replace=False)
+
+        return created
+
+    def update(self, instance: Iterable[Model], validated_data: List[dict]) -> list:
+        model = self.child.Meta.model
+        m2m_names = self._m2m_field_names()
+        instances = {obj.pk: obj for obj in instance}
+        updated = []
+        fields = set()
+        m2m_values: Dict[str, Dict[int, List[Model]]] = {}
+        previous = {
+            name: {obj.pk: getattr(obj, name) for obj in instances.values()}
+            for name in self._unique_validators()
+        }
+
+        for attrs in validated_data:
+            obj = instances[attrs.pop("id")]
+            for name, value in attrs.items():
+                if name in m2m_names:
+                    m2m_values.setdefault(name, {})[obj.pk] = value
+                else:
+                    setattr(obj, name, value)
+                    fields.add(name)
+            updated.append(obj)
+
+        if fields:
+            now = timezone.now()
+            for obj in updated:
+                obj.version += 1
+                obj.updated_at = now
+            fields.update(("version", "updated_at"))
+            self._release_unique_values(
+                updated, {name: previous[name] for name in fields & previous.keys()}
+            )
+            model.objects.bulk_update(updated, fields, batch_size=get_bulk_batch_size())
+            bulk_saved.send(sender=model, pks=[obj.pk for obj in updated])
+
+        for name, values in m2m_values.items():
+            self._set_m2m(updated, name, values)
+
+        return updated
+
+
+class SparseFieldsMixin:
+    """
+    Only render the fields listed in the `fields` context (`?fields=`).
+    """
+
+    def get_field_names(self, declared_fields: Dict, info: Any) -> List[str]:
+        names = super().get_field_names(declared_fields, info)
+        fields = self.context.get("fields")
+        return names if fields is None else [name for name in names if name in fields]
+
+
+class TeamSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Team
         fields = ("id", "name")
+        list_serializer_class = BulkListSerializer
 
 
 class TeamListRetrieveSerializer(TeamSerializer):
-    number_of_members = serializers.IntegerField(read_only=True)
+    number_of_members = serializers.IntegerField(source="member_count", read_only=True)
 
     class Meta(TeamSerializer.Meta):
         fields = TeamSerializer.Meta.fields + ("number_of_members",)
 
 
-class BasePersonSerializer(serializers.ModelSerializer):
+class BasePersonSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Person
         fields = ("id", "first_name", "last_name", "email")
 
 
 class PersonSerializer(BasePersonSerializer):
+    teams = CachedPrimaryKeyRelatedField(
+        many=True, queryset=Team.objects.all(), required=False, allow_empty=True
+    )
+
     class Meta(BasePersonSerializer.Meta):
         fields = BasePersonSerializer.Meta.fields + ("teams",)
+        list_serializer_class = BulkListSerializer
+
+
+class PersonImportSerializer(BasePersonSerializer):
+    """
+    Record of `manage.py import_people`, with the names of the person's teams.
+    """
+
+    teams = serializers.ListField(
+        child=serializers.CharField(max_length=Team._meta.get_field("name").max_length),
+        default=list,
+    )
+
+    class Meta(BasePersonSerializer.Meta):
+        fields = ("first_name", "last_name", "email", "teams")
 
 
 class PersonListRetrieveSerializer(PersonSerializer):
     teams = TeamSerializer(many=True, read_only=True)
 
 
+class TeamReadSerializer(serializers.BaseSerializer):
+    """
+    Fast read-only equivalent of `TeamListRetrieveSerializer`
+    for rows of `Team.objects.values(*TeamReadSerializer.values)`.
+    """
+
+    # Rendered field -> column of the `values()` rows
+    columns = {"id": "id", "name": "name", "number_of_members": "member_count"}
+    values = tuple(columns.values())
+
+    class Meta:
+        fields = ("id", "name", "number_of_members")
+
+    @classmethod
+    def get_values(cls, fields: Optional[Tuple[str, ...]]) -> Tuple[str, ...]:
+        return cls.values if fields is None else tuple(cls.columns[f] for f in fields)
+
+    def to_representation(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        fields = self.context.get("fields") or self.Meta.fields
+        return {name: row[self.columns[name]] for name in fields}
+
+
+def get_person_memberships(person_ids: List[int]) -> Iterable:
+    """
+    `(person_id, team_id, team_name)` rows of the given people in one query.
+    """
+    return Membership.objects.filter(person_id__in=person_ids).values_list(
+        "person_id", "team_id", "team__name"
+    )
+
+
+def group_person_teams(
+    person_ids: List[int], memberships: Iterable
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Build the nested `teams` lists rendered by `TeamSerializer`.
+    A team's dict is built once and shared by all of its members.
+    """
+    teams = {}
+    person_teams = {person_id: [] for person_id in person_ids}
+    for person_id, team_id, team_name in memberships:
+        team = teams.get(team_id)
+        if team is None:
+            team = teams[team_id] = {"id": team_id, "name": team_name}
+        person_teams[person_id].append(team)
+    return person_teams
+
+
+def get_team_memberships(team_ids: List[int]) -> Iterable:
+    """
+    `(team_id, person_id, first_name, last_name, email)` rows of the members
+    of the given teams in one query.
+    """
+    return Membership.objects.filter(team_id__in=team_ids).values_list(
+        "team_id",
+        "person_id",
+        "person__first_name",
+        "person__last_name",
+        "person__email",
+    )
+
+
+def group_team_members(
+    team_ids: List[int], memberships: Iterable
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Build the nested `members` lists rendered by `BasePersonSerializer`.
+    """
+    people = {}
+    team_members = {team_id: [] for team_id in team_ids}
+    for team_id, person_id, *values in memberships:
+        person = people.get(person_id)
+        if person is None:
+            person = people[person_id] = dict(
+                zip(BasePersonSerializer.Meta.fields, (person_id, *values))
+            )
+        team_members[team_id].append(person)
+    return team_members
+
+
+def expand_rows(
+    rows: List[Dict[str, Any]], expand: Iterable[str]
+) -> List[Dict[str, Any]]:
+    """
+    Embed the `members` of team representations or the `teams` of person
+    representations, with one query per expansion for all the rows.
+    """
+    ids = [row["id"] for row in rows]
+    if "members" in expand:
+        members = group_team_members(ids, get_team_memberships(ids))
+        for row in rows:
+            row["members"] = members[row["id"]]
+    if "teams" in expand:
+        teams = group_person_teams(ids, get_person_memberships(ids))
+        for row in rows:
+            row["teams"] = teams[row["id"]]
+    return rows
+
+
+class PersonReadListSerializer(serializers.ListSerializer):
+    def to_representation(self, data: Iterable) -> List[Dict[str, Any]]:
+        rows = list(data)
+        fields = self.context.get("fields")
+        if fields is not None:
+            # Rows may hold extra columns, e.g. the ordering of the pagination
+            rows = [
+                {name: row[name] for name in fields if name != "teams"} for row in rows
+            ]
+            if "teams" not in fields:
+                return rows
+        person_ids = [row["id"] for row in rows]
+        teams = group_person_teams(person_ids, get_person_memberships(person_ids))
+        return [{**row, "teams": teams[row["id"]]} for row in rows]
+
+
+class PersonReadSerializer(serializers.BaseSerializer):
+    """
+    Fast read-only equivalent of `PersonListRetrieveSerializer`
+    for rows of `Person.objects.values(*PersonReadSerializer.values)`.
+
+    The teams of all rows are fetched with one through-table query instead of
+    rendering a nested `TeamSerializer` per person.
+    """
+
+    values = BasePersonSerializer.Meta.fields
+
+    class Meta:
+        fields = BasePersonSerializer.Meta.fields + ("teams",)
+        list_serializer_class = PersonReadListSerializer
+
+    @classmethod
+    def get_values(cls, fields: Optional[Tuple[str, ...]]) -> Tuple[str, ...]:
+        if fields is None:
+            return cls.values
+        return tuple(field for field in fields if field != "teams")
+
+    def to_representation(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        return PersonReadListSerializer(
+            child=self, context=self.context
+        ).to_representation([row])[0]
+
+
+# Keep the number of bound parameters well below SQLite's limit
+VALIDATE_PKS_CHUNK_SIZE = 500
+
+
 def validate_pks(value: List[int], model_class: Type[Model]) -> List[int]:
     """
     Validate that the provided PKs correspond to existing objects of a given model.
+
+    Duplicates are dropped (preserving order) and existence is checked with
+    chunked ``pk__in`` queries, so every missing PK is reported at once.
     """
-    for pk in value:
-        try:
-            model_class.objects.get(pk=pk)
-        except model_class.DoesNotExist:
-            raise serializers.ValidationError(
-                f"Invalid pk {pk} - object does not exist."
-            )
+    unique_pks = list(dict.fromkeys(value))
+    existing = set()
+    for start in range(0, len(unique_pks), VALIDATE_PKS_CHUNK_SIZE):
+        chunk = unique_pks[start : start + VALIDATE_PKS_CHUNK_SIZE]
+        existing.update(
+            model_class.objects.filter(pk__in=chunk).values_list("pk", flat=True)
+        )
+
+    missing = [pk for pk in unique_pks if pk not in existing]
+    if missing:
+        raise serializers.ValidationError(
+            [f"Invalid pk {pk} - object does not exist." for pk in missing]
+        )
 
-    return value
+    return unique_pks
 
 
-class AddMembersSerializer(serializers.Serializer):
-    members_to_add = serializers.ListField(child=serializers.IntegerField())
+class IntegerListField(serializers.ListField):
+    """
+    List of integers. Lists that are already made of ints (as parsed from JSON)
+    are accepted as-is instead of validating every item with an `IntegerField`.
+    """
+
+    child = serializers.IntegerField()
+
+    def run_child_validation(self, data: List[Any]) -> List[int]:
+        if all(type(value) is int for value in data):
+            return list(data)
+        return super().run_child_validation(data)
+
+
+class DeferredPksMixin:
+    """
+    Skip the existence check of the PKs when the serializer context has
+    `defer_pk_checks`: jobs (see teams.jobs) check them chunk by chunk.
+    """
+
+    def validate_pks(self, value: List[int], model_class: Type[Model]) -> List[int]:
+        if self.context.get("defer_pk_checks"):
+            return list(dict.fromkeys(value))
+        return validate_pks(value, model_class)
+
+
+class AddMembersSerializer(DeferredPksMixin, serializers.Serializer):
+    members_to_add = IntegerListField()
+
+    def validate_members_to_add(self, value: List[int]) -> List[int]:
+        return self.validate_pks(value, Person)
+
+
+class AddToTeamsSerializer(DeferredPksMixin, serializers.Serializer):
+    teams = IntegerListField()
+
+    def validate_teams(self, value: List[int]) -> List[int]:
+        return self.validate_pks(value, Team)
+
+
+class SyncMembersSerializer(serializers.Serializer):
+    members = IntegerListField(required=False)
+    add = IntegerListField(required=False)
+    remove = IntegerListField(required=False)
+
+    @staticmethod
+    def validate_members(value: List[int]) -> List[int]:
+        return validate_pks(value, Person)
 
     @staticmethod
-    def validate_members_to_add(value: List[int]) -> List[int]:
+    def validate_add(value: List[int]) -> List[int]:
         return validate_pks(value, Person)
 
+    def validate(self, attrs: dict) -> dict:
+        if "members" in attrs and ("add" in attrs or "remove" in attrs):
+            raise serializers.ValidationError(
+                "Provide either the full 'members' set or 'add'/'remove' lists."
+            )
+        if not attrs:
+            raise serializers.ValidationError(
+                "One of 'members', 'add' or 'remove' is required."
+            )
+        return attrs
+
 
-class AddToTeamsSerializer(serializers.Serializer):
-    teams = serializers.ListField(child=serializers.IntegerField())
+class SyncMembershipsSerializer(serializers.Serializer):
+    teams = serializers.DictField(child=IntegerListField())
 
     @staticmethod
-    def validate_teams(value: List[int]) -> List[int]:
-        return validate_pks(value, Team)
+    def validate_teams(value: Dict[str, List[int]]) -> Dict[int, List[int]]:
+        try:
+            desired = {int(team_id): members for team_id, members in value.items()}
+        except ValueError:
+            raise serializers.ValidationError("Team ids must be integers.")
+
+        validate_pks(list(desired), Team)
+        validate_pks([pk for members in desired.values() for pk in members], Person)
+        return desired
+
+
+class BulkDeleteSerializer(DeferredPksMixin, serializers.Serializer):
+    ids = IntegerListField()
+
+    def validate_ids(self, value: List[int]) -> List[int]:
+        return self.validate_pks(value, self.context["view"].queryset.model)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name="teams:job-detail")
+
+    class Meta:
+        model = Job
+        fields = (
+            "id",
+            "url",
+            "kind",
+            "status",
+            "total",
+            "processed",
+            "result",
+            "errors",
+            "created_at",
+            "started_at",
+            "finished_at",
+        )
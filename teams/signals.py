@@ -0,0 +1,190 @@
+from collections import Counter, defaultdict
+from typing import Any, List, Optional, Set, Tuple
+
+from django.db.models import F, Model, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from teams.cache import response_cache
+from teams.search import PERSON, TEAM, get_search_index
+from teams.models import Membership, Person, Team
+
+# Sent with `added` and `removed` lists of (person_id, team_id) pairs
+# whenever rows of the Person.teams through table are inserted or deleted,
+# including bulk paths that bypass `m2m_changed`
+membership_changed = Signal()
+
+# Sent with the `pks` of Team/Person rows written by bulk operations
+# that bypass `post_save`; `pks=None` means any row may have changed.
+# `created=True` is passed when the rows were all inserted
+bulk_saved = Signal()
+
+# Version names of the list generations in teams.cache
+LIST_VERSIONS = {Team: "teams", Person: "people"}
+OBJECT_VERSIONS = {Team: "team", Person: "person"}
+SEARCH_KINDS = {Team: TEAM, Person: PERSON}
+
+Pairs = List[Tuple[int, int]]
+
+
+def get_membership_pairs(
+    instance: Model, reverse: bool, pk_set: Optional[Set[int]] = None
+) -> Pairs:
+    """
+    Return the existing (person_id, team_id) pairs of a person or a team,
+    optionally restricted to the related PKs in `pk_set`.
+    """
+    own_field, other_field = (
+        ("team_id", "person_id") if reverse else ("person_id", "team_id")
+    )
+    rows = Membership.objects.filter(**{own_field: instance.pk})
+    if pk_set is not None:
+        rows = rows.filter(**{f"{other_field}__in": pk_set})
+    return list(rows.values_list("person_id", "team_id"))
+
+
+@receiver(m2m_changed, sender=Membership)
+def translate_m2m_changed(
+    sender: Any,
+    instance: Model,
+    action: str,
+    reverse: bool,
+    pk_set: Optional[Set[int]],
+    **kwargs,
+) -> None:
+    # Removed pairs are collected before the delete, because `pk_set`
+    # of a remove may contain PKs that were never related
+    if action == "pre_remove":
+        instance._removed_memberships = get_membership_pairs(instance, reverse, pk_set)
+    elif action == "pre_clear":
+        instance._removed_memberships = get_membership_pairs(instance, reverse)
+    elif action in ("post_remove", "post_clear"):
+        removed = instance.__dict__.pop("_removed_memberships", [])
+        membership_changed.send(sender=Membership, added=[], removed=removed)
+    elif action == "post_add" and pk_set:
+        if reverse:
+            added = [(pk, instance.pk) for pk in pk_set]
+        else:
+            added = [(instance.pk, pk) for pk in pk_set]
+        membership_changed.send(sender=Membership, added=added, removed=[])
+
+
+def get_delete_batch(instance: Person, origin: Any) -> Any:
+    # A queryset delete sends the signals of all its people with it as origin
+    if isinstance(origin, QuerySet) and origin.model is Person:
+        return origin
+    return instance
+
+
+@receiver(pre_delete, sender=Person)
+def collect_deleted_person_memberships(
+    instance: Person, origin: Any = None, **kwargs
+) -> None:
+    """
+    Collect the memberships of the people being deleted, with a single
+    query for all the people of a queryset delete.
+    """
+    batch = get_delete_batch(instance, origin)
+    if batch is instance or "_removed_memberships" not in batch.__dict__:
+        people = [instance.pk] if batch is instance else batch.values("pk")
+        rows = Membership.objects.filter(person_id__in=people)
+        batch._removed_memberships = list(rows.values_list("person_id", "team_id"))
+        batch._pending_deletes = set()
+    batch._pending_deletes.add(instance.pk)
+
+
+@receiver(post_delete, sender=Person)
+def send_deleted_person_memberships(
+    instance: Person, origin: Any = None, **kwargs
+) -> None:
+    # Sent once, after the last person of the batch
+    batch = get_delete_batch(instance, origin)
+    pending = batch.__dict__.get("_pending_deletes")
+    if pending is None:
+        return
+    pending.discard(instance.pk)
+    if pending:
+        return
+    del batch._pending_deletes
+    removed = batch.__dict__.pop("_removed_memberships")
+    if removed:
+        membership_changed.send(sender=Membership, added=[], removed=removed)
+
+
+@receiver(membership_changed, sender=Membership)
+def update_membership_stamps(added: Pairs, removed: Pairs, **kwargs) -> None:
+    """
+    Adjust `Team.member_count` and bump the versions of every affected
+    team and person.
+    """
+    deltas = Counter(team_id for _, team_id in added)
+    deltas.subtract(team_id for _, team_id in removed)
+
+    # One UPDATE per distinct delta, usually just one
+    teams_by_delta = defaultdict(list)
+    for team_id, delta in deltas.items():
+        teams_by_delta[delta].append(team_id)
+
+    now = timezone.now()
+    for delta, team_ids in teams_by_delta.items():
+        Team.objects.filter(pk__in=team_ids).update(
+            member_count=F("member_count") + delta,
+            version=F("version") + 1,
+            updated_at=now,
+        )
+
+    person_ids = {person_id for person_id, _ in added + removed}
+    if person_ids:
+        Person.bump_versions(person_ids)
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Person)
+def invalidate_object_responses(sender: Any, instance: Model, **kwargs) -> None:
+    response_cache.bump(
+        [f"{OBJECT_VERSIONS[sender]}:{instance.pk}", LIST_VERSIONS[sender]]
+    )
+
+
+@receiver(bulk_saved, sender=Team)
+@receiver(bulk_saved, sender=Person)
+def invalidate_bulk_responses(sender: Any, pks: Optional[List[int]], **kwargs) -> None:
+    if pks is None:
+        response_cache.bump(["epoch"])
+        return
+    response_cache.bump(
+        [LIST_VERSIONS[sender], *(f"{OBJECT_VERSIONS[sender]}:{pk}" for pk in pks)]
+    )
+
+
+@receiver(membership_changed, sender=Membership)
+def invalidate_membership_responses(added: Pairs, removed: Pairs, **kwargs) -> None:
+    pairs = added + removed
+    if not pairs:
+        return
+    # Team lists show member counts and people lists show nested teams
+    names = ["teams", "people"]
+    names.extend(f"team:{team_id}" for team_id in {team for _, team in pairs})
+    names.extend(f"person:{pk}" for pk in {person for person, _ in pairs})
+    response_cache.bump(names)
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=Person)
+def index_saved_object(sender: Any, instance: Model, **kwargs) -> None:
+    get_search_index().index(SEARCH_KINDS[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Person)
+def unindex_deleted_object(sender: Any, instance: Model, **kwargs) -> None:
+    get_search_index().remove(SEARCH_KINDS[sender], [instance.pk])
+
+
+@receiver(bulk_saved, sender=Team)
+@receiver(bulk_saved, sender=Person)
+def index_bulk_saved_objects(sender: Any, pks: Optional[List[int]], **kwargs) -> None:
+    get_search_index().index(SEARCH_KINDS[sender], pks)
@@ -1,13 +1,70 @@
-from django.db.models import Count
-from django.test import TestCase
-from django.urls import reverse
+import datetime
+import decimal
+import json
+import os
+import tempfile
+import time
+from importlib import import_module
+from io import BytesIO, StringIO
+from types import ModuleType
+from typing import Iterator
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Count, F
+from django.http import HttpRequest, HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.urls import include, path, reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
 from rest_framework import status
+from rest_framework.exceptions import ParseError
 from rest_framework.test import APIClient
 
-from teams.models import Team, Person
-from teams.serializers import TeamListRetrieveSerializer, BasePersonSerializer
+from teams.benchmark import BenchmarkRunner, check_budgets, seed_dataset
+from teams.cache import response_cache
+from teams.changes import await_changes, get_latest_cursor
+from teams.checks import check_slow_configuration
+from teams.db import configure_sqlite
+from teams.graph import membership_graph
+from teams.jobs import JOB_HANDLERS, ChunkResult, requeue_stale_jobs, run_job
+from teams.metrics import MetricsMiddleware, request_metrics
+from teams.models import Change, IdempotencyKey, Job, Membership, Team, Person
+from teams.parsers import FastJSONParser
+from teams.renderers import FastJSONRenderer
+from teams.routers import (
+    PIN_COOKIE,
+    PIN_HEADER,
+    PrimaryPinMiddleware,
+    ReplicaRouter,
+    is_pinned,
+    replica_reads,
+)
+from teams.search import TrigramSearchIndex
+from teams.serializers import (
+    TeamListRetrieveSerializer,
+    BasePersonSerializer,
+    AddMembersSerializer,
+    PersonListRetrieveSerializer,
+    PersonReadSerializer,
+    TeamReadSerializer,
+)
+from teams.signals import membership_changed
+from teams.throttling import RateLimit, RateLimitHeadersMiddleware
+from teams.urls import get_urlpatterns
 
 TEAM_URL = reverse("teams:team-list")
+TEAM_MEMBERSHIPS_URL = reverse("teams:team-team-memberships")
+PERSON_URL = reverse("teams:person-list")
+PERSON_BULK_URL = reverse("teams:person-bulk")
+PERSON_EXPORT_URL = reverse("teams:person-person-export")
+SEARCH_URL = reverse("teams:search")
 
 
 def get_team_detail_url(team_id: int) -> str:
@@ -42,18 +99,24 @@ class TeamApiTests(TestCase):
 
     def test_list_teams(self) -> None:
         response = self.client.get(TEAM_URL)
-        teams = Team.objects.annotate(number_of_members=Count("members"))
+        teams = Team.objects.order_by("id")
         serializer = TeamListRetrieveSerializer(teams, many=True)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
-        self.assertEqual(response.data[0]["number_of_members"], 2)
+        self.assertEqual(response.data["results"], serializer.data)
+        self.assertEqual(response.data["results"][0]["number_of_members"], 2)
+
+    def test_list_teams_paginated(self) -> None:
+        create_sample_team(name="Second team")
+        response = self.client.get(TEAM_URL, {"page_size": 1})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNotNone(response.data["next"])
 
     def test_retrieve_team(self) -> None:
         response = self.client.get(get_team_detail_url(self.team.pk))
-        team = Team.objects.filter(pk=self.team.pk).annotate(
-            number_of_members=Count("members")
-        )[0]
+        team = Team.objects.get(pk=self.team.pk)
         serializer = TeamListRetrieveSerializer(team)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -83,10 +146,20 @@ class TeamApiTests(TestCase):
 
     def test_list_team_members(self) -> None:
         response = self.client.get(get_team_detail_url(self.team.pk) + "members/")
-        serializer = BasePersonSerializer(self.team.members, many=True)
+        serializer = BasePersonSerializer(self.team.members.order_by("id"), many=True)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data["results"], serializer.data)
+
+    def test_list_team_members_paginated(self) -> None:
+        url = get_team_detail_url(self.team.pk) + "members/"
+        first_page = self.client.get(url, {"page_size": 1})
+        second_page = self.client.get(first_page.data["next"])
+        members = list(self.team.members.order_by("id"))
+
+        self.assertEqual(first_page.data["results"][0]["id"], members[0].pk)
+        self.assertEqual(second_page.data["results"][0]["id"], members[1].pk)
+        self.assertIsNone(second_page.data["next"])
 
     def test_add_team_members(self) -> None:
         person1 = create_sample_person(first_name="Jack", email="j@ex.com")
@@ -100,6 +173,64 @@ class TeamApiTests(TestCase):
         self.team.refresh_from_db()
         self.assertEqual(self.team.members.count(), 4)
 
+    def test_add_team_members_reports_all_invalid_pks(self) -> None:
+        person = create_sample_person(first_name="Jack", email="j@ex.com")
+        payload = {"members_to_add": [person.pk, 998, person.pk, 999]}
+        response = self.client.put(
+            get_team_detail_url(self.team.pk) + "members/", payload
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data["members_to_add"]), 2)
+        self.assertEqual(self.team.members.count(), 2)
+
+    def test_add_team_members_validates_in_one_query(self) -> None:
+        people = [create_sample_person(email=f"p{i}@ex.com").pk for i in range(10)]
+        serializer = AddMembersSerializer(data={"members_to_add": people + people})
+
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data["members_to_add"], people)
+
+    def test_sync_team_members_with_full_set(self) -> None:
+        kept = self.team.members.order_by("id")[0]
+        new_member = create_sample_person(first_name="Jack", email="j@ex.com")
+        payload = {"members": [kept.pk, new_member.pk]}
+        response = self.client.patch(
+            get_team_detail_url(self.team.pk) + "members/", payload, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"added": 1, "removed": 1})
+        self.assertEqual(
+            set(self.team.members.values_list("id", flat=True)),
+            {kept.pk, new_member.pk},
+        )
+
+    def test_sync_team_members_with_add_and_remove(self) -> None:
+        removed = self.team.members.order_by("id")[0]
+        new_member = create_sample_person(first_name="Jack", email="j@ex.com")
+        payload = {"add": [new_member.pk], "remove": [removed.pk]}
+        response = self.client.post(
+            get_team_detail_url(self.team.pk) + "members/", payload, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"added": 1, "removed": 1})
+        self.assertEqual(self.team.members.count(), 2)
+        self.assertFalse(self.team.members.filter(pk=removed.pk).exists())
+
+    def test_sync_memberships_for_many_teams(self) -> None:
+        other_team = create_sample_team(name="Other team")
+        person = create_sample_person(first_name="Jack", email="j@ex.com")
+        payload = {"teams": {self.team.pk: [], other_team.pk: [person.pk]}}
+        response = self.client.post(TEAM_MEMBERSHIPS_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"added": 1, "removed": 2})
+        self.assertEqual(self.team.members.count(), 0)
+        self.assertEqual(list(other_team.members.all()), [person])
+
     def test_get_specific_team_member(self) -> None:
         team_member = self.team.members.all()[0]
         response = self.client.get(
@@ -121,4 +252,1761 @@ class TeamApiTests(TestCase):
         self.assertEqual(self.team.members.count(), 1)
 
 
+class PersonBulkApiTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team()
+        self.other_team = create_sample_team(name="Other team")
+
+    def test_bulk_create_people(self) -> None:
+        payload = [
+            {
+                "first_name": f"Name{i}",
+                "last_name": "Smith",
+                "email": f"p{i}@ex.com",
+                "teams": [self.team.pk, self.other_team.pk],
+            }
+            for i in range(20)
+        ]
+
+        # Including the snapshot and the inserts of the change log
+        with self.assertNumQueries(14):
+            response = self.client.post(PERSON_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(Person.objects.count(), 20)
+        self.assertEqual(self.other_team.members.count(), 20)
+
+    def test_bulk_create_reports_per_item_errors(self) -> None:
+        payload = [
+            {"first_name": "Jack", "last_name": "Smith", "email": "j@ex.com"},
+            {"first_name": "Nick", "last_name": "Smith", "email": "not-an-email"},
+        ]
+        response = self.client.post(PERSON_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("email", response.data[1])
+        self.assertEqual(Person.objects.count(), 0)
+
+    def test_bulk_update_people(self) -> None:
+        person1 = create_sample_person()
+        person2 = create_sample_person(first_name="John", email="john@example.com")
+        person2.teams.add(self.team)
+        payload = [
+            {"id": person1.pk, "last_name": "Brown"},
+            {"id": person2.pk, "teams": [self.other_team.pk]},
+        ]
+        response = self.client.patch(PERSON_BULK_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        person1.refresh_from_db()
+        self.assertEqual(person1.last_name, "Brown")
+        self.assertEqual(list(person2.teams.all()), [self.other_team])
+
+    def test_bulk_create_teams_with_repeated_names(self) -> None:
+        payload = [{"name": "Dup"}, {"name": "Test team"}, {"name": "Dup"}]
+        response = self.client.post(TEAM_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("already exists", response.data[1]["name"][0])
+        self.assertIn("item 0", response.data[2]["name"][0])
+        self.assertFalse(Team.objects.filter(name="Dup").exists())
+
+    def test_bulk_update_teams_swapping_names(self) -> None:
+        url = reverse("teams:team-bulk")
+        payload = [
+            {"id": self.team.pk, "name": "Other team"},
+            {"id": self.other_team.pk, "name": "Test team"},
+        ]
+        response = self.client.patch(url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.name, "Other team")
+
+        # Renaming onto a name that stays taken, and updating a team twice
+        payload = [
+            {"id": self.team.pk, "name": "New"},
+            {"id": self.other_team.pk, "name": "New"},
+            {"id": self.team.pk, "name": "Newer"},
+        ]
+        response = self.client.patch(url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("name", response.data[1])
+        self.assertIn("Duplicate pk", response.data[2]["id"][0])
+
+        payload = [{"id": self.team.pk, "name": "Test team"}]
+        response = self.client.patch(url, payload, format="json")
+        self.assertIn("already exists", response.data[0]["name"][0])
+
+    def test_bulk_delete_people(self) -> None:
+        person1 = create_sample_person()
+        person2 = create_sample_person(first_name="John", email="john@example.com")
+        create_sample_person(first_name="Jack", email="j@ex.com")
+        payload = {"ids": [person1.pk, person2.pk]}
+        response = self.client.delete(PERSON_BULK_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertEqual(Person.objects.count(), 1)
+
+
+class ExportTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        team = create_sample_team()
+        other_team = create_sample_team(name="Other team")
+        self.person = create_sample_person()
+        self.person.teams.add(team, other_team)
+        create_sample_person(first_name="John", email="john@example.com")
+
+    def test_export_people_ndjson(self) -> None:
+        response = self.client.get(PERSON_EXPORT_URL)
+        rows = [json.loads(line) for line in response.streaming_content]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["id"], self.person.pk)
+        self.assertEqual(rows[0]["teams"], ["Test team", "Other team"])
+        self.assertEqual(rows[1]["teams"], [])
+
+    def test_export_people_csv(self) -> None:
+        response = self.client.get(PERSON_EXPORT_URL, {"output": "csv"})
+        content = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(
+            content.splitlines()[:2],
+            [
+                "id,first_name,last_name,email,teams",
+                f"{self.person.pk},Laura,Smith,laura@gmail.com,"
+                '"[""Test team"", ""Other team""]"',
+            ],
+        )
+
+    def test_export_command(self) -> None:
+        out = StringIO()
+        call_command("export_data", "teams", stdout=out)
+
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+    def test_export_import_round_trip(self) -> None:
+        self.person.teams.add(create_sample_team(name='R&D; "Paris", 2'))
+        teams = sorted(self.person.teams.values_list("name", flat=True))
+        for output_format in ("csv", "ndjson"):
+            with tempfile.NamedTemporaryFile(
+                suffix=f".{output_format}", delete=False
+            ) as file:
+                call_command(
+                    "export_data",
+                    "people",
+                    format=output_format,
+                    output=file.name,
+                    stdout=StringIO(),
+                )
+            Person.objects.all().delete()
+            call_command("import_people", file.name, stdout=StringIO())
+            os.unlink(file.name)
+
+            person = Person.objects.get(email=self.person.email)
+            self.assertEqual(sorted(person.teams.values_list("name", flat=True)), teams)
+
+
+class ImportPeopleTests(TestCase):
+    def test_import_people_csv(self) -> None:
+        create_sample_team()
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write("first_name,last_name,email,teams\n")
+            file.write('Jack,Smith,j@ex.com,"[""Test team"", ""R&D; Paris""]"\n')
+            file.write("Nick,Brown,n@ex.com,\n")
+
+        call_command("import_people", file.name, batch_size=1, stdout=StringIO())
+        os.unlink(file.name)
+
+        self.assertEqual(Person.objects.count(), 2)
+        self.assertEqual(Team.objects.count(), 2)
+        jack = Person.objects.get(email="j@ex.com")
+        self.assertEqual(
+            sorted(jack.teams.values_list("name", flat=True)),
+            ["R&D; Paris", "Test team"],
+        )
+
+    def test_import_people_ndjson_upsert(self) -> None:
+        person = create_sample_person()
+        record = {
+            "first_name": "Laura",
+            "last_name": "Brown",
+            "email": person.email,
+            "teams": [],
+        }
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as file:
+            file.write(json.dumps(record) + "\n")
+
+        call_command("import_people", file.name, upsert=True, stdout=StringIO())
+        os.unlink(file.name)
+
+        self.assertEqual(Person.objects.count(), 1)
+        person.refresh_from_db()
+        self.assertEqual(person.last_name, "Brown")
+
+    def test_import_people_skips_invalid_lines(self) -> None:
+        lines = [
+            {"first_name": "Jack", "last_name": "Smith", "email": "j@ex.com"},
+            {"first_name": "Nick", "email": "n@ex.com"},
+            {
+                "first_name": "Ann",
+                "last_name": "Lee",
+                "email": "a@ex.com",
+                "teams": "QA",
+            },
+            "{not json",
+            {"first_name": "Bob", "last_name": "Lee", "email": "bob", "teams": []},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as file:
+            for line in lines:
+                file.write((line if isinstance(line, str) else json.dumps(line)) + "\n")
+
+        out, err = StringIO(), StringIO()
+        call_command("import_people", file.name, stdout=out, stderr=err)
+        os.unlink(file.name)
+
+        self.assertEqual(
+            list(Person.objects.values_list("email", flat=True)), ["j@ex.com"]
+        )
+        self.assertFalse(Team.objects.exists())
+        self.assertIn("skipped 4 invalid rows", out.getvalue())
+        errors = err.getvalue().splitlines()
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(errors[0].startswith("Skipped line 2: "))
+        self.assertIn('"last_name"', errors[0])
+        self.assertIn('"teams"', errors[1])
+        self.assertIn("Invalid JSON", errors[2])
+        self.assertIn('"email"', errors[3])
+
+    def test_import_people_upsert_merges_duplicate_emails(self) -> None:
+        person = create_sample_person()
+        records = [
+            {"first_name": "A", "last_name": "One", "email": "new@ex.com"},
+            {"first_name": "B", "last_name": "Two", "email": person.email},
+            {
+                "first_name": "C",
+                "last_name": "Three",
+                "email": "new@ex.com",
+                "teams": ["QA"],
+            },
+            {"first_name": "D", "last_name": "Four", "email": person.email},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as file:
+            file.writelines(json.dumps(record) + "\n" for record in records)
+
+        call_command("import_people", file.name, upsert=True, stdout=StringIO())
+        os.unlink(file.name)
+
+        self.assertEqual(Person.objects.count(), 2)
+        person.refresh_from_db()
+        self.assertEqual(person.last_name, "Four")
+        new = Person.objects.get(email="new@ex.com")
+        self.assertEqual(new.last_name, "Three")
+        self.assertEqual(list(new.teams.values_list("name", flat=True)), ["QA"])
+
+
+class MemberCountTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team()
+        self.person = create_sample_person()
+        self.other = create_sample_person(first_name="John", email="john@example.com")
+
+    def assert_member_count(self, expected: int) -> None:
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.member_count, expected)
+        self.assertEqual(self.team.members.count(), expected)
+
+    def test_member_count_follows_m2m_changes(self) -> None:
+        self.team.members.add(self.person, self.other)
+        self.assert_member_count(2)
+
+        self.team.members.add(self.person)
+        self.assert_member_count(2)
+
+        self.person.teams.remove(self.team)
+        self.team.members.remove(self.person)
+        self.assert_member_count(1)
+
+        self.other.teams.clear()
+        self.assert_member_count(0)
+
+    def test_member_count_follows_bulk_sync_and_delete(self) -> None:
+        self.client.patch(
+            get_team_detail_url(self.team.pk) + "members/",
+            {"members": [self.person.pk, self.other.pk]},
+            format="json",
+        )
+        self.assert_member_count(2)
+
+        self.other.delete()
+        self.assert_member_count(1)
+
+    def test_member_count_follows_queryset_delete(self) -> None:
+        people = [self.person, self.other, create_sample_person(email="j@ex.com")]
+        self.team.members.add(*people)
+        sent = []
+        receiver = mock.Mock(side_effect=lambda **kwargs: sent.append(kwargs))
+        membership_changed.connect(receiver, sender=Membership)
+        self.addCleanup(membership_changed.disconnect, receiver, sender=Membership)
+
+        # One query collects the memberships of all the deleted people
+        with CaptureQueriesContext(connection) as queries:
+            Person.objects.filter(pk__in=[self.person.pk, self.other.pk]).delete()
+        membership_reads = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('SELECT "teams_person_teams"')
+        ]
+        self.assertEqual(len(membership_reads), 1)
+        self.assertEqual(len(sent), 1)
+        self.assertCountEqual(
+            sent[0]["removed"],
+            [(self.person.pk, self.team.pk), (self.other.pk, self.team.pk)],
+        )
+        self.assert_member_count(1)
+
+    def test_concurrent_adds_are_counted_once(self) -> None:
+        # A membership inserted by a concurrent request after this one read
+        # the current members: the insert must not count it again
+        Membership.objects.create(person_id=self.person.pk, team_id=self.team.pk)
+        Team.objects.filter(pk=self.team.pk).update(member_count=1)
+
+        response = self.client.put(
+            get_team_detail_url(self.team.pk) + "members/",
+            {"members_to_add": [self.person.pk, self.other.pk]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assert_member_count(2)
+
+    def test_remove_member_with_single_delete(self) -> None:
+        self.team.members.add(self.person)
+        url = reverse(
+            "teams:person-person-specific-team", args=[self.person.pk, self.team.pk]
+        )
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assert_member_count(0)
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assert_member_count(0)
+
+    def test_order_teams_by_number_of_members(self) -> None:
+        bigger_team = create_sample_team(name="Bigger team")
+        bigger_team.members.add(self.person, self.other)
+        self.team.members.add(self.person)
+        response = self.client.get(TEAM_URL, {"ordering": "-number_of_members"})
+
+        self.assertEqual(
+            [team["id"] for team in response.data["results"]],
+            [bigger_team.pk, self.team.pk],
+        )
+
+    def test_recompute_member_counts_command(self) -> None:
+        self.team.members.add(self.person)
+        Team.objects.update(member_count=10)
+        call_command("recompute_member_counts", stdout=StringIO())
+
+        self.assert_member_count(1)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team()
+        self.person = create_sample_person()
+        self.members_url = get_team_detail_url(self.team.pk) + "members/"
+
+    def test_cached_response_is_served_without_queries(self) -> None:
+        first = self.client.get(self.members_url)
+        hits = response_cache.stats["hits"]
+
+        # Only the version stamp of the conditional response is queried
+        with self.assertNumQueries(1):
+            second = self.client.get(self.members_url)
+
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(response_cache.stats["hits"], hits + 1)
+
+    def test_membership_change_invalidates_cached_responses(self) -> None:
+        self.client.get(self.members_url)
+        self.client.get(get_team_detail_url(self.team.pk))
+        self.team.members.add(self.person)
+
+        members = json.loads(self.client.get(self.members_url).content)
+        team = json.loads(self.client.get(get_team_detail_url(self.team.pk)).content)
+
+        self.assertEqual(
+            [member["id"] for member in members["results"]], [self.person.pk]
+        )
+        self.assertEqual(team["number_of_members"], 1)
+
+    def test_person_update_invalidates_team_members(self) -> None:
+        self.team.members.add(self.person)
+        self.client.get(self.members_url)
+        self.client.patch(
+            reverse("teams:person-detail", args=[self.person.pk]),
+            {"last_name": "Brown"},
+        )
+
+        members = json.loads(self.client.get(self.members_url).content)
+
+        self.assertEqual(members["results"][0]["last_name"], "Brown")
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team()
+        self.person = create_sample_person()
+        self.team.members.add(self.person)
+        self.teams_url = reverse("teams:person-person-teams", args=[self.person.pk])
+
+    def test_matching_etag_returns_not_modified(self) -> None:
+        response = self.client.get(self.teams_url)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.teams_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn("Last-Modified", response)
+
+    def test_etag_changes_with_membership_and_team_name(self) -> None:
+        etag = self.client.get(self.teams_url)["ETag"]
+        self.team.name = "Renamed team"
+        self.team.save()
+        renamed_etag = self.client.get(self.teams_url)["ETag"]
+        self.person.teams.clear()
+        cleared_etag = self.client.get(self.teams_url)["ETag"]
+
+        self.assertEqual(len({etag, renamed_etag, cleared_etag}), 3)
+
+    def test_list_etag_changes_on_delete(self) -> None:
+        response = self.client.get(PERSON_URL)
+        etag = response["ETag"]
+        # Deletes leave no trace for a Last-Modified of the list
+        self.assertNotIn("Last-Modified", response)
+
+        # The stamps of the people and of their teams, not the page
+        with self.assertNumQueries(2):
+            not_modified = self.client.get(PERSON_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.person.delete()
+        response = self.client.get(PERSON_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_etag_follows_data(self) -> None:
+        # Writes that send no signal, e.g. from another process or raw SQL
+        etag = self.client.get(TEAM_URL)["ETag"]
+        Team.objects.update(name="Renamed", updated_at=timezone.now())
+        self.assertNotEqual(self.client.get(TEAM_URL)["ETag"], etag)
+
+        # Other teams do not change a filtered list
+        filtered = self.client.get(TEAM_URL, {"min_members": 1})["ETag"]
+        create_sample_team(name="Support")
+        response = self.client.get(
+            TEAM_URL, {"min_members": 1}, HTTP_IF_NONE_MATCH=filtered
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_match_uses_the_etag_of_get(self) -> None:
+        url = get_team_detail_url(self.team.pk)
+        response = self.client.get(url, {"format": "json"})
+        response = self.client.patch(
+            url + "?format=json", {"name": "First"}, HTTP_IF_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_if_match_prevents_lost_updates(self) -> None:
+        url = get_team_detail_url(self.team.pk)
+        etag = self.client.get(url)["ETag"]
+        first = self.client.put(url, {"name": "First"}, HTTP_IF_MATCH=etag)
+        second = self.client.put(url, {"name": "Second"}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.name, "First")
+
+
+class FilterTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team()
+        self.other_team = create_sample_team(name="Other team")
+        self.laura = create_sample_person()
+        self.john = create_sample_person(
+            first_name="John", last_name="Smithson", email="John@Example.com"
+        )
+        create_sample_person(first_name="Nick", last_name="Brown", email="n@ex.com")
+        self.laura.teams.add(self.team, self.other_team)
+        self.john.teams.add(self.team)
+
+    def get_person_ids(self, **params) -> list:
+        response = self.client.get(PERSON_URL, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [person["id"] for person in json.loads(response.content)["results"]]
+
+    def test_filter_people_by_email(self) -> None:
+        self.assertEqual(self.get_person_ids(email="laura@gmail.com"), [self.laura.pk])
+        self.assertEqual(self.get_person_ids(email="john@example.com"), [])
+        self.assertEqual(
+            self.get_person_ids(email_iexact="john@example.com"), [self.john.pk]
+        )
+
+    def test_filter_people_by_name_prefix(self) -> None:
+        self.assertEqual(
+            self.get_person_ids(last_name="Smith"), [self.laura.pk, self.john.pk]
+        )
+        self.assertEqual(
+            self.get_person_ids(last_name="Smith", first_name="J"), [self.john.pk]
+        )
+
+    def test_filter_people_by_team(self) -> None:
+        teams = f"{self.team.pk},{self.other_team.pk}"
+
+        self.assertEqual(self.get_person_ids(team=teams), [self.laura.pk, self.john.pk])
+        self.assertEqual(
+            self.get_person_ids(team=teams, team_match="all"), [self.laura.pk]
+        )
+        response = self.client.get(PERSON_URL, {"team": "x"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_teams(self) -> None:
+        response = self.client.get(TEAM_URL, {"name": "Oth"})
+        self.assertEqual(
+            [team["id"] for team in json.loads(response.content)["results"]],
+            [self.other_team.pk],
+        )
+
+        response = self.client.get(TEAM_URL, {"min_members": 2, "max_members": 2})
+        self.assertEqual(
+            [team["id"] for team in json.loads(response.content)["results"]],
+            [self.team.pk],
+        )
+
+
+class SearchTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team(name="Marketing")
+        self.laura = create_sample_person()
+        self.john = create_sample_person(
+            first_name="John", last_name="Brown", email="john@example.com"
+        )
+        self.laura.teams.add(self.team)
+
+    def search(self, query: str, **params) -> list:
+        response = self.client.get(SEARCH_URL, {"q": query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(hit["type"], hit["id"]) for hit in response.data["results"]]
+
+    def test_search_is_typo_tolerant(self) -> None:
+        self.assertEqual(self.search("smiht")[0], ("person", self.laura.pk))
+        self.assertEqual(self.search("markting")[0], ("team", self.team.pk))
+
+    def test_search_returns_team_memberships(self) -> None:
+        response = self.client.get(SEARCH_URL, {"q": "laura"})
+
+        self.assertEqual(response.data["results"][0]["teams"][0]["name"], "Marketing")
+
+    def test_search_index_follows_changes(self) -> None:
+        self.john.last_name = "Walker"
+        self.john.save()
+        self.laura.delete()
+
+        self.assertEqual(self.search("walker")[0], ("person", self.john.pk))
+        self.assertNotIn(("person", self.laura.pk), self.search("laura"))
+
+    def test_search_pagination(self) -> None:
+        response = self.client.get(SEARCH_URL, {"q": "o", "limit": 1})
+        self.assertEqual(response.data["next_offset"], None)
+
+        response = self.client.get(SEARCH_URL, {"q": "jo", "limit": 1})
+        self.assertEqual(len(response.data["results"]), 1)
+
+        # Limits below 1 are raised to 1, SQLite would read "LIMIT -4" as none
+        response = self.client.get(SEARCH_URL, {"q": "jo", "limit": -5})
+        self.assertEqual(len(response.data["results"]), 1)
+        response = self.client.get(SEARCH_URL, {"q": "jo", "limit": "x"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_search_index_command(self) -> None:
+        Person.objects.filter(pk=self.john.pk).update(last_name="Walker")
+        call_command("rebuild_search_index", stdout=StringIO())
+
+        self.assertEqual(self.search("walker")[0], ("person", self.john.pk))
+
+    @mock.patch("teams.search.FTS_CANDIDATES", 2)
+    def test_common_substring_ranks_all_matches(self) -> None:
+        for i in range(3):
+            create_sample_person(first_name="Jonathan", email=f"j{i}@example.com")
+        # Created last, the best match must not be left out of the candidates
+        jon = create_sample_person(first_name="Jon", last_name="Lee", email="j@x.io")
+
+        self.assertEqual(self.search("jon", limit=1), [("person", jon.pk)])
+
+    @mock.patch("teams.search.FTS_CANDIDATES", 2)
+    def test_typo_in_common_name(self) -> None:
+        # More candidates share "smi" than are read, the shortest come first
+        for i in range(3):
+            create_sample_person(
+                first_name="Nicholas", last_name="Smithson", email=f"n{i}@x.io"
+            )
+        self.assertEqual(self.search("smiht")[0], ("person", self.laura.pk))
+        self.assertEqual(self.search("laura smiht")[0], ("person", self.laura.pk))
+
+    @override_settings(DEBUG=True)
+    def test_index_writes_under_debug_toolbar(self) -> None:
+        # The toolbar records the SQL of every request in development
+        self.assertIn("debug_toolbar", settings.INSTALLED_APPS)
+        response = self.client.post(TEAM_URL, {"name": "Support"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.delete(get_team_detail_url(response.data["id"]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.search("support"), [])
+
+    def test_search_table_needs_fts5(self) -> None:
+        migration = import_module("teams.migrations.0006_search_index")
+        self.assertTrue(migration.supports_fts5_trigrams(connection))
+
+        schema_editor = mock.Mock(connection=connection)
+        with mock.patch.object(connection, "cursor") as cursor:
+            cursor.return_value.__enter__.return_value.execute.side_effect = (
+                OperationalError("no such module: fts5")
+            )
+            migration.create_search_table(None, schema_editor)
+        schema_editor.execute.assert_not_called()
+
+    def test_trigram_index(self) -> None:
+        index = TrigramSearchIndex()
+
+        self.assertEqual(index.search("smiht", 5)[0][:2], ("person", self.laura.pk))
+        index.remove("person", [self.laura.pk])
+        self.assertEqual(index.search("laura", 5), [])
+
+    @override_settings(TEAMS_SEARCH_SYNC_SECONDS=0)
+    def test_trigram_index_catches_up_from_change_log(self) -> None:
+        index = TrigramSearchIndex()
+        index.search("laura", 5)
+        # Written by another process: its signals reach another index
+        with mock.patch("teams.signals.get_search_index", TrigramSearchIndex):
+            self.john.last_name = "Walker"
+            self.john.save()
+            self.laura.delete()
+
+        self.assertEqual(index.search("walker", 5)[0][:2], ("person", self.john.pk))
+        self.assertEqual(index.search("laura", 5), [])
+
+
+class ReadSerializerTests(TestCase):
+    def setUp(self) -> None:
+        teams = [create_sample_team(name=f"Team {i}") for i in range(3)]
+        people = [
+            create_sample_person(first_name=f"Person {i}", email=f"p{i}@example.com")
+            for i in range(4)
+        ]
+        people[0].teams.add(teams[2], teams[0])
+        people[1].teams.add(teams[1])
+        people[3].teams.add(*teams)
+
+    def test_team_read_serializer_matches_model_serializer(self) -> None:
+        teams = Team.objects.order_by("id")
+        rows = teams.values(*TeamReadSerializer.values)
+
+        self.assertEqual(
+            TeamReadSerializer(rows, many=True).data,
+            TeamListRetrieveSerializer(teams, many=True).data,
+        )
+
+    def test_person_read_serializer_matches_model_serializer(self) -> None:
+        people = Person.objects.order_by("id").prefetch_related("teams")
+        rows = people.values(*PersonReadSerializer.values)
+        expected = PersonListRetrieveSerializer(people, many=True).data
+
+        with self.assertNumQueries(2):
+            self.assertEqual(PersonReadSerializer(rows, many=True).data, expected)
+        self.assertEqual(PersonReadSerializer(rows[0]).data, expected[0])
+
+
+class JSONBackendTests(TestCase):
+    data = {
+        "name": "Équipe\u2028",
+        "created": datetime.datetime(2023, 1, 2, 3, 4, 5, 678901),
+        "ratio": decimal.Decimal("0.5"),
+        1: [1, None, True],
+    }
+
+    def test_orjson_renderer_matches_stdlib_renderer(self) -> None:
+        with self.settings(TEAMS_JSON_BACKEND="json"):
+            expected = FastJSONRenderer().render(self.data)
+
+        self.assertEqual(FastJSONRenderer().render(self.data), expected)
+
+    def test_parser(self) -> None:
+        for backend in ("orjson", "json"):
+            with self.settings(TEAMS_JSON_BACKEND=backend):
+                parser = FastJSONParser()
+                self.assertEqual(parser.parse(BytesIO(b'{"a": [1, 2]}')), {"a": [1, 2]})
+                with self.assertRaises(ParseError):
+                    parser.parse(BytesIO(b'{"a": NaN}'))
+
+    def test_integer_list_field(self) -> None:
+        laura = create_sample_person()
+        john = create_sample_person(email="john@example.com")
+
+        serializer = AddMembersSerializer(data={"members_to_add": [laura.pk]})
+        self.assertTrue(serializer.is_valid())
+        serializer = AddMembersSerializer(
+            data={"members_to_add": [laura.pk, str(john.pk)]}
+        )
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(
+            serializer.validated_data["members_to_add"], [laura.pk, john.pk]
+        )
+
+        serializer = AddMembersSerializer(data={"members_to_add": [laura.pk, True]})
+        self.assertFalse(serializer.is_valid())
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_dataset(self) -> None:
+        dataset = seed_dataset(teams=4, people=10, density=0.5)
+
+        self.assertEqual(dataset["memberships"], 20)
+        self.assertEqual(Person.objects.count(), 10)
+        self.assertEqual(
+            sorted(Team.objects.values_list("member_count", flat=True)),
+            sorted(
+                Team.objects.annotate(count=Count("members")).values_list(
+                    "count", flat=True
+                )
+            ),
+        )
+
+    def test_actions_stay_within_query_budgets(self) -> None:
+        dataset = seed_dataset(teams=4, people=30, density=0.5)
+        report = BenchmarkRunner(dataset, iterations=1).run()
+
+        self.assertEqual(check_budgets(report), [])
+        self.assertEqual(
+            set(report["actions"]["person-list"]),
+            {"queries", "peak_memory_kb", "statuses", "p50_ms", "p95_ms", "p99_ms"},
+        )
+
+
+class MetricsTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team()
+        self.team.members.add(create_sample_person())
+        request_metrics.reset()
+
+    def test_metrics_per_route(self) -> None:
+        members_url = reverse("teams:team-team-members", args=[self.team.pk])
+        self.client.get(members_url)
+        self.client.get(members_url)
+        self.client.get("/api/unknown/")
+
+        response = self.client.get(reverse("metrics"))
+        metrics = response.content.decode()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            'teams_http_requests_total{route="teams:team-team-members",'
+            'method="GET",status="200"} 2',
+            metrics,
+        )
+        self.assertIn('route="unmatched",method="GET",status="404"} 1', metrics)
+        self.assertIn(
+            'teams_db_queries_per_request_count{route="teams:team-team-members"} 2',
+            metrics,
+        )
+        self.assertIn(
+            'teams_http_request_duration_seconds_bucket{route="teams:team-team-members"'
+            ',le="+Inf"} 2',
+            metrics,
+        )
+
+    def test_slow_query_log(self) -> None:
+        with self.settings(TEAMS_SLOW_QUERY_MS=0):
+            with self.assertLogs("teams.slow_queries", "WARNING") as logs:
+                self.client.get(get_team_detail_url(self.team.pk))
+
+        self.assertIn(f"GET {get_team_detail_url(self.team.pk)}", logs.output[0])
+        self.assertIn("teams_db_slow_queries_total", request_metrics.render())
+
+
+class SettingsProfileTests(TestCase):
+    def test_sqlite_pragmas(self) -> None:
+        # The development profile keeps the SQLite defaults
+        self.assertEqual(settings.TEAMS_SQLITE_PRAGMAS, {})
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            default = cursor.fetchone()[0]
+            self.addCleanup(
+                connection.connection.execute, f"PRAGMA busy_timeout = {default}"
+            )
+            with self.settings(TEAMS_SQLITE_PRAGMAS={"busy_timeout": 1234}):
+                configure_sqlite(sender=None, connection=connection)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 1234)
+
+    def test_slow_configuration_check(self) -> None:
+        with self.settings(TEAMS_ENV="development", DEBUG=True):
+            self.assertEqual(check_slow_configuration(), [])
+
+        with self.settings(
+            TEAMS_ENV="production",
+            DEBUG=True,
+            TEAMS_SQLITE_PRAGMAS={"journal_mode": "DELETE"},
+        ):
+            ids = {warning.id for warning in check_slow_configuration()}
+
+        self.assertTrue({"teams.W001", "teams.W004"} <= ids)
+
+
+ASYNC_URLCONF = ModuleType("async_urlconf")
+ASYNC_URLCONF.urlpatterns = [
+    path("api/", include((get_urlpatterns(async_views=True), "teams")))
+]
+
+
+@override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+@override_settings(TEAMS_JOBS_EAGER=True, TEAMS_JOB_CHUNK_SIZE=2)
+class JobTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team()
+        self.people = [
+            create_sample_person(email=f"person{i}@example.com") for i in range(5)
+        ]
+
+    def submit(self, method: str, url: str, data: object) -> dict:
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(
+                f"{url}?async=true", data, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response["Location"], response.data["url"])
+        return self.client.get(response.data["url"]).data
+
+    def test_add_members_job(self) -> None:
+        person_ids = [person.pk for person in self.people]
+        job = self.submit(
+            "put",
+            reverse("teams:team-team-members", args=[self.team.pk]),
+            {"members_to_add": [*person_ids, 0]},
+        )
+
+        self.assertEqual(job["status"], Job.SUCCEEDED)
+        self.assertEqual((job["processed"], job["total"]), (6, 6))
+        self.assertEqual(job["result"], {"added": 5, "errors": 1})
+        self.assertEqual(job["errors"][0]["id"], 0)
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.member_count, 5)
+
+    def test_add_to_teams_job(self) -> None:
+        other_team = create_sample_team(name="Sales")
+        person = self.people[0]
+        person.teams.add(self.team)
+
+        job = self.submit(
+            "put",
+            reverse("teams:person-person-teams", args=[person.pk]),
+            {"teams": [self.team.pk, other_team.pk]},
+        )
+
+        self.assertEqual(job["result"], {"added": 1, "errors": 0})
+        self.assertEqual(person.teams.count(), 2)
+
+    def test_bulk_jobs_report_item_errors(self) -> None:
+        items = [{"name": "Support"}, {"name": ""}, {"name": "Legal"}]
+        # Repeated within a chunk
+        items.append({"name": "Legal"})
+        job = self.submit("post", TEAM_URL, items)
+
+        self.assertEqual(job["result"], {"created": 2, "errors": 2})
+        self.assertEqual([error["index"] for error in job["errors"]], [1, 3])
+        self.assertTrue(Team.objects.filter(name="Legal").exists())
+
+        bulk_url = reverse("teams:person-bulk")
+        job = self.submit(
+            "patch", bulk_url, [{"id": self.people[0].pk, "first_name": "Anna"}]
+        )
+        self.assertEqual(job["result"], {"updated": 1, "errors": 0})
+
+        ids = [person.pk for person in self.people]
+        job = self.submit("delete", bulk_url, {"ids": ids})
+        self.assertEqual(job["result"], {"deleted": 5, "errors": 0})
+        self.assertFalse(Person.objects.exists())
+
+    def test_failed_job(self) -> None:
+        job = Job.objects.create(kind="add_members", payload={}, total=1)
+        with self.assertLogs("teams.jobs", "ERROR"):
+            run_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+        # A job only runs once
+        run_job(job.pk)
+
+    def test_stale_job_resumes(self) -> None:
+        items = [{"name": f"Team {i}"} for i in range(5)]
+        create_sample_team(name="Team 0")
+        create_sample_team(name="Team 1")
+        # Its process stopped after the first chunk
+        started_at = timezone.now() - datetime.timedelta(hours=1)
+        job = Job.objects.create(
+            kind="bulk_create",
+            payload={"model": "team", "items": items},
+            total=5,
+            status=Job.RUNNING,
+            attempts=1,
+            processed=2,
+            result={"created": 2, "errors": 0},
+            started_at=started_at,
+            heartbeat_at=started_at,
+        )
+        # A running job with a recent heartbeat is left alone
+        Job.objects.create(
+            kind="bulk_create",
+            payload={"model": "team", "items": []},
+            status=Job.RUNNING,
+            started_at=started_at,
+            heartbeat_at=timezone.now(),
+        )
+
+        out = StringIO()
+        call_command("run_pending_jobs", stdout=out)
+        self.assertIn("Requeued 1 and failed 0 stale jobs.", out.getvalue())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual((job.attempts, job.processed), (2, 5))
+        self.assertEqual(job.result, {"created": 5, "errors": 0})
+        self.assertEqual(Team.objects.filter(name__startswith="Team ").count(), 5)
+
+    def test_stale_job_fails_after_max_attempts(self) -> None:
+        started_at = timezone.now() - datetime.timedelta(hours=1)
+        job = Job.objects.create(
+            kind="add_members",
+            payload={"team_id": self.team.pk, "person_ids": []},
+            status=Job.RUNNING,
+            attempts=3,
+            started_at=started_at,
+        )
+
+        self.assertEqual(requeue_stale_jobs(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+        self.assertIn("stopped responding", job.errors[0]["detail"])
+
+    def test_requeued_job_stops(self) -> None:
+        job = Job.objects.create(
+            kind="add_members",
+            payload={
+                "team_id": self.team.pk,
+                "person_ids": [person.pk for person in self.people],
+            },
+            total=5,
+        )
+        handler = JOB_HANDLERS["add_members"]
+
+        def requeue_after_first_chunk(
+            payload: dict, offset: int
+        ) -> Iterator[ChunkResult]:
+            for chunk in handler(payload, offset):
+                yield chunk
+                Job.objects.filter(pk=job.pk).update(status=Job.PENDING)
+
+        with mock.patch.dict(JOB_HANDLERS, add_members=requeue_after_first_chunk):
+            with self.assertLogs("teams.jobs", "WARNING"):
+                run_job(job.pk)
+
+        # The chunk of the lost run was rolled back with its progress (and,
+        # in this single connection, with the requeue), and it did not finish
+        job.refresh_from_db()
+        self.assertEqual((job.processed, job.finished_at), (2, None))
+        self.assertEqual(self.team.members.count(), 2)
+
+
+class ExpandBatchTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team(name="Marketing")
+        self.other_team = create_sample_team(name="Sales")
+        self.laura = create_sample_person()
+        self.john = create_sample_person(first_name="John", email="john@example.com")
+        self.laura.teams.add(self.team, self.other_team)
+        self.john.teams.add(self.team)
+
+    def test_expand_team_members(self) -> None:
+        response = self.client.get(TEAM_URL, {"expand": "members"})
+        team = response.data["results"][0]
+        self.assertEqual(
+            [member["first_name"] for member in team["members"]], ["Laura", "John"]
+        )
+
+        response = self.client.get(get_team_detail_url(self.other_team.pk))
+        self.assertNotIn("members", response.data)
+
+    def test_expand_sub_resources(self) -> None:
+        url = reverse("teams:team-team-members", args=[self.team.pk])
+        response = self.client.get(url, {"expand": "teams"})
+        laura = response.data["results"][0]
+        self.assertEqual(
+            [team["name"] for team in laura["teams"]], ["Marketing", "Sales"]
+        )
+
+        url = reverse("teams:person-person-teams", args=[self.john.pk])
+        response = self.client.get(url, {"expand": "members"})
+        self.assertEqual(len(response.data["results"][0]["members"]), 2)
+
+    def test_expanded_responses_follow_embedded_changes(self) -> None:
+        url = get_team_detail_url(self.team.pk)
+        first = self.client.get(url, {"expand": "members"})
+        self.john.first_name = "Johnny"
+        self.john.save()
+
+        response = self.client.get(
+            url, {"expand": "members"}, HTTP_IF_NONE_MATCH=first["ETag"]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Johnny", [m["first_name"] for m in response.data["members"]])
+
+    def test_batch(self) -> None:
+        url = reverse("teams:batch")
+        team_ids = f"{self.team.pk},{self.other_team.pk},0"
+
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                url, {"teams": team_ids, "people": f"{self.laura.pk},{self.john.pk}"}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["teams"][0]["members"]), 2)
+        self.assertEqual(len(response.data["people"][0]["teams"]), 2)
+        self.assertEqual(response.data["not_found"], {"teams": [0], "people": []})
+
+        response = self.client.get(url, {"teams": "x"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(TEAMS_RESPONSE_CACHE_ENABLED=False)
+class SparseFieldsTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team(name="Marketing")
+        self.laura = create_sample_person()
+        self.laura.teams.add(self.team)
+
+    def test_team_fields(self) -> None:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(TEAM_URL, {"fields": "name"})
+
+        self.assertEqual(
+            response.data["results"], [{"id": self.team.pk, "name": "Marketing"}]
+        )
+        self.assertNotIn("member_count", queries.captured_queries[-1]["sql"])
+
+        response = self.client.get(
+            get_team_detail_url(self.team.pk), {"fields": "number_of_members"}
+        )
+        self.assertEqual(response.data, {"id": self.team.pk, "number_of_members": 1})
+
+    def test_person_fields_skip_teams_query(self) -> None:
+        # The two list stamps and the page, without its teams
+        with self.assertNumQueries(3):
+            response = self.client.get(PERSON_URL, {"fields": "email"})
+        self.assertEqual(
+            response.data["results"], [{"id": self.laura.pk, "email": self.laura.email}]
+        )
+
+        response = self.client.get(PERSON_URL, {"fields": "first_name,teams"})
+        self.assertEqual(response.data["results"][0]["teams"][0]["name"], "Marketing")
+
+    def test_sub_resource_fields(self) -> None:
+        url = reverse("teams:team-team-members", args=[self.team.pk])
+        response = self.client.get(url, {"fields": "last_name", "expand": "teams"})
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "id": self.laura.pk,
+                    "last_name": self.laura.last_name,
+                    "teams": [{"id": self.team.pk, "name": "Marketing"}],
+                }
+            ],
+        )
+
+    def test_fields_with_ordering(self) -> None:
+        create_sample_team(name="Support")
+        # The ordering column is loaded for the cursor, but not rendered
+        for params, rendered in (
+            ({"fields": "name", "ordering": "number_of_members"}, ["id", "name"]),
+            ({"fields": "id", "ordering": "name"}, ["id"]),
+        ):
+            response = self.client.get(TEAM_URL, {**params, "page_size": 1})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(list(response.data["results"][0]), rendered)
+            self.assertIsNotNone(response.data["next"])
+
+            response = self.client.get(response.data["next"])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(PERSON_URL, {"fields": "email", "page_size": 1})
+        self.assertEqual(list(response.data["results"][0]), ["id", "email"])
+
+    def test_unknown_fields(self) -> None:
+        response = self.client.get(TEAM_URL, {"fields": "name,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("secret", response.data["fields"])
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team()
+        self.person = create_sample_person()
+        self.url = reverse("teams:team-team-members", args=[self.team.pk])
+
+    def put(self, key: str, data: dict) -> HttpResponse:
+        return self.client.put(self.url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_stored_response(self) -> None:
+        payload = {"members": [self.person.pk]}
+        first = self.client.post(
+            self.url, payload, format="json", HTTP_IDEMPOTENCY_KEY="sync-1"
+        )
+        self.client.delete(
+            reverse(
+                "teams:team-team-specific-member", args=[self.team.pk, self.person.pk]
+            )
+        )
+
+        with self.assertNumQueries(1):
+            retry = self.client.post(
+                self.url, payload, format="json", HTTP_IDEMPOTENCY_KEY="sync-1"
+            )
+
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry.json(), {"added": 1, "removed": 0})
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        # The operation did not run again
+        self.assertFalse(self.team.members.exists())
+
+    def test_key_reused_for_another_request(self) -> None:
+        self.put("add-1", {"members_to_add": [self.person.pk]})
+        response = self.put("add-1", {"members_to_add": []})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_key_in_progress(self) -> None:
+        self.put("add-1", {"members_to_add": [self.person.pk]})
+        IdempotencyKey.objects.update(status_code=None)
+
+        response = self.put("add-1", {"members_to_add": [self.person.pk]})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    @override_settings(TEAMS_IDEMPOTENCY_TTL=0)
+    def test_expired_key_runs_again(self) -> None:
+        self.put("add-1", {"members_to_add": [self.person.pk]})
+        response = self.put("add-1", {"members_to_add": [self.person.pk]})
+
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_abandoned_claim_is_released(self) -> None:
+        # Claimed by a worker that crashed before storing the response
+        self.put("add-1", {"members_to_add": [self.person.pk]})
+        IdempotencyKey.objects.update(
+            status_code=None, created_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+
+        response = self.put("add-1", {"members_to_add": [self.person.pk]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertIsNotNone(IdempotencyKey.objects.get().status_code)
+
+    def test_keys_are_scoped_to_the_client(self) -> None:
+        self.put("add-1", {"members_to_add": [self.person.pk]})
+        response = self.client.put(
+            self.url,
+            {"members_to_add": []},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="add-1",
+            REMOTE_ADDR="10.0.0.2",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+    def test_purge_expired_keys(self) -> None:
+        self.put("add-1", {"members_to_add": [self.person.pk]})
+        self.put("add-2", {"members_to_add": []})
+        IdempotencyKey.objects.filter(key="add-1").update(
+            created_at=timezone.now() - datetime.timedelta(days=2)
+        )
+
+        call_command("purge_idempotency_keys", stdout=StringIO())
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list("key", flat=True)), ["add-2"]
+        )
+
+
+@override_settings(TEAMS_READ_REPLICAS=["replica"], TEAMS_RESPONSE_CACHE_ENABLED=False)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team()
+        self.person = create_sample_person()
+        # The test database has no replica: count the replica picks instead
+        patcher = mock.patch("teams.routers.random.choice", return_value="default")
+        self.choice = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_router(self) -> None:
+        router = ReplicaRouter()
+        request = RequestFactory().get(TEAM_URL)
+
+        self.assertEqual(router.db_for_read(Team), "default")
+        with replica_reads(request):
+            self.assertEqual(router.db_for_read(Team), "default")
+            self.assertEqual(router.db_for_write(Team), "default")
+        self.assertEqual(self.choice.call_count, 1)
+        self.assertFalse(router.allow_migrate("replica", "teams"))
+
+    def test_read_actions_use_replica(self) -> None:
+        self.client.get(reverse("teams:team-team-members", args=[self.team.pk]))
+        self.assertTrue(self.choice.called)
+
+        self.choice.reset_mock()
+        self.client.post(TEAM_URL, {"name": "Support"})
+        self.assertFalse(self.choice.called)
+
+    def test_client_is_pinned_to_primary_after_write(self) -> None:
+        url = reverse("teams:team-team-members", args=[self.team.pk])
+        response = self.client.put(
+            url, {"members_to_add": [self.person.pk]}, format="json"
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+        pin = response[PIN_HEADER]
+
+        self.choice.reset_mock()
+        response = self.client.get(url)
+        self.assertFalse(self.choice.called)
+        self.assertEqual(response.json()["results"][0]["id"], self.person.pk)
+
+        # Clients without cookies send the header back instead
+        self.client.cookies.clear()
+        self.client.get(url, HTTP_X_PRIMARY_UNTIL=pin)
+        self.assertFalse(self.choice.called)
+
+        self.client.get(url)
+        self.assertTrue(self.choice.called)
+
+
+class ChangeFeedTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.laura = create_sample_person()
+
+    def get_actions(self, **params) -> list:
+        response = self.client.get(reverse("teams:changes"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            (change["resource"], change["action"], change["team_id"])
+            for change in response.data["results"]
+        ]
+
+    def test_writes_are_logged(self) -> None:
+        cursor = self.client.get(reverse("teams:changes"), {"since": "latest"}).data[
+            "cursor"
+        ]
+        response = self.client.post(TEAM_URL, {"name": "Support"}, format="json")
+        team_id = response.data["id"]
+        self.client.patch(get_team_detail_url(team_id), {"name": "Help"}, format="json")
+        self.client.put(
+            reverse("teams:team-team-members", args=[team_id]),
+            {"members_to_add": [self.laura.pk]},
+            format="json",
+        )
+        self.client.delete(
+            reverse("teams:team-team-specific-member", args=[team_id, self.laura.pk])
+        )
+        self.client.delete(get_team_detail_url(team_id))
+
+        self.assertEqual(
+            self.get_actions(since=cursor),
+            [
+                ("team", "created", team_id),
+                ("team", "updated", team_id),
+                ("membership", "added", team_id),
+                ("membership", "removed", team_id),
+                ("team", "deleted", team_id),
+            ],
+        )
+        self.assertEqual(
+            Change.objects.get(action="updated").data,
+            {"id": team_id, "name": "Help"},
+        )
+
+    def test_bulk_writes_are_logged(self) -> None:
+        Change.objects.all().delete()
+        payload = [{"first_name": "A", "last_name": "B", "email": "a@b.com"}]
+        self.client.post(PERSON_URL, payload, format="json")
+
+        change = Change.objects.get()
+        self.assertEqual((change.resource, change.action), ("person", "created"))
+        self.assertEqual(change.data["email"], "a@b.com")
+
+    def test_pages(self) -> None:
+        for name in ("A", "B", "C"):
+            create_sample_team(name=name)
+        since = Change.objects.order_by("pk").first().pk
+
+        page = self.client.get(reverse("teams:changes"), {"since": since, "limit": 2})
+        self.assertEqual(len(page.data["results"]), 2)
+        self.assertTrue(page.data["has_more"])
+
+        page = self.client.get(
+            reverse("teams:changes"), {"since": page.data["cursor"], "limit": 2}
+        )
+        self.assertEqual(page.data["results"][0]["data"]["name"], "C")
+        self.assertFalse(page.data["has_more"])
+
+        response = self.client.get(reverse("teams:changes"), {"since": "x"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(TEAMS_CHANGES_POLL_SECONDS=0.01)
+    def test_long_poll_times_out(self) -> None:
+        response = self.client.get(
+            reverse("teams:changes"), {"since": "latest", "wait": 0.05}
+        )
+        self.assertEqual(response.data["results"], [])
+        self.assertEqual(response.data["cursor"], Change.objects.latest("pk").pk)
+
+    @override_settings(TEAMS_CHANGES_STREAM_SECONDS=0)
+    def test_stream_resumes_from_last_event_id(self) -> None:
+        first = Change.objects.latest("pk").pk
+        team = create_sample_team(name="Support")
+
+        response = self.client.get(
+            reverse("teams:change-stream"), HTTP_LAST_EVENT_ID=str(first)
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join(response.streaming_content).decode()
+
+        last = Change.objects.latest("pk").pk
+        self.assertIn(f"id: {last}\nevent: change\n", body)
+        self.assertIn(f'"team_id":{team.pk}', body.replace(" ", ""))
+        self.assertNotIn(f"id: {first}\n", body)
+
+    @override_settings(TEAMS_CHANGES_VISIBILITY_SECONDS=60)
+    def test_recent_changes_are_held_back(self) -> None:
+        Change.objects.all().delete()
+        create_sample_team(name="Support")
+        create_sample_team(name="Sales")
+        first, second = Change.objects.order_by("pk")
+        # The first change committed after the second one, which is visible
+        Change.objects.filter(pk=second.pk).update(
+            created_at=F("created_at") - datetime.timedelta(minutes=5)
+        )
+
+        self.assertEqual(self.get_actions(), [])
+        self.assertEqual(get_latest_cursor(), first.pk - 1)
+
+        Change.objects.update(
+            created_at=F("created_at") - datetime.timedelta(minutes=5)
+        )
+        self.assertEqual(len(self.get_actions()), 2)
+        self.assertEqual(get_latest_cursor(), second.pk)
+
+    @override_settings(TEAMS_CHANGES_SYNC_MAX_SECONDS=0)
+    def test_sync_waits_are_capped(self) -> None:
+        started = time.monotonic()
+        response = self.client.get(
+            reverse("teams:changes"), {"since": "latest", "wait": 30}
+        )
+        self.assertEqual(response.data["results"], [])
+
+        response = self.client.get(reverse("teams:change-stream"))
+        self.assertIn(b"event: change", b"".join(response.streaming_content))
+        self.assertLess(time.monotonic() - started, 5)
+
+    @override_settings(
+        ROOT_URLCONF=ASYNC_URLCONF,
+        TEAMS_CHANGES_MAX_WAIT=0.1,
+        TEAMS_CHANGES_POLL_SECONDS=0.01,
+        TEAMS_CHANGES_SYNC_MAX_SECONDS=0,
+    )
+    async def test_async_long_poll(self) -> None:
+        client = AsyncClient()
+        cursor = await sync_to_async(get_latest_cursor)()
+        started = time.monotonic()
+        response = await client.get(
+            reverse("teams:changes"), {"since": "latest", "wait": 5}
+        )
+        # Not capped like the waits of sync views
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertEqual(json.loads(response.content)["cursor"], cursor)
+
+        response = await client.get(reverse("teams:changes"), {"wait": 5})
+        self.assertEqual(len(json.loads(response.content)["results"]), 1)
+        response = await client.get(reverse("teams:changes"), {"wait": "x"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with mock.patch(
+            "teams.changes.get_changes", side_effect=[[], [], [{"id": cursor}]]
+        ) as get_changes:
+            await await_changes(0, 5)
+        self.assertEqual(get_changes.call_count, 3)
+
+    @override_settings(ROOT_URLCONF=ASYNC_URLCONF, TEAMS_CHANGES_STREAM_SECONDS=0)
+    async def test_async_stream(self) -> None:
+        team = await sync_to_async(create_sample_team)(name="Support")
+        response = await AsyncClient().get(reverse("teams:change-stream"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertIn(f'"team_id":{team.pk}', body.decode().replace(" ", ""))
+
+        response = await AsyncClient().get(
+            reverse("teams:change-stream"), {"since": "x"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(TEAMS_CHANGE_LOG_ENABLED=False)
+    def test_disabled(self) -> None:
+        Change.objects.all().delete()
+        create_sample_team(name="Support")
+        self.assertFalse(Change.objects.exists())
+
+
+@override_settings(TEAMS_GRAPH_SYNC_SECONDS=60)
+class MembershipGraphTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.team = create_sample_team(name="Marketing")
+        self.other_team = create_sample_team(name="Sales")
+        self.support = create_sample_team(name="Support")
+        self.laura = create_sample_person()
+        self.john = create_sample_person(first_name="John", email="john@example.com")
+        self.ann = create_sample_person(first_name="Ann", email="ann@example.com")
+        self.laura.teams.add(self.team, self.other_team)
+        self.john.teams.add(self.team, self.other_team)
+        self.ann.teams.add(self.team, self.support)
+        membership_graph.reset()
+
+    def get_colleagues(self, person: Person) -> list:
+        url = reverse("teams:person-person-colleagues", args=[person.pk])
+        return [
+            (row["id"], row["shared_teams"])
+            for row in self.client.get(url).data["results"]
+        ]
+
+    def test_colleagues(self) -> None:
+        self.assertEqual(
+            self.get_colleagues(self.laura), [(self.john.pk, 2), (self.ann.pk, 1)]
+        )
+        url = reverse("teams:person-person-colleagues", args=[self.laura.pk])
+        response = self.client.get(url, {"limit": 1})
+        self.assertEqual(response.data["next_offset"], 1)
+        self.assertEqual(response.data["results"][0]["email"], self.john.email)
+
+        response = self.client.get(url, {"limit": -1})
+        self.assertEqual(response.data["next_offset"], 1)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_overlaps(self) -> None:
+        url = reverse("teams:team-team-overlaps", args=[self.team.pk])
+        response = self.client.get(url)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "id": self.other_team.pk,
+                    "name": "Sales",
+                    "number_of_members": 2,
+                    "shared_members": 2,
+                },
+                {
+                    "id": self.support.pk,
+                    "name": "Support",
+                    "number_of_members": 1,
+                    "shared_members": 1,
+                },
+            ],
+        )
+
+    def test_updated_incrementally(self) -> None:
+        self.get_colleagues(self.ann)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ann.teams.remove(self.team)
+            self.laura.teams.add(self.support)
+
+        with self.assertNumQueries(0):
+            colleagues = membership_graph.colleagues(self.ann.pk, 10)
+        self.assertEqual(colleagues, [(self.laura.pk, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.support.delete()
+        self.assertEqual(membership_graph.colleagues(self.ann.pk, 10), [])
+
+    @override_settings(TEAMS_GRAPH_SYNC_SECONDS=0)
+    def test_catches_up_from_change_log(self) -> None:
+        self.get_colleagues(self.ann)
+        # Written by another process: no signals reach this one
+        Membership.objects.create(person=self.ann, team=self.other_team)
+        Change.objects.create(
+            resource=Change.MEMBERSHIP,
+            action=Change.ADDED,
+            person_id=self.ann.pk,
+            team_id=self.other_team.pk,
+        )
+
+        self.assertEqual(
+            self.get_colleagues(self.ann), [(self.laura.pk, 2), (self.john.pk, 2)]
+        )
+
+    @override_settings(TEAMS_GRAPH_MAX_MEMBERSHIPS=1)
+    def test_sql_fallback(self) -> None:
+        self.assertEqual(
+            self.get_colleagues(self.laura), [(self.john.pk, 2), (self.ann.pk, 1)]
+        )
+        self.assertFalse(membership_graph.stats()["loaded"])
+
+    def test_stats(self) -> None:
+        self.get_colleagues(self.laura)
+        stats = membership_graph.stats()
+        self.assertEqual((stats["people"], stats["memberships"]), (3, 6))
+        self.assertGreater(stats["memory_bytes"], 0)
+        self.assertIn(
+            "teams_graph_memberships 6", self.client.get("/metrics").content.decode()
+        )
+
+
+@override_settings(
+    TEAMS_THROTTLE_CLIENT_RATE=(10, 1), TEAMS_THROTTLE_GLOBAL_RATE=(100, 1)
+)
+class ThrottleTests(TestCase):
+    def setUp(self) -> None:
+        caches["default"].clear()
+        self.client = APIClient()
+        self.team = create_sample_team()
+
+    def assert_rate_limit(self, response: HttpResponse, remaining: int) -> None:
+        self.assertEqual(response["RateLimit-Limit"], "10")
+        self.assertEqual(response["RateLimit-Remaining"], str(remaining))
+
+    def test_cost_of_lists_and_membership_writes(self) -> None:
+        response = self.client.get(PERSON_URL, {"page_size": 500})
+        self.assert_rate_limit(response, 4)
+
+        response = self.client.put(
+            reverse("teams:team-team-members", args=[self.team.pk]),
+            {"members_to_add": list(range(1, 201))},
+            format="json",
+        )
+        self.assert_rate_limit(response, 1)
+
+    def test_rejected_before_database_work(self) -> None:
+        # Costs more than a full bucket: allowed once it is full
+        response = self.client.get(PERSON_URL, {"page_size": 1000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(get_team_detail_url(self.team.pk))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assert_rate_limit(response, 0)
+
+    @override_settings(TEAMS_THROTTLE_GLOBAL_RATE=(5, 1))
+    def test_global_limit(self) -> None:
+        self.client.get(TEAM_URL, {"page_size": 400}, REMOTE_ADDR="10.0.0.1")
+        response = self.client.get(TEAM_URL, REMOTE_ADDR="10.0.0.2")
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # The client bucket of the second client is untouched
+        self.assert_rate_limit(response, 10)
+
+    @override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+    async def test_async_views(self) -> None:
+        client = AsyncClient()
+        response = await client.get(TEAM_URL, {"page_size": 1000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # A page of up to 100 rows costs 2 tokens
+        response = await client.get(TEAM_URL)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertEqual(response["RateLimit-Remaining"], "0")
+
+    @override_settings(TEAMS_THROTTLE_ENABLED=False)
+    def test_disabled(self) -> None:
+        response = self.client.get(PERSON_URL, {"page_size": 1000})
+        self.assertNotIn("RateLimit-Limit", response)
+
+
+@override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+class AsyncViewTests(TestCase):
+    def setUp(self) -> None:
+        self.async_client = AsyncClient()
+        self.team = create_sample_team(name="Marketing")
+        self.other_team = create_sample_team(name="Sales")
+        self.laura = create_sample_person()
+        self.john = create_sample_person(first_name="John", email="john@example.com")
+        self.laura.teams.add(self.team, self.other_team)
+        self.john.teams.add(self.team)
+
+    async def assert_same_response(self, url: str, **params) -> dict:
+        with override_settings(ROOT_URLCONF="team_api.urls"):
+            expected = await AsyncClient().get(url, params)
+
+        response = await self.async_client.get(url, params)
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+        for header in ("Content-Type", "ETag", "Last-Modified"):
+            self.assertEqual(response.get(header), expected.get(header), header)
+        return json.loads(response.content)
+
+    async def test_async_views_match_sync_views(self) -> None:
+        team, laura = self.team.pk, self.laura.pk
+        urls = [
+            TEAM_URL,
+            PERSON_URL,
+            get_team_detail_url(team),
+            reverse("teams:team-team-members", args=[team]),
+            reverse("teams:team-team-specific-member", args=[team, laura]),
+            reverse("teams:person-detail", args=[laura]),
+            reverse("teams:person-person-teams", args=[laura]),
+            reverse("teams:person-person-specific-team", args=[laura, team]),
+            get_team_detail_url(0),
+            reverse("teams:team-team-specific-member", args=[team, 0]),
+        ]
+        for url in urls:
+            await self.assert_same_response(url)
+
+        await self.assert_same_response(PERSON_URL, team=self.other_team.pk)
+        await self.assert_same_response(TEAM_URL, min_members="x")
+
+    async def test_async_cursor_pagination(self) -> None:
+        page = await self.assert_same_response(PERSON_URL, page_size=1)
+        self.assertEqual(page["results"][0]["id"], self.laura.pk)
+
+        page = await self.assert_same_response(page["next"])
+        self.assertEqual(page["results"][0]["id"], self.john.pk)
+        self.assertIsNone(page["next"])
+
+        page = await self.assert_same_response(page["previous"])
+        self.assertEqual(page["results"][0]["id"], self.laura.pk)
+
+    async def test_async_conditional_and_cached_responses(self) -> None:
+        url = get_team_detail_url(self.team.pk)
+        response = await self.async_client.get(url)
+        self.assertIn("Last-Modified", response)
+
+        response = await self.async_client.get(
+            url, headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Served from the cache filled by the DRF view: the stamp query only
+        await sync_to_async(response_cache.bump)(["epoch"])
+        with override_settings(ROOT_URLCONF="team_api.urls"):
+            await AsyncClient().get(PERSON_URL)
+        request_metrics.reset()
+        response = await self.async_client.get(PERSON_URL)
+        self.assertEqual(len(json.loads(response.content)["results"]), 2)
+        # The stamps of the people and of the teams
+        self.assertIn(
+            'teams_db_queries_per_request_sum{route="teams:person-list"} 2.0',
+            request_metrics.render(),
+        )
+
+    @override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+    async def test_async_request_metrics(self) -> None:
+        async def get_response(request: HttpRequest) -> HttpResponse:
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(get_response)))
+
+        request_metrics.reset()
+        await self.async_client.get(get_team_detail_url(self.team.pk))
+        # The stamp and the row, queried in threads of the async ORM
+        self.assertIn(
+            'teams_db_queries_per_request_sum{route="teams:team-detail"} 2.0',
+            request_metrics.render(),
+        )
+
+    async def test_async_primary_pin(self) -> None:
+        pins = []
+        other = RequestFactory().get(TEAM_URL)
+
+        async def get_response(request: HttpRequest) -> HttpResponse:
+            # Seen by the threads of the async ORM too
+            pins.append(await sync_to_async(is_pinned)(other))
+            return HttpResponse()
+
+        middleware = PrimaryPinMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        until = str(time.time() + 60)
+        await middleware(RequestFactory().get(TEAM_URL, HTTP_X_PRIMARY_UNTIL=until))
+        await middleware(RequestFactory().get(TEAM_URL))
+        self.assertEqual(pins, [True, False])
+        self.assertFalse(is_pinned(other))
+
+        with self.settings(TEAMS_READ_REPLICAS=["default"]):
+            response = await middleware(RequestFactory().post(TEAM_URL))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_middleware_chain_is_async(self) -> None:
+        # A single sync-only middleware would run the views in a thread
+        # (the debug toolbar is only used in development)
+        for name in settings.MIDDLEWARE:
+            if name.startswith("debug_toolbar."):
+                continue
+            self.assertTrue(import_string(name).async_capable, name)
+
+        async def get_response(request: HttpRequest) -> HttpResponse:
+            response = HttpResponse()
+            request.rate_limit = RateLimit(True, 10, 9, 1, 0)
+            return response
+
+        middleware = RateLimitHeadersMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get(TEAM_URL))
+        self.assertEqual(response["RateLimit-Remaining"], "9")
+
+    async def test_writes_are_passed_to_sync_views(self) -> None:
+        response = await self.async_client.post(
+            TEAM_URL, {"name": "Support"}, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(await Team.objects.filter(name="Support").aexists())
+
+
 # PersonApiTests will be similar to TeamApiTests
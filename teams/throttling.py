@@ -0,0 +1,197 @@
+"""
+Cost-weighted rate limiting of the teams and people endpoints.
+
+Every request takes tokens from two token buckets kept in the Django cache
+`TEAMS_THROTTLE_CACHE_ALIAS`: one of the client and one shared by all
+clients. A request costs one token, plus one per `TEAMS_THROTTLE_ROWS_PER_TOKEN`
+rows it can return (the page size of lists) or items it sends (bulk payloads,
+ID lists of membership writes). Requests are rejected with 429 and
+`Retry-After` before any database work, and responses carry the
+`RateLimit-Limit`, `RateLimit-Remaining` and `RateLimit-Reset` headers
+of the client bucket.
+
+Buckets are read and written without a lock, so concurrent requests
+may overdraw a bucket slightly.
+"""
+
+import math
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponseBase
+from rest_framework.request import Request
+from rest_framework.throttling import BaseThrottle
+from rest_framework.views import APIView
+
+CACHE_PREFIX = "teams:throttle"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class Bucket(NamedTuple):
+    capacity: int
+    # Tokens added back per second
+    refill: float
+
+
+class RateLimit(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the client bucket is full again
+    reset: int
+    # Seconds until a rejected request would be allowed
+    wait: float
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "TEAMS_THROTTLE_ENABLED", True)
+
+
+def get_buckets() -> Dict[str, Bucket]:
+    return {
+        "client": Bucket(*getattr(settings, "TEAMS_THROTTLE_CLIENT_RATE", (1000, 100))),
+        "global": Bucket(
+            *getattr(settings, "TEAMS_THROTTLE_GLOBAL_RATE", (20000, 2000))
+        ),
+    }
+
+
+def get_cost(rows: int) -> int:
+    return 1 + rows // getattr(settings, "TEAMS_THROTTLE_ROWS_PER_TOKEN", 100)
+
+
+def count_items(data: Any) -> int:
+    """
+    Number of items of a payload: its length for a list, the total length
+    of the lists in it for an object (e.g. `members_to_add`, `add`/`remove`).
+    """
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict):
+        return sum(count_items(value) for value in data.values())
+    return 0
+
+
+def take_tokens(ident: str, cost: int) -> RateLimit:
+    """
+    Take `cost` tokens from the client and the global buckets, if both
+    have enough. A request costing more than a full bucket needs a full one.
+    """
+    cache = caches[getattr(settings, "TEAMS_THROTTLE_CACHE_ALIAS", "default")]
+    buckets = get_buckets()
+    keys = {
+        "client": f"{CACHE_PREFIX}:client:{ident}",
+        "global": f"{CACHE_PREFIX}:global",
+    }
+    stored = cache.get_many(keys.values())
+    now = time.time()
+
+    levels = {}
+    wait = 0.0
+    for name, bucket in buckets.items():
+        tokens, updated = stored.get(keys[name], (bucket.capacity, now))
+        levels[name] = min(bucket.capacity, tokens + (now - updated) * bucket.refill)
+        needed = min(cost, bucket.capacity)
+        if levels[name] < needed:
+            wait = max(wait, (needed - levels[name]) / bucket.refill)
+
+    if not wait:
+        for name, bucket in buckets.items():
+            levels[name] -= min(cost, bucket.capacity)
+        cache.set_many(
+            {keys[name]: (levels[name], now) for name in buckets},
+            # Expire once full again: a missing bucket is a full one
+            timeout=max(
+                math.ceil(bucket.capacity / bucket.refill)
+                for bucket in buckets.values()
+            ),
+        )
+
+    client = buckets["client"]
+    return RateLimit(
+        allowed=not wait,
+        limit=client.capacity,
+        remaining=max(math.floor(levels["client"]), 0),
+        reset=math.ceil((client.capacity - levels["client"]) / client.refill),
+        wait=wait,
+    )
+
+
+def throttle_request(request: HttpRequest, ident: str, cost: int) -> RateLimit:
+    """
+    Take the tokens of a request and keep the result for the response headers.
+    """
+    request.rate_limit = take_tokens(ident, cost)
+    return request.rate_limit
+
+
+def get_ident(request: HttpRequest) -> str:
+    # Client address, behind `NUM_PROXIES` proxies as DRF throttles do
+    return BaseThrottle().get_ident(request)
+
+
+class CostThrottle(BaseThrottle):
+    """
+    DRF throttle of `TeamViewSet`/`PersonViewSet`. The cost of reads is the
+    page size for the `paged_actions` of the view, and `throttle_costs` sets
+    fixed costs of actions such as exports.
+    """
+
+    def allow_request(self, request: Request, view: APIView) -> bool:
+        if not is_enabled():
+            return True
+        cost = getattr(view, "throttle_costs", {}).get(view.action)
+        if cost is None:
+            cost = get_cost(self.get_rows(request, view))
+        self.rate_limit = throttle_request(
+            request._request, self.get_ident(request), cost
+        )
+        return self.rate_limit.allowed
+
+    @staticmethod
+    def get_rows(request: Request, view: APIView) -> int:
+        if request.method not in SAFE_METHODS:
+            return count_items(request.data)
+        if view.action in getattr(view, "paged_actions", ()):
+            return view.paginator.get_page_size(request) or 0
+        return 0
+
+    def wait(self) -> Optional[float]:
+        return self.rate_limit.wait
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Add the `RateLimit-*` headers to the responses of throttled requests.
+    It runs natively under both WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponseBase:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        return self.add_headers(request, await self.get_response(request))
+
+    @staticmethod
+    def add_headers(
+        request: HttpRequest, response: HttpResponseBase
+    ) -> HttpResponseBase:
+        rate_limit = getattr(request, "rate_limit", None)
+        if rate_limit is not None:
+            response["RateLimit-Limit"] = str(rate_limit.limit)
+            response["RateLimit-Remaining"] = str(rate_limit.remaining)
+            response["RateLimit-Reset"] = str(rate_limit.reset)
+        return response
@@ -1,14 +1,49 @@
-from django.urls import path, include
+from typing import List
+
+from django.conf import settings
+from django.urls import URLPattern, path, include
 from rest_framework import routers
 
-from teams.views import TeamViewSet, PersonViewSet
+from teams.async_views import (
+    AsyncChangeFeedView,
+    change_stream as async_change_stream,
+    get_async_urlpatterns,
+)
+from teams.views import (
+    TeamViewSet,
+    PersonViewSet,
+    JobViewSet,
+    BatchView,
+    ChangeFeedView,
+    CacheStatsView,
+    SearchView,
+    change_stream,
+)
 
 router = routers.DefaultRouter()
 router.register("teams", TeamViewSet)
 router.register("people", PersonViewSet)
+router.register("jobs", JobViewSet)
+
+
+def get_urlpatterns(async_views: bool = False) -> List[URLPattern]:
+    router_urls = router.urls
+    change_feed_view, change_stream_view = ChangeFeedView.as_view(), change_stream
+    if async_views:
+        router_urls = get_async_urlpatterns(router_urls)
+        change_feed_view = AsyncChangeFeedView.as_view(sync_view=change_feed_view)
+        change_stream_view = async_change_stream
+
+    return [
+        path("", include(router_urls)),
+        path("batch/", BatchView.as_view(), name="batch"),
+        path("changes/", change_feed_view, name="changes"),
+        path("changes/stream/", change_stream_view, name="change-stream"),
+        path("cache-stats/", CacheStatsView.as_view(), name="cache-stats"),
+        path("search/", SearchView.as_view(), name="search"),
+    ]
+
 
-urlpatterns = [
-    path("", include(router.urls)),
-]
+urlpatterns = get_urlpatterns(settings.TEAMS_ASYNC_VIEWS)
 
 app_name = "teams"
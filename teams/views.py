@@ -1,45 +1,393 @@
-from typing import Type
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
-from django.db.models import Count, QuerySet
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBase,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404
+from drf_spectacular.utils import extend_schema
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, ValidationError
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.serializers import Serializer
+from rest_framework.views import APIView
 
-from teams.models import Team, Person
+from teams.models import Job, Team, Person
 from teams.serializers import (
     TeamSerializer,
     PersonSerializer,
     TeamListRetrieveSerializer,
     PersonListRetrieveSerializer,
+    TeamReadSerializer,
+    PersonReadSerializer,
     AddMembersSerializer,
     BasePersonSerializer,
     AddToTeamsSerializer,
+    SyncMembersSerializer,
+    SyncMembershipsSerializer,
+    BulkDeleteSerializer,
+    JobSerializer,
+    expand_rows,
+    get_bulk_batch_size,
+)
+from teams.cache import cache_response, response_cache
+from teams.changes import (
+    get_changes,
+    get_max_wait,
+    get_stream_seconds,
+    iter_events,
+    parse_cursor,
+    wait_for_changes,
+)
+from teams.conditional import (
+    conditional_response,
+    teams_stamp,
+    team_stamp,
+    team_members_stamp,
+    team_member_stamp,
+    people_stamp,
+    person_stamp,
+    person_team_stamp,
+)
+from teams.idempotency import idempotent
+from teams.filters import AliasOrderingFilter, PersonFilter, TeamFilter
+from teams.export import EXPORT_FORMATS, export_response
+from teams.graph import Overlap, membership_graph
+from teams.jobs import submit_job
+from teams.membership import (
+    add_person_to_teams,
+    remove_membership,
+    sync_team_members,
+    sync_memberships,
 )
+from teams.metrics import request_metrics
+from teams.routers import replica_reads
+from teams.throttling import CostThrottle
+from teams.search import PERSON, TEAM, get_search_index
+
+
+def get_export_response(request: Request, resource: str) -> HttpResponseBase:
+    output_format = request.query_params.get("output", "ndjson")
+    if output_format not in EXPORT_FORMATS:
+        return Response(
+            {"output": f"Expected one of: {', '.join(EXPORT_FORMATS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return export_response(resource, output_format)
+
+
+def is_async_job(request: Request) -> bool:
+    """
+    Whether the client asked to run the operation as a job (`?async=true`).
+    """
+    return request.query_params.get("async", "").lower() in ("1", "true")
+
+
+def get_job_response(
+    request: Request, kind: str, payload: dict, total: int
+) -> Response:
+    """
+    Submit a job (see teams.jobs) and answer 202 with its status URL.
+    """
+    job = submit_job(kind, payload, total)
+    data = JobSerializer(job, context={"request": request}).data
+    return Response(
+        data, status=status.HTTP_202_ACCEPTED, headers={"Location": data["url"]}
+    )
+
+
+def remove_pair_or_404(person_id: str, team_id: str) -> None:
+    """
+    Remove a membership with a single DELETE, 404 when there was none.
+    """
+    try:
+        removed = remove_membership(int(person_id), int(team_id))
+    except ValueError:
+        removed = 0
+    if not removed:
+        raise Http404
+
+
+def get_limit_offset(request: Request, default: int, max_limit: int) -> Tuple[int, int]:
+    """
+    The `limit` (within 1 and `max_limit`) and `offset` query params of a page.
+    """
+    try:
+        limit = int(request.query_params.get("limit", default))
+        offset = int(request.query_params.get("offset", 0))
+    except ValueError:
+        raise ParseError("limit and offset must be integers.")
+    return max(1, min(limit, max_limit)), max(offset, 0)
+
 
+def get_overlaps_response(
+    request: Request,
+    find: Callable[[int, int, int], List[Overlap]],
+    pk: int,
+    rows: QuerySet,
+    count_name: str,
+) -> Response:
+    """
+    Page (`limit`, `offset`) of the objects found by a `membership_graph`
+    query, rendered from `rows` with the number of shared objects.
+    """
+    limit, offset = get_limit_offset(request, 20, 100)
 
-class TeamViewSet(viewsets.ModelViewSet):
+    # Find one extra object to know whether there is a next page
+    overlaps = find(pk, limit + 1, offset)
+    has_next = len(overlaps) > limit
+    overlaps = overlaps[:limit]
+    objects = {row["id"]: row for row in rows.filter(pk__in=[i for i, _ in overlaps])}
+    results = [
+        {**objects[pk], count_name: shared}
+        for pk, shared in overlaps
+        # The object may have been deleted since the index was updated
+        if pk in objects
+    ]
+    return Response(
+        {"next_offset": offset + limit if has_next else None, "results": results},
+        status=status.HTTP_200_OK,
+    )
+
+
+class BulkModelMixin:
+    """
+    Accept list payloads on create and add bulk update/delete on `<prefix>/bulk/`.
+    Every bulk operation runs in a single transaction and reports per-item errors.
+    With `?async=true` they run as a job instead, committing chunk by chunk.
+    """
+
+    def get_job_context(self, request: Request) -> dict:
+        """
+        Serializer context of the operations that can run as jobs: the jobs
+        check the existence of the PKs themselves, chunk by chunk.
+        """
+        return {
+            **self.get_serializer_context(),
+            "defer_pk_checks": is_async_job(request),
+        }
+
+    def get_job_payload(self, **payload) -> dict:
+        return {"model": self.queryset.model._meta.model_name, **payload}
+
+    @idempotent
+    def create(self, request: Request, *args, **kwargs) -> Response:
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+
+        if is_async_job(request):
+            payload = self.get_job_payload(items=request.data)
+            return get_job_response(request, "bulk_create", payload, len(request.data))
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        if serializer.is_valid():
+            with transaction.atomic():
+                serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=["patch"], detail=False, url_path="bulk", url_name="bulk")
+    @idempotent
+    def bulk_update(self, request: Request, *args, **kwargs) -> Response:
+        if not isinstance(request.data, list):
+            return Response(
+                {"detail": "Expected a list of objects with 'id'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if is_async_job(request):
+            payload = self.get_job_payload(items=request.data)
+            return get_job_response(request, "bulk_update", payload, len(request.data))
+
+        ids = [item.get("id") for item in request.data if isinstance(item, dict)]
+        instances = self.get_queryset().filter(pk__in=ids)
+        serializer = self.get_serializer(
+            instances, data=request.data, many=True, partial=True
+        )
+        if serializer.is_valid():
+            with transaction.atomic():
+                serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @bulk_update.mapping.delete
+    @idempotent
+    def bulk_destroy(self, request: Request, *args, **kwargs) -> Response:
+        serializer = self.get_serializer(
+            data=request.data, context=self.get_job_context(request)
+        )
+        if serializer.is_valid():
+            ids = serializer.validated_data["ids"]
+            if is_async_job(request):
+                payload = self.get_job_payload(ids=ids)
+                return get_job_response(request, "bulk_destroy", payload, len(ids))
+
+            batch_size = get_bulk_batch_size()
+            deleted = 0
+            with transaction.atomic():
+                for start in range(0, len(ids), batch_size):
+                    chunk = ids[start : start + batch_size]
+                    deleted += (
+                        self.get_queryset()
+                        .filter(pk__in=chunk)
+                        .delete()[1][self.queryset.model._meta.label]
+                    )
+            return Response({"deleted": deleted}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ReplicaReadMixin:
+    """
+    Serve the actions listed in `replica_actions` from a read replica
+    (see teams.routers), unless the client is pinned to the primary.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponseBase:
+        action = self.action_map.get(request.method.lower())
+        with replica_reads(request, action in self.replica_actions):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ExpandMixin:
+    """
+    `?expand=members,teams` embeds the related objects of the rendered
+    teams/people; `expand_actions` maps an action to what it can expand.
+    """
+
+    expand_actions: Dict[str, Tuple[str, ...]] = {}
+
+    def get_expand(self) -> Tuple[str, ...]:
+        requested = self.request.query_params.get("expand", "").split(",")
+        allowed = self.expand_actions.get(self.action, ())
+        return tuple(name for name in allowed if name in requested)
+
+    def expand(self, rows: List[dict]) -> List[dict]:
+        return expand_rows(rows, self.get_expand())
+
+
+class FieldSelectionMixin:
+    """
+    `?fields=id,name` renders only the listed fields of the read actions
+    (`id` is always included) and skips the columns and queries behind
+    the others.
+    """
+
+    def get_fields(self) -> Optional[Tuple[str, ...]]:
+        param = self.request.query_params.get("fields")
+        if param is None or self.request.method not in ("GET", "HEAD"):
+            return None
+        available = self.get_serializer_class().Meta.fields
+        requested = {name.strip() for name in param.split(",") if name.strip()}
+        unknown = requested.difference(available)
+        if unknown:
+            raise ValidationError(
+                {
+                    "fields": f"Unknown fields: {', '.join(sorted(unknown))}. "
+                    f"Expected some of: {', '.join(available)}."
+                }
+            )
+        return tuple(name for name in available if name == "id" or name in requested)
+
+    def get_serializer_context(self) -> dict:
+        return {**super().get_serializer_context(), "fields": self.get_fields()}
+
+    def get_read_values(self, serializer_class: Type[Serializer]) -> Tuple[str, ...]:
+        """
+        Columns of the `values()` rows of the read actions: those of the
+        requested fields, plus the ordering columns the cursor pagination
+        reads from the last row. The read serializers render only the fields.
+        """
+        values = serializer_class.get_values(self.get_fields())
+        if self.action != "list" or self.paginator is None:
+            return values
+        ordering = self.paginator.get_ordering(self.request, self.queryset, self)
+        columns = (term.lstrip("-") for term in ordering)
+        return values + tuple(column for column in columns if column not in values)
+
+    def project(self, queryset: QuerySet) -> QuerySet:
+        """
+        Load only the columns of the requested fields.
+        """
+        fields = self.get_fields()
+        return queryset if fields is None else queryset.only(*fields)
+
+
+class TeamViewSet(
+    FieldSelectionMixin,
+    ExpandMixin,
+    ReplicaReadMixin,
+    BulkModelMixin,
+    viewsets.ModelViewSet,
+):
     # It is possible to add permissions
     # like IsAuthenticatedOrReadOnly or IsAdminOrReadOnly.
     # In this case, there are no permissions, as we assume
     # that this API will be used for internal company purposes
     # and will be available to everyone
     queryset = Team.objects.all()
+    filter_backends = [AliasOrderingFilter, TeamFilter]
+    ordering_fields = ["id", "name", "number_of_members"]
+    # The number of members is stored in the indexed `member_count` column
+    ordering_aliases = {"number_of_members": "member_count"}
+    ordering = ["id"]
+    replica_actions = ("list", "retrieve", "members", "specific_member")
+    throttle_classes = [CostThrottle]
+    # Reads costing one token per page of rows, and fixed costs (see teams.throttling)
+    paged_actions = ("list", "members")
+    throttle_costs = {"export": 100}
+    expand_actions = {
+        "list": ("members",),
+        "retrieve": ("members",),
+        "members": ("teams",),
+        "specific_member": ("teams",),
+    }
+
+    @extend_schema(responses=TeamListRetrieveSerializer)
+    @conditional_response(teams_stamp)
+    @cache_response("teams")
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        response = super().list(request, *args, **kwargs)
+        self.expand(response.data["results"])
+        return response
+
+    @extend_schema(responses=TeamListRetrieveSerializer)
+    @conditional_response(team_stamp)
+    @cache_response("team:pk")
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        response = super().retrieve(request, *args, **kwargs)
+        self.expand([response.data])
+        return response
+
+    @conditional_response(team_stamp)
+    def update(self, request: Request, *args, **kwargs) -> Response:
+        return super().update(request, *args, **kwargs)
+
+    @conditional_response(team_stamp)
+    def destroy(self, request: Request, *args, **kwargs) -> Response:
+        return super().destroy(request, *args, **kwargs)
 
     def get_queryset(self) -> QuerySet:
         queryset = self.queryset
 
-        # We perform annotation here to decrease the number of SQL queries
+        # Read actions render plain rows with the lean read serializer
         if self.action in ("list", "retrieve"):
-            queryset = queryset.annotate(number_of_members=Count("members"))
+            queryset = queryset.values(*self.get_read_values(TeamReadSerializer))
 
         return queryset
 
     def get_serializer_class(self) -> Type[Serializer] | None:
         if self.action in ("list", "retrieve"):
-            return TeamListRetrieveSerializer
+            return TeamReadSerializer
 
         if self.action in ("members", "specific_member"):
             return BasePersonSerializer
@@ -47,65 +395,175 @@ class TeamViewSet(viewsets.ModelViewSet):
         if self.action == "add_members":
             return AddMembersSerializer
 
+        if self.action == "sync_members":
+            return SyncMembersSerializer
+
+        if self.action == "memberships":
+            return SyncMembershipsSerializer
+
+        if self.action == "bulk_destroy":
+            return BulkDeleteSerializer
+
         return TeamSerializer
 
     @action(methods=["get"], detail=True, url_path="members", url_name="team-members")
+    @conditional_response(team_members_stamp)
+    @cache_response("team:pk", "people")
     def members(self, request: Request, *args, **kwargs) -> Response:
         team = self.get_object()
-        members = team.members.all()
+        members = self.paginate_queryset(self.project(team.members.all()))
         serializer = self.get_serializer(members, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(self.expand(serializer.data))
 
     @members.mapping.put
+    @idempotent
+    @conditional_response(team_members_stamp)
     def add_members(self, request: Request, *args, **kwargs) -> Response:
         team = self.get_object()
-        serializer = self.get_serializer(data=request.data)
+        serializer = self.get_serializer(
+            data=request.data, context=self.get_job_context(request)
+        )
         if serializer.is_valid():
             members_to_add = serializer.validated_data["members_to_add"]
-            team.members.add(*members_to_add)
-            team.save()
+            if is_async_job(request):
+                payload = {"team_id": team.pk, "person_ids": members_to_add}
+                return get_job_response(
+                    request, "add_members", payload, len(members_to_add)
+                )
+            sync_team_members(team.pk, add=members_to_add)
             return Response(status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @members.mapping.post
+    @members.mapping.patch
+    @idempotent
+    @conditional_response(team_members_stamp)
+    def sync_members(self, request: Request, *args, **kwargs) -> Response:
+        """
+        Reconcile team members with the full `members` set
+        or with explicit `add`/`remove` lists.
+        """
+        team = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        if serializer.is_valid():
+            changes = sync_team_members(team.pk, **serializer.validated_data)
+            return Response(changes, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=["get"], detail=True, url_path="overlaps", url_name="team-overlaps")
+    def overlaps(self, request: Request, *args, **kwargs) -> Response:
+        """
+        Teams sharing members with this team, by number of shared members
+        (`shared_members`), paginated with `limit` and `offset`.
+        """
+        team = self.get_object()
+        return get_overlaps_response(
+            request,
+            membership_graph.overlaps,
+            team.pk,
+            Team.objects.values("id", "name", number_of_members=F("member_count")),
+            "shared_members",
+        )
+
+    @action(
+        methods=["post"],
+        detail=False,
+        url_path="memberships",
+        url_name="team-memberships",
+    )
+    @idempotent
+    def memberships(self, request: Request, *args, **kwargs) -> Response:
+        """
+        Replace the member sets of many teams: `{"teams": {team_id: [person_ids]}}`.
+        """
+        serializer = self.get_serializer(data=request.data)
+        if serializer.is_valid():
+            changes = sync_memberships(serializer.validated_data["teams"])
+            return Response(changes, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=["get"], detail=False, url_path="export", url_name="team-export")
+    def export(self, request: Request, *args, **kwargs) -> HttpResponseBase:
+        """
+        Stream all teams as NDJSON or CSV (`?output=ndjson|csv`).
+        """
+        return get_export_response(request, "teams")
+
     @action(
         methods=["get"],
         detail=True,
         url_path="members/(?P<person_id>[^/.]+)",
         url_name="team-specific-member",
     )
+    @conditional_response(team_member_stamp)
+    @cache_response("team:pk", "person:person_id")
     def specific_member(
         self, request: Request, person_id: int, *args, **kwargs
     ) -> Response:
         team = self.get_object()
-        member = get_object_or_404(team.members, pk=person_id)
+        member = get_object_or_404(self.project(team.members.all()), pk=person_id)
         serializer = self.get_serializer(member)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(self.expand([serializer.data])[0], status=status.HTTP_200_OK)
 
     @specific_member.mapping.delete
+    @idempotent
+    @conditional_response(team_member_stamp)
     def remove_specific_member(
         self, request: Request, person_id: int, *args, **kwargs
     ) -> Response:
-        team = self.get_object()
-        member = get_object_or_404(team.members, pk=person_id)
-        team.members.remove(member)
+        remove_pair_or_404(person_id, kwargs["pk"])
         return Response(status=status.HTTP_200_OK)
 
 
-class PersonViewSet(viewsets.ModelViewSet):
+class PersonViewSet(
+    FieldSelectionMixin,
+    ExpandMixin,
+    ReplicaReadMixin,
+    BulkModelMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Person.objects.all()
+    filter_backends = [PersonFilter]
+    replica_actions = ("list", "retrieve", "teams", "specific_team")
+    throttle_classes = [CostThrottle]
+    paged_actions = ("list", "teams")
+    throttle_costs = {"export": 100}
+    # People are always rendered with their teams
+    expand_actions = {"teams": ("members",), "specific_team": ("members",)}
+
+    @extend_schema(responses=PersonListRetrieveSerializer)
+    @conditional_response(people_stamp)
+    @cache_response("people", "teams")
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        return super().list(request, *args, **kwargs)
+
+    @extend_schema(responses=PersonListRetrieveSerializer)
+    @conditional_response(person_stamp)
+    @cache_response("person:pk", "teams")
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        return super().retrieve(request, *args, **kwargs)
+
+    @conditional_response(person_stamp)
+    def update(self, request: Request, *args, **kwargs) -> Response:
+        return super().update(request, *args, **kwargs)
+
+    @conditional_response(person_stamp)
+    def destroy(self, request: Request, *args, **kwargs) -> Response:
+        return super().destroy(request, *args, **kwargs)
 
     def get_queryset(self) -> QuerySet:
         queryset = self.queryset
 
-        # Decrease the number of SQL queries
+        # Read actions render plain rows with the lean read serializer,
+        # which fetches the teams of a whole page with one query
         if self.action in ("list", "retrieve"):
-            queryset = queryset.prefetch_related("teams")
+            queryset = queryset.values(*self.get_read_values(PersonReadSerializer))
 
         return queryset
 
     def get_serializer_class(self) -> Type[Serializer]:
         if self.action in ("list", "retrieve"):
-            return PersonListRetrieveSerializer
+            return PersonReadSerializer
 
         if self.action in ("teams", "specific_team"):
             return TeamSerializer
@@ -113,45 +571,296 @@ class PersonViewSet(viewsets.ModelViewSet):
         if self.action == "add_to_teams":
             return AddToTeamsSerializer
 
+        if self.action == "bulk_destroy":
+            return BulkDeleteSerializer
+
         return PersonSerializer
 
     @action(methods=["get"], detail=True, url_path="teams", url_name="person-teams")
+    @conditional_response(person_stamp)
+    @cache_response("person:pk", "teams")
     def teams(self, request: Request, *args, **kwargs) -> Response:
         person = self.get_object()
-        teams = person.teams.all()
+        teams = self.paginate_queryset(self.project(person.teams.all()))
         serializer = self.get_serializer(teams, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(self.expand(serializer.data))
 
     @teams.mapping.put
+    @idempotent
+    @conditional_response(person_stamp)
     def add_to_teams(self, request: Request, *args, **kwargs) -> Response:
         person = self.get_object()
-        serializer = self.get_serializer(data=request.data)
+        serializer = self.get_serializer(
+            data=request.data, context=self.get_job_context(request)
+        )
         if serializer.is_valid():
             teams = serializer.validated_data["teams"]
-            person.teams.add(*teams)
-            person.save()
+            if is_async_job(request):
+                payload = {"person_id": person.pk, "team_ids": teams}
+                return get_job_response(request, "add_to_teams", payload, len(teams))
+            add_person_to_teams(person.pk, teams)
             return Response(status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        methods=["get"],
+        detail=True,
+        url_path="colleagues",
+        url_name="person-colleagues",
+    )
+    def colleagues(self, request: Request, *args, **kwargs) -> Response:
+        """
+        People sharing a team with this person, by number of shared teams
+        (`shared_teams`), paginated with `limit` and `offset`.
+        """
+        person = self.get_object()
+        return get_overlaps_response(
+            request,
+            membership_graph.colleagues,
+            person.pk,
+            Person.objects.values(*BasePersonSerializer.Meta.fields),
+            "shared_teams",
+        )
+
+    @action(methods=["get"], detail=False, url_path="export", url_name="person-export")
+    def export(self, request: Request, *args, **kwargs) -> HttpResponseBase:
+        """
+        Stream all people with their team names as NDJSON or CSV
+        (`?output=ndjson|csv`).
+        """
+        return get_export_response(request, "people")
+
     @action(
         methods=["get"],
         detail=True,
         url_path="teams/(?P<team_id>[^/.]+)",
         url_name="person-specific-team",
     )
+    @conditional_response(person_team_stamp)
+    @cache_response("person:pk", "team:team_id")
     def specific_team(
         self, request: Request, team_id: int, *args, **kwargs
     ) -> Response:
         person = self.get_object()
-        team = get_object_or_404(person.teams, pk=team_id)
+        team = get_object_or_404(self.project(person.teams.all()), pk=team_id)
         serializer = self.get_serializer(team)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(self.expand([serializer.data])[0], status=status.HTTP_200_OK)
 
     @specific_team.mapping.delete
+    @idempotent
+    @conditional_response(person_team_stamp)
     def remove_from_specific_team(
         self, request: Request, team_id: int, *args, **kwargs
     ) -> Response:
-        person = self.get_object()
-        team = get_object_or_404(person.teams, pk=team_id)
-        person.teams.remove(team)
+        remove_pair_or_404(kwargs["pk"], team_id)
         return Response(status=status.HTTP_200_OK)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status, progress, change counts and errors of the `?async=true` jobs.
+    """
+
+    queryset = Job.objects.defer("payload")
+    serializer_class = JobSerializer
+
+
+class BatchView(APIView):
+    max_ids = 1000
+
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        """
+        Teams with their members and people with their teams in one response
+        (`?teams=1,2&people=3,4`), resolved with four queries at most.
+        IDs of missing objects are listed in `not_found`.
+        """
+        try:
+            ids = {
+                name: [
+                    int(pk)
+                    for pk in request.query_params.get(name, "").split(",")
+                    if pk.strip()
+                ]
+                for name in ("teams", "people")
+            }
+        except ValueError:
+            return Response(
+                {"detail": "teams and people must be comma-separated integers."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if sum(map(len, ids.values())) > self.max_ids:
+            return Response(
+                {"detail": f"At most {self.max_ids} IDs can be requested."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        teams = []
+        if ids["teams"]:
+            rows = Team.objects.filter(pk__in=ids["teams"]).values(
+                *TeamReadSerializer.values
+            )
+            teams = expand_rows(
+                TeamReadSerializer(rows.order_by("id"), many=True).data, ["members"]
+            )
+        people = []
+        if ids["people"]:
+            rows = Person.objects.filter(pk__in=ids["people"]).values(
+                *PersonReadSerializer.values
+            )
+            people = PersonReadSerializer(rows.order_by("id"), many=True).data
+
+        found = {
+            "teams": {team["id"] for team in teams},
+            "people": {person["id"] for person in people},
+        }
+        not_found = {
+            name: sorted(set(ids[name]) - found[name]) for name in ("teams", "people")
+        }
+        return Response(
+            {"teams": teams, "people": people, "not_found": not_found},
+            status=status.HTTP_200_OK,
+        )
+
+
+class CacheStatsView(APIView):
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        """
+        Response cache hit, miss and invalidation counters of this process.
+        """
+        return Response(dict(response_cache.stats), status=status.HTTP_200_OK)
+
+
+class SearchView(APIView):
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        """
+        Ranked, typo-tolerant search over people and teams (`?q=`),
+        paginated with `limit` and `offset`.
+        People are returned together with their teams.
+        """
+        query = request.query_params.get("q", "").strip()
+        limit, offset = get_limit_offset(request, self.default_limit, self.max_limit)
+
+        # Fetch one extra hit to know whether there is a next page
+        hits = get_search_index().search(query, limit + 1, offset) if query else []
+        has_next = len(hits) > limit
+        hits = hits[:limit]
+
+        ids = {TEAM: [], PERSON: []}
+        for kind, pk, _ in hits:
+            ids[kind].append(pk)
+        objects = {
+            TEAM: Team.objects.in_bulk(ids[TEAM]),
+            PERSON: Person.objects.prefetch_related("teams").in_bulk(ids[PERSON]),
+        }
+        serializers = {
+            TEAM: TeamListRetrieveSerializer,
+            PERSON: PersonListRetrieveSerializer,
+        }
+
+        results = []
+        for kind, pk, score in hits:
+            # The object may have been deleted since the hit was indexed
+            if pk in objects[kind]:
+                data = serializers[kind](objects[kind][pk]).data
+                results.append({"type": kind, "score": score, **data})
+
+        return Response(
+            {"next_offset": offset + limit if has_next else None, "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+
+class ChangeFeedView(APIView):
+    default_limit = 100
+    max_limit = 1000
+
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        """
+        Changes of teams, people and memberships logged after the `since`
+        cursor, oldest first, for incremental sync. Pass the returned `cursor`
+        as `since` to get the next ones. With `wait=<seconds>` the request is
+        held until a change is logged (long-polling), here for at most
+        `TEAMS_CHANGES_SYNC_MAX_SECONDS`: the wait blocks a worker thread.
+        """
+        try:
+            since = parse_cursor(request.query_params.get("since"))
+            limit = min(
+                int(request.query_params.get("limit", self.default_limit)),
+                self.max_limit,
+            )
+            wait = min(
+                float(request.query_params.get("wait", 0)), get_max_wait(blocking=True)
+            )
+        except ValueError:
+            return Response(
+                {
+                    "detail": "since must be a change ID or latest, limit and wait "
+                    "must be numbers."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if limit < 1:
+            limit = self.default_limit
+
+        # Fetch one extra change to know whether there are more
+        if wait > 0:
+            changes = wait_for_changes(since, limit + 1, wait)
+        else:
+            changes = get_changes(since, limit + 1)
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        return Response(
+            {
+                "results": changes,
+                "cursor": changes[-1]["id"] if changes else since,
+                "has_more": has_more,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+def stream_response(events: Any) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Disable proxy buffering (nginx)
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def change_stream(request: HttpRequest) -> HttpResponseBase:
+    """
+    The change feed as server-sent events, from `?since=` or the
+    `Last-Event-ID` of a reconnecting client. The stream holds a worker
+    thread, so it ends after `TEAMS_CHANGES_SYNC_MAX_SECONDS` at most
+    (`TEAMS_CHANGES_STREAM_SECONDS` with the async views); clients then
+    reconnect.
+    """
+    try:
+        since = parse_cursor(
+            request.headers.get("Last-Event-ID") or request.GET.get("since")
+        )
+    except ValueError:
+        return invalid_cursor_response()
+    return stream_response(
+        iter_events(since, ChangeFeedView.max_limit, get_stream_seconds(blocking=True))
+    )
+
+
+def invalid_cursor_response() -> JsonResponse:
+    return JsonResponse(
+        {"detail": "since must be a change ID or latest."},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Request metrics in the Prometheus text exposition format.
+    """
+    return HttpResponse(
+        request_metrics.render() + membership_graph.render_metrics(),
+        content_type="text/plain; version=0.0.4",
+    )